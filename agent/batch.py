@@ -0,0 +1,167 @@
+"""
+Runs a jsonl file of questions headlessly and streams the answers to jsonl.
+
+Usage:
+    python -m agent.batch queries.jsonl -o answers.jsonl [--workers 8] [--processes] [--figures]
+
+Each input line is a JSON object with a "question" (or "query") field; any
+"id" field is copied to the output. A plain JSON string is also accepted.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from agent import charts, planner, tools, tracing
+from agent.cache import normalize_query, freeze
+
+
+def read_questions(lines):
+    """Parses jsonl lines into question records, skipping blank lines and (with a warning) records with no question."""
+    records = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"question": item}
+        item["question"] = item.get("question") or item.get("query")
+        if not isinstance(item["question"], str) or not item["question"].strip():
+            print(f"Skipping line {number}: no question.", file=sys.stderr)
+            continue
+        records.append(item)
+    return records
+
+
+async def resolve_intents(questions, timeout=planner.LLM_TIMEOUT, entities=()):
+    """Resolves each distinct (normalized) question once, concurrently."""
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_query(question), question)
+    resolved = await asyncio.gather(*(planner.get_intent_async(q, timeout, entities) for q in unique.values()))
+    by_key = dict(zip(unique, resolved))
+    return [by_key[normalize_query(question)] for question in questions]
+
+
+def _finite(value):
+    """Replaces NaN and infinite floats (e.g. a variance % against a zero budget) with None, so the line is strict JSON."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+_worker_data = None
+
+
+def _init_worker(data_dir, chunksize=None):
+    """Loads the data once per worker process (from the snapshot when possible)."""
+    global _worker_data
+    _worker_data = tools.load_and_prepare_data(data_dir, chunksize=chunksize)
+
+
+def _answer(intent_data, data=None, figures=False):
+    """Runs one intent and turns the result into a JSON-serializable dict."""
+    result = planner.run_intent(intent_data, data if data is not None else _worker_data)
+    # Multi-part (plan) answers have several charts; "figure" stays the first of them.
+    specs = result.get("figures") or ([result["figure"]] if result.get("figure") else [])
+    rendered = [charts.to_plotly_json(spec) for spec in specs] if figures else []
+    return {
+        "response": result.get("response"),
+        "metrics": result.get("metrics"),
+        "figure": rendered[0] if rendered else None,
+        "figures": rendered,
+    }
+
+
+def run_batch(records, data, out, workers=4, processes=False, data_dir='fixtures', figures=False, timeout=planner.LLM_TIMEOUT, chunksize=None):
+    """
+    Answers every record and writes one JSON line per record to `out`.
+
+    Identical intents are computed once and fanned out to every question that
+    asked for them. Lines are written as soon as their answer is ready, so the
+    output is not in input order; each line carries its input `index`. A
+    question whose tool raises gets an "error" field instead of an answer.
+    """
+    intents = asyncio.run(resolve_intents([r["question"] for r in records], timeout, tools.entities(data)))
+
+    groups = {}
+    for index, intent_data in enumerate(intents):
+        key = (intent_data.get("intent"), freeze(intent_data.get("params") or {}))
+        groups.setdefault(key, []).append(index)
+
+    if processes:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir, chunksize))
+        submit = lambda intent_data: pool.submit(_answer, intent_data, None, figures)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        submit = lambda intent_data: pool.submit(_answer, intent_data, data, figures)
+
+    written = 0
+    with pool:
+        futures = {submit(intents[indexes[0]]): indexes for indexes in groups.values()}
+        for future in as_completed(futures):
+            try:
+                answer = future.result()
+            except Exception as e:
+                # One failing question shouldn't cost the rest of the run its answers.
+                answer = {"response": None, "metrics": None, "figure": None, "figures": [], "error": f"{type(e).__name__}: {e}"}
+            for index in futures[future]:
+                record = records[index]
+                line = {"index": index}
+                if "id" in record:
+                    line["id"] = record["id"]
+                line.update({
+                    "question": record["question"],
+                    "intent": intents[index].get("intent"),
+                    "params": intents[index].get("params"),
+                    "source": intents[index].get("source"),
+                })
+                line.update(answer)
+                out.write(json.dumps(_finite(line), default=str, allow_nan=False) + "\n")
+                written += 1
+            out.flush()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('queries', help="jsonl file of questions")
+    parser.add_argument('-o', '--output', help="jsonl file to write answers to (default: stdout)")
+    parser.add_argument('--data-dir', default='fixtures')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--processes', action='store_true', help="run tools in a process pool instead of threads")
+    parser.add_argument('--figures', action='store_true', help="include each chart as Plotly JSON")
+    parser.add_argument('--timeout', type=float, default=planner.LLM_TIMEOUT, help="seconds to wait for Gemini per question")
+    parser.add_argument('--chunksize', type=int, help="stream ledgers in chunks of this many rows (for ledgers larger than memory)")
+    parser.add_argument('--trace', help="jsonl file to append per-answer timing traces to (thread workers only)")
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        tracing.add_sink(tracing.FileSink(args.trace))
+
+    load_dotenv()
+    with open(args.queries) as f:
+        records = read_questions(f)
+    # Loading in the parent also writes the snapshot that process workers then map.
+    data = tools.load_and_prepare_data(args.data_dir, chunksize=args.chunksize)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        written = run_batch(records, data, out, args.workers, args.processes, args.data_dir, args.figures, args.timeout, args.chunksize)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Answered {written} questions.", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Keeps hit/miss counters so callers can see how well the cache is working.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, or `default` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """Stores `value`, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every entry. The hit/miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns the hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def normalize_query(query):
+    """Normalizes question text so trivially different phrasings share a cache key."""
+    text = query.lower().replace('’', "'").replace('‘', "'")
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip().rstrip('?.!').strip()
+
+
+def freeze(value):
+    """Turns nested dicts/lists into hashable tuples for use in cache keys."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
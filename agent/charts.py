@@ -0,0 +1,149 @@
+"""
+Compact chart specs and their lazy rendering to Plotly figures.
+
+Tools return a small JSON-serializable spec dict under "figure" instead of a
+Plotly figure. Plotly is only imported here, when a spec is actually drawn.
+"""
+import json
+
+from agent import tracing
+
+
+def bar_spec(title, categories, values, y_title):
+    """Spec for a labelled bar chart of a few categories."""
+    return {"type": "bar", "title": title, "x": list(categories), "y": [float(v) for v in values], "x_title": "Category", "y_title": y_title}
+
+
+def line_spec(title, months, values, y_title, y_suffix=""):
+    """Spec for a monthly line chart; `months` are 'YYYY-MM' strings."""
+    return {"type": "line", "title": title, "x": list(months), "y": [float(v) for v in values], "x_title": "Month", "y_title": y_title, "y_suffix": y_suffix}
+
+
+def pie_spec(title, names, values, hole=0.3):
+    """Spec for a donut chart."""
+    return {"type": "pie", "title": title, "names": list(names), "values": [float(v) for v in values], "hole": hole}
+
+
+def heatmap_spec(title, x, y, z, x_title, y_title):
+    """Spec for a labelled heatmap; `z` is a list of rows (one per y label), with None for blank cells."""
+    return {"type": "heatmap", "title": title, "x": list(x), "y": list(y), "z": z, "x_title": x_title, "y_title": y_title}
+
+
+def forecast_spec(title, history, forecast, y_title):
+    """Spec for a line chart of actuals followed by a dashed forecast; both are {"x": ['YYYY-MM', ...], "y": [...]}."""
+    return {"type": "forecast", "title": title, "history": history, "forecast": forecast, "y_title": y_title}
+
+
+def runway_spec(currency, sign, history, projection, burning, end_of_runway=None):
+    """
+    Spec for the cash balance and projected runway chart.
+
+    `history` and `projection` are {"x": [...], "y": [...]} series with ISO
+    dates; `end_of_runway` is an optional {"x": date, "months": float} marker.
+    """
+    return {
+        "type": "runway",
+        "currency": currency,
+        "sign": sign,
+        "history": history,
+        "projection": projection,
+        "burning": burning,
+        "end_of_runway": end_of_runway,
+    }
+
+
+def _bar(spec):
+    import plotly.express as px
+    fig = px.bar(x=spec["x"], y=spec["y"], title=spec["title"], text_auto='.2s', labels={"x": spec["x_title"], "y": spec["y_title"]})
+    fig.update_traces(textangle=0, textposition="outside")
+    return fig
+
+
+def _line(spec):
+    import plotly.express as px
+    fig = px.line(x=spec["x"], y=spec["y"], title=spec["title"], markers=True)
+    fig.update_layout(yaxis_title=spec["y_title"], xaxis_title=spec["x_title"])
+    fig.update_yaxes(ticksuffix=spec["y_suffix"])
+    return fig
+
+
+def _pie(spec):
+    import plotly.express as px
+    fig = px.pie(names=spec["names"], values=spec["values"], title=spec["title"], hole=spec["hole"])
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    fig.update_layout(showlegend=True)
+    return fig
+
+
+def _heatmap(spec):
+    import plotly.express as px
+    z = [[float('nan') if v is None else v for v in row] for row in spec["z"]]
+    fig = px.imshow(z, x=spec["x"], y=spec["y"], text_auto='.1f', aspect='auto', title=spec["title"],
+                    labels={"x": spec["x_title"], "y": spec["y_title"], "color": "Months"})
+    return fig
+
+
+def _forecast(spec):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=spec["history"]["x"], y=spec["history"]["y"], mode='lines+markers', name='Actual', line=dict(color='blue')))
+    # Start the forecast line at the last actual so the two lines join up.
+    x = spec["history"]["x"][-1:] + spec["forecast"]["x"]
+    y = spec["history"]["y"][-1:] + spec["forecast"]["y"]
+    fig.add_trace(go.Scatter(x=x, y=y, mode='lines+markers', name='Forecast', line=dict(color='red', dash='dash')))
+    fig.update_layout(title=spec["title"], xaxis_title='Month', yaxis_title=spec["y_title"])
+    return fig
+
+
+def _runway(spec):
+    import plotly.graph_objects as go
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=spec["history"]["x"], y=spec["history"]["y"],
+        mode='lines+markers', name='Historical Cash', line=dict(color='blue')
+    ))
+    if spec["burning"]:
+        fig.add_trace(go.Scatter(
+            x=spec["projection"]["x"], y=spec["projection"]["y"],
+            mode='lines+markers', name='Projected Runway', line=dict(color='red', dash='dash')
+        ))
+        fig.add_hline(y=0, line_width=1, line_dash="solid", line_color="black")
+    else:
+        fig.add_trace(go.Scatter(
+            x=spec["projection"]["x"], y=spec["projection"]["y"],
+            mode='lines+markers', name='Projected Growth', line=dict(color='green', dash='dash')
+        ))
+
+    end = spec.get("end_of_runway")
+    if end:
+        fig.add_annotation(
+            x=end["x"], y=0,
+            text=f"End of Runway (~{end['months']:.1f} months)",
+            showarrow=True, arrowhead=1, ax=0, ay=-40,
+            bgcolor="rgba(255, 0, 0, 0.7)", textangle=0, font=dict(color="white")
+        )
+
+    fig.update_layout(
+        title='Cash Balance and Projected Runway',
+        xaxis_title='Month',
+        yaxis_title=f'Cash ({spec["currency"]})',
+        yaxis_tickprefix=spec["sign"],
+        yaxis_tickformat=',.0f',
+        legend=dict(x=0.7 if spec["burning"] else 0.01, y=0.98, bordercolor="Black", borderwidth=1),
+        margin=dict(t=50, b=10, l=10, r=10)
+    )
+    return fig
+
+
+RENDERERS = {"bar": _bar, "line": _line, "pie": _pie, "heatmap": _heatmap, "forecast": _forecast, "runway": _runway}
+
+
+def to_figure(spec):
+    """Builds the Plotly figure for a chart spec."""
+    with tracing.span("figure", type=spec["type"]):
+        return RENDERERS[spec["type"]](spec)
+
+
+def to_plotly_json(spec):
+    """Renders a chart spec to Plotly's JSON figure format (as a dict)."""
+    return json.loads(to_figure(spec).to_json())
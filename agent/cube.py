@@ -0,0 +1,296 @@
+import numpy as np
+import pandas as pd
+
+from agent import tracing
+from agent.fx import get_fx
+
+
+SCENARIOS = {'actuals': 'actual', 'budget': 'budget'}
+CURRENCY_COLUMNS = {'USD': 'amount_usd', 'EUR': 'amount_eur'}
+CUBE_LEVELS = ['month', 'entity', 'account_category']
+# Reporting currencies converted when the cube is built; any other currency
+# with FX rates is converted from the local-currency cube on first request.
+EAGER_CURRENCIES = ('USD',)
+CONSOLIDATED = 'Consolidated'
+
+
+def month_key(month):
+    """Integer key (year * 12 + month - 1) for a Period, Timestamp or datetime."""
+    return month.year * 12 + month.month - 1
+
+
+def month_keys(months):
+    """Vectorized month_key for a datetime Series."""
+    return (months.dt.year * 12 + months.dt.month - 1).astype('int32')
+
+
+def key_to_period(key):
+    """Turns a month key back into a monthly Period."""
+    return pd.Period(year=int(key) // 12, month=int(key) % 12 + 1, freq='M')
+
+
+def _ledger_keys(frame):
+    entity = frame['entity'] if 'entity' in frame else pd.Series('All', index=frame.index)
+    return [
+        (frame['month_key'] if 'month_key' in frame else month_keys(frame['month'])).rename('month'),
+        entity.astype('str').rename('entity'),
+        frame['account_category'].astype('str').rename('account_category'),
+    ]
+
+
+def aggregate_ledger(frame):
+    """Sums one ledger frame's converted amount columns by (month, entity, account_category)."""
+    columns = {currency: col for currency, col in CURRENCY_COLUMNS.items() if col in frame}
+    totals = frame.groupby(_ledger_keys(frame), observed=True)[list(columns.values())].sum()
+    totals.columns = list(columns)
+    return totals
+
+
+def aggregate_local(frame):
+    """Sums one ledger frame's local-currency amounts by (month, entity, account_category, currency)."""
+    keys = _ledger_keys(frame) + [frame['currency'].astype('str').rename('currency')]
+    return frame.groupby(keys, observed=True)['amount'].sum()
+
+
+def _has_local_amounts(data):
+    ledgers = [data[name] for name in SCENARIOS if name in data]
+    return 'fx' in data and all('amount' in frame and 'currency' in frame for frame in ledgers)
+
+
+def build_local_cube(data):
+    """
+    Pre-aggregates actuals and budget in their local currencies.
+
+    The index is a sorted (month, entity, account_category, currency)
+    MultiIndex and the columns are the scenarios. Reporting-currency cubes are
+    converted from this without going back to the ledgers.
+    """
+    parts = {scenario: aggregate_local(data[name]) for name, scenario in SCENARIOS.items() if name in data}
+    return assemble_local(parts)
+
+
+def assemble_local(parts):
+    """Combines per-scenario local aggregates ({'actual': ..., 'budget': ...}) into a sorted cube."""
+    return pd.concat(parts, axis=1, names=['scenario']).fillna(0.0).sort_index()
+
+
+def convert_cube(local, rates, currencies):
+    """
+    Converts a local-currency cube into (scenario, currency) columns for `currencies`.
+
+    Each currency is one FX gather over the local cube's rows; all of them are
+    then summed over the source currency in a single groupby.
+    """
+    months = local.index.get_level_values('month')
+    sources = local.index.get_level_values('currency')
+    factors = np.column_stack([rates.factors(months, sources, currency) for currency in currencies])
+    values = local.to_numpy()[:, :, None] * factors[:, None, :]
+    columns = pd.MultiIndex.from_product([local.columns, currencies], names=['scenario', 'currency'])
+    converted = pd.DataFrame(values.reshape(len(local), -1), index=local.index, columns=columns)
+    return converted.groupby(level=CUBE_LEVELS).sum()
+
+
+def build_cube(data):
+    """
+    Pre-aggregates actuals and budget into a month x entity x account_category cube.
+
+    The index is a sorted (month, entity, account_category) MultiIndex whose
+    first level is the integer month key; the columns are (scenario, currency)
+    pairs such as ('actual', 'USD') or ('budget', 'EUR'). Ledgers in local
+    currency (with 'amount' and 'currency' columns, plus data['fx']) also leave
+    their local-currency cube in data['local_cube'].
+    """
+    if _has_local_amounts(data):
+        data['local_cube'] = build_local_cube(data)
+        return convert_cube(data['local_cube'], get_fx(data), EAGER_CURRENCIES)
+    parts = {scenario: aggregate_ledger(data[name]) for name, scenario in SCENARIOS.items() if name in data}
+    return assemble_cube(parts)
+
+
+def fold(totals, part):
+    """Adds one partial aggregate (e.g. from a CSV chunk) into running totals."""
+    return part if totals is None else totals.add(part, fill_value=0.0)
+
+
+def assemble_cube(parts):
+    """Combines per-scenario aggregates ({'actual': ..., 'budget': ...}) into a sorted cube."""
+    cube = pd.concat(parts, axis=1, names=['scenario', 'currency']).fillna(0.0)
+    return cube.sort_index()
+
+
+def fold_sorted(cube, delta):
+    """Adds a delta cube into a sorted cube, keeping it sorted."""
+    if delta.index[0][0] > cube.index[-1][0]:
+        # The usual month close: every new row is later than the cube, so the
+        # result stays sorted without re-aggregating history.
+        return pd.concat([cube, delta]).fillna(0.0)
+    return cube.add(delta, fill_value=0.0).sort_index()
+
+
+def get_cube(data):
+    """Returns the cube for `data`, building and storing it on first use."""
+    if 'cube' not in data:
+        data['cube'] = build_cube(data)
+    return data['cube']
+
+
+def cube_currencies(data):
+    """Reporting currencies `data` can answer in: any with FX rates, or those already in the cube."""
+    if 'cube' not in data and not any(name in data for name in SCENARIOS):
+        return list(CURRENCY_COLUMNS)
+    cube = get_cube(data)
+    if 'local_cube' in data:
+        return list(get_fx(data).currencies)
+    return list(cube.columns.unique(level='currency'))
+
+
+def reporting_cube(data, currency):
+    """
+    Returns the cube with columns for `currency`.
+
+    Currencies not converted yet are converted from data['local_cube'] on first
+    request and kept as extra columns, so each currency is converted once.
+    """
+    cube = get_cube(data)
+    if currency in cube.columns.get_level_values('currency'):
+        return cube
+    block = convert_cube(data['local_cube'], get_fx(data), [currency])
+    cube = pd.concat([cube, block], axis=1)
+    data['cube'] = cube
+    return cube
+
+
+def month_slice(cube, start, end):
+    """
+    Returns the cube rows for month keys start..end (inclusive).
+
+    The cube is sorted by month, so the rows are found with two binary searches
+    and returned as a contiguous positional slice.
+    """
+    months = cube.index.levels[0]
+    if months.is_monotonic_increasing:
+        # With sorted levels the level codes are sorted too; search those.
+        codes = cube.index.codes[0]
+        lo = codes.searchsorted(months.searchsorted(start, 'left'), 'left')
+        hi = codes.searchsorted(months.searchsorted(end, 'right'), 'left')
+    else:
+        keys = cube.index.get_level_values(0).to_numpy()
+        lo, hi = keys.searchsorted(start, 'left'), keys.searchsorted(end, 'right')
+    tracing.count("rows_scanned", hi - lo)
+    return cube.iloc[lo:hi]
+
+
+def latest_months(cube, n, end=None):
+    """
+    Returns the (start, end) month keys of the last `n` months present in the cube, up to month key `end` if given.
+
+    `n=None` means every month.
+    """
+    months = cube.index.unique(level=0)
+    if end is not None:
+        months = months[months <= end]
+    return months[max(len(months) - n, 0) if n is not None else 0], months[-1]
+
+
+def month_totals(cube, period, currency='USD', scenarios=('actual', 'budget')):
+    """
+    Sums one month of the cube into an account_category x entity table per scenario.
+
+    All scenarios come from a single groupby over the month's rows, and each
+    table has an extra CONSOLIDATED column summing every entity, so per-entity
+    and group figures are read from the same pass. Intercompany eliminations
+    booked to their own entity (e.g. 'Eliminations') net out in the
+    consolidated column. Returns {scenario: table}; tools answering the same
+    month share one of these instead of each scanning the cube. Scenarios
+    without a column for `currency` get an empty table.
+    """
+    columns = [(scenario, currency) for scenario in scenarios if (scenario, currency) in cube.columns]
+    if columns:
+        key = month_key(period)
+        grouped = month_slice(cube, key, key)[columns].groupby(level=['account_category', 'entity']).sum()
+    totals = {}
+    for scenario in scenarios:
+        if (scenario, currency) not in columns:
+            totals[scenario] = pd.DataFrame({CONSOLIDATED: pd.Series(dtype='float64')})
+            continue
+        table = grouped[(scenario, currency)].unstack(fill_value=0)
+        table[CONSOLIDATED] = table.sum(axis=1)
+        totals[scenario] = table
+    return totals
+
+
+def monthly_totals(cube, currency='USD', scenarios=('actual', 'budget'), start=None, end=None, entity=None):
+    """
+    monthly_category_totals for several scenarios from one groupby.
+
+    Returns {scenario: month-key x account_category table}; scenarios without
+    a column for `currency` get an empty table.
+    """
+    if start is not None or end is not None:
+        cube = month_slice(cube, start if start is not None else -1, end if end is not None else 10 ** 9)
+    else:
+        tracing.count("rows_scanned", len(cube))
+    columns = [(scenario, currency) for scenario in scenarios if (scenario, currency) in cube.columns]
+    values = cube[columns]
+    if entity is not None:
+        # Compare level codes rather than materializing the entity names per row.
+        entities = cube.index.levels[1]
+        code = entities.get_loc(entity) if entity in entities else -2
+        values = values[cube.index.codes[1] == code]
+    grouped = values.groupby(level=['month', 'account_category']).sum()
+    return {
+        scenario: grouped[(scenario, currency)].unstack(fill_value=0.0) if (scenario, currency) in columns else pd.DataFrame()
+        for scenario in scenarios
+    }
+
+
+def monthly_category_totals(cube, scenario='actual', currency='USD', start=None, end=None, entity=None):
+    """
+    Returns a month-key x account_category table, optionally for a range of months.
+
+    Amounts are summed across entities unless `entity` is given.
+    """
+    return monthly_totals(cube, currency, (scenario,), start, end, entity)[scenario]
+
+
+WINDOWS = ('ytd', 'qtd', 'ttm', 'rolling_average')
+
+
+def dense_months(table):
+    """Reindexes a month-key indexed table onto every month from its first to its last, filling gaps with 0."""
+    if table.empty:
+        return table
+    return table.reindex(range(int(table.index.min()), int(table.index.max()) + 1), fill_value=0.0)
+
+
+def window_start(key, window, n=3):
+    """First month key of the `window` ending at month `key`."""
+    if window == 'ytd':
+        return key - key % 12
+    if window == 'qtd':
+        return key - key % 3
+    if window == 'ttm':
+        return key - 11
+    return key - (n - 1)
+
+
+def window_totals(table, window, n=3):
+    """
+    Applies a period window to every row of a dense month-key indexed table at once.
+
+    Row k of the result covers the window ending at month k: 'ytd' and 'qtd'
+    are cumulative sums that restart each year or quarter, 'ttm' is a
+    trailing 12-month sum and 'rolling_average' an `n`-month trailing mean.
+    Every month's figure comes out of the same cumulative or rolling pass, so
+    a full year costs about what one month does.
+    """
+    keys = table.index.to_numpy()
+    if window == 'ytd':
+        return table.groupby(keys // 12).cumsum()
+    if window == 'qtd':
+        return table.groupby(keys // 3).cumsum()
+    if window == 'ttm':
+        return table.rolling(12, min_periods=1).sum()
+    if window == 'rolling_average':
+        return table.rolling(n, min_periods=1).mean()
+    raise ValueError(f"Unknown window '{window}'.")
@@ -0,0 +1,130 @@
+"""
+Forecasts for every entity x account series at once.
+
+series_matrix lays the cube out as a series x months matrix, with one row per
+(entity, account_category) and one column per month, and every model below
+forecasts all the rows in one NumPy pass:
+
+- seasonal_naive repeats each row's value from a year earlier,
+- exponential_smoothing carries each row's exponentially weighted level forward,
+- linear_trend extends each row's least-squares line.
+
+With method='auto' each row gets whichever model forecast its own latest
+months best from the months before them.
+"""
+import numpy as np
+
+
+SEASON = 12
+DEFAULT_ALPHA = 0.3
+HOLDOUT = 6
+
+
+def series_matrix(cube, currency='USD', scenario='actual', end=None):
+    """
+    The cube's `scenario` amounts as a (series x months) matrix, oldest month first.
+
+    Columns run from the cube's first month to month key `end` (default: its
+    last), with 0 for months a series has no row in. Rows are the (entity,
+    account_category) pairs with any row up to `end`, given as parallel arrays
+    of codes into 'entities' and 'accounts'. 'start' is the first column's
+    month key.
+    """
+    index = cube.index
+    accounts = index.levels[2].astype('str')
+    months = index.levels[0].to_numpy()[index.codes[0]].astype('int64')
+    values = cube[(scenario, currency)].to_numpy(dtype='float64') if (scenario, currency) in cube.columns else np.zeros(len(cube))
+    if end is not None:
+        keep = months <= end
+        months, values = months[keep], values[keep]
+    else:
+        keep = slice(None)
+    start = int(months.min()) if len(months) else 0
+    last = int(months.max()) if len(months) else -1
+
+    pairs = np.asarray(index.codes[1], dtype='int64')[keep] * len(accounts) + np.asarray(index.codes[2], dtype='int64')[keep]
+    series, rows = np.unique(pairs, return_inverse=True)
+    history = np.zeros((len(series), last - start + 1))
+    np.add.at(history, (rows, months - start), values)
+    return {
+        "entity_codes": series // len(accounts),
+        "entities": index.levels[1].astype('str'),
+        "account_codes": series % len(accounts),
+        "accounts": accounts,
+        "start": start,
+        "history": history,
+    }
+
+
+def _repeat_last(history, horizon):
+    last = history[:, -1:] if history.shape[1] else np.zeros((len(history), 1))
+    return np.repeat(last, horizon, axis=1)
+
+
+def seasonal_naive(history, horizon, season=SEASON):
+    """Each future month's value from `season` months earlier; rows with less history repeat their last value."""
+    months = history.shape[1]
+    if months < season:
+        return _repeat_last(history, horizon)
+    return history[:, months - season + np.arange(horizon) % season]
+
+
+def exponential_smoothing(history, horizon, alpha=DEFAULT_ALPHA):
+    """
+    Flat forecast at each row's exponentially smoothed level.
+
+    The level after the last month is a fixed weighting of the months, so all
+    rows are smoothed with one matrix-vector product instead of a loop.
+    """
+    months = history.shape[1]
+    if months == 0:
+        return _repeat_last(history, horizon)
+    weights = alpha * (1 - alpha) ** np.arange(months - 1, -1, -1, dtype='float64')
+    weights[0] = (1 - alpha) ** (months - 1)
+    return np.repeat((history @ weights)[:, None], horizon, axis=1)
+
+
+def linear_trend(history, horizon):
+    """Extends each row's least-squares line, fitted to all rows at once."""
+    months = history.shape[1]
+    if months < 2:
+        return _repeat_last(history, horizon)
+    t = np.arange(months, dtype='float64') - (months - 1) / 2
+    mean = history.mean(axis=1)
+    slope = (history - mean[:, None]) @ t / (t @ t)
+    future = np.arange(months, months + horizon, dtype='float64') - (months - 1) / 2
+    return mean[:, None] + slope[:, None] * future[None, :]
+
+
+METHODS = {
+    "seasonal_naive": seasonal_naive,
+    "exponential_smoothing": exponential_smoothing,
+    "linear_trend": linear_trend,
+}
+
+
+def backtest_errors(history, holdout=HOLDOUT):
+    """Each method's mean absolute error per row on its last `holdout` months, forecast from the months before."""
+    train, test = history[:, :-holdout], history[:, -holdout:]
+    return {name: np.abs(model(train, holdout) - test).mean(axis=1) for name, model in METHODS.items()}
+
+
+def forecast(history, horizon, method='auto', holdout=HOLDOUT):
+    """
+    Forecasts the next `horizon` months of every row of `history`.
+
+    `method` is one of METHODS, or 'auto' to pick the method with the lowest
+    backtest_errors per row (exponential smoothing for everything when there
+    is less than a season plus `holdout` months to judge them on). Returns the
+    (rows x horizon) forecast and the method used for each row.
+    """
+    if method != 'auto':
+        return METHODS[method](history, horizon), np.full(len(history), method, dtype=object)
+    if history.shape[1] < SEASON + holdout:
+        return forecast(history, horizon, 'exponential_smoothing')
+
+    names = np.array(list(METHODS), dtype=object)
+    errors = backtest_errors(history, holdout)
+    best = np.vstack([errors[name] for name in names]).argmin(axis=0)
+    forecasts = np.stack([METHODS[name](history, horizon) for name in names])
+    return forecasts[best, np.arange(len(history))], names[best]
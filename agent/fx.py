@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+
+CURRENCY_SIGNS = {'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥'}
+
+
+def currency_sign(currency):
+    """Symbol used to prefix amounts in a currency, e.g. '$' or 'CHF '."""
+    return CURRENCY_SIGNS.get(currency, f'{currency} ')
+
+
+def monthly_from_daily(daily, how='mean'):
+    """
+    Collapses a daily rate table (date, currency, rate_to_usd) into monthly rates.
+
+    `how='mean'` gives monthly average rates, which is what the prepared data
+    keeps and every conversion uses, cash balances included; `how='last'`
+    gives month-end rates instead. Months with no quotes are filled from the
+    last month that had one (an as-of lookup).
+    """
+    dates = pd.to_datetime(daily['date'])
+    keys = (dates.dt.year * 12 + dates.dt.month - 1).astype('int32')
+    table = (daily.assign(month_key=keys)
+             .sort_values('date', kind='stable')
+             .pivot_table(index='month_key', columns='currency', values='rate_to_usd', aggfunc=how, observed=True))
+    table = table.reindex(range(table.index.min(), table.index.max() + 1)).ffill()
+    monthly = table.stack().rename('rate_to_usd').reset_index()
+    monthly['month'] = pd.to_datetime({'year': monthly['month_key'] // 12, 'month': monthly['month_key'] % 12 + 1, 'day': 1})
+    return monthly[['month', 'month_key', 'currency', 'rate_to_usd']]
+
+
+class FxRates:
+    """
+    Rates to USD stored as a dense month x currency matrix.
+
+    Row i holds month key first_key + i, so finding a month's row is a subtraction
+    rather than a search, and converting any amounts from any currencies to any
+    target currency is one gather: amount * rate[month, from] / rate[month, to].
+    Missing rates are NaN.
+    """
+
+    def __init__(self, first_key, currencies, matrix):
+        self.first_key = int(first_key)
+        self.currencies = pd.Index(currencies)
+        self.matrix = matrix
+
+    @classmethod
+    def from_frame(cls, fx):
+        """Builds the matrix from a long (month_key, currency, rate_to_usd) table."""
+        table = fx.pivot_table(index='month_key', columns='currency', values='rate_to_usd', aggfunc='last', observed=True)
+        table.columns = table.columns.astype('str')
+        if 'USD' not in table.columns:
+            table['USD'] = 1.0
+        table = table.reindex(range(int(table.index.min()), int(table.index.max()) + 1))
+        return cls(table.index[0], table.columns, table.to_numpy(dtype='float64'))
+
+    def __contains__(self, currency):
+        return currency in self.currencies
+
+    def factors(self, month_keys, currencies, target):
+        """
+        Multipliers that convert amounts in `currencies` for `month_keys` into `target`.
+
+        `currencies` is one currency code or an array-like of them; a
+        categorical is looked up once per category and then gathered by code.
+        """
+        month_keys = np.asarray(month_keys, dtype='int64')
+        if isinstance(currencies, str):
+            currencies = pd.Categorical.from_codes(np.zeros(len(month_keys), dtype='int8'), [currencies])
+        currencies = pd.Categorical(currencies)
+        rows = month_keys - self.first_key
+        valid = (rows >= 0) & (rows < len(self.matrix))
+        rows = np.where(valid, rows, 0)
+
+        columns = self.currencies.get_indexer(currencies.categories)
+        columns = np.append(columns, -1)[currencies.codes]
+        valid &= columns >= 0
+
+        factors = self.matrix[rows, np.where(valid, columns, 0)] / self.matrix[rows, self.currencies.get_loc(target)]
+        factors[~valid] = np.nan
+        return factors
+
+    def convert(self, amounts, month_keys, currencies, target):
+        """Converts local-currency amounts into `target`."""
+        return np.asarray(amounts, dtype='float64') * self.factors(month_keys, currencies, target)
+
+
+def get_fx(data):
+    """Returns the FxRates for `data`, building it from data['fx'] on first use."""
+    if 'fx_rates' not in data:
+        data['fx_rates'] = FxRates.from_frame(data['fx'])
+    return data['fx_rates']
@@ -1,19 +1,390 @@
 import os
+import re
 import json
+import asyncio
+import threading
+import time
 import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from agent import tools
+from agent import tools, tracing
+from agent.cache import TTLCache, normalize_query, freeze
 
-def get_intent(query):
-    try:
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-    except Exception as e:
-        print(f"Error configuring Gemini: {e}")
-        return {"intent": "error", "params": {}}
 
+MODEL_NAME = 'gemini-2.5-flash'
+# Seconds the async planner waits for Gemini before using the local classifier.
+LLM_TIMEOUT = 10.0
+
+# Resolved intents, keyed on (normalized question, current month) because
+# "this month"/"last month" depend on the date.
+INTENT_CACHE = TTLCache(maxsize=1024, ttl=6 * 3600)
+# Tool outputs, keyed on (intent, params, data version).
+RESULT_CACHE = TTLCache(maxsize=256, ttl=3600)
+
+
+# Keyword rules for the local parser. A query is only classified locally when
+# exactly one intent matches; anything ambiguous goes to the LLM.
+INTENT_PATTERNS = {
+    "revenue": re.compile(r"\brevenues?\b|\btop[- ]line\b"),
+    "gross_margin_trend": re.compile(r"\bgross margins?\b|\bgm\b"),
+    "opex_breakdown": re.compile(r"\bopex\b|\boperating (?:expenses?|costs?)\b"),
+    "ebitda": re.compile(r"\bebitda\b"),
+    "cash_runway": re.compile(r"\brunway\b|\bburn rate\b|\bcash (?:last|left)\b"),
+    "variance": re.compile(r"\bvariances?\b|\b(?:off|over|under|vs\.?|versus|against) (?:the )?budget\b|\bbudget (?:vs\.?|versus) actuals?\b"),
+}
+MONTH_INTENTS = {"revenue", "opex_breakdown", "ebitda"}
+# Intents that can be answered together in one "plan" (e.g. "revenue and EBITDA
+# for Q2 in EUR") when a question asks for several of them.
+PLAN_INTENTS = {"revenue", "opex_breakdown", "ebitda"}
+# Period windows. A question matching one of these and one metric intent above
+# becomes a range intent (e.g. "ytd") with that metric as a param.
+WINDOW_PATTERNS = {
+    "ytd": re.compile(r"\bytd\b|\byear[- ]to[- ]date\b"),
+    "qtd": re.compile(r"\bqtd\b|\bquarter[- ]to[- ]date\b"),
+    "ttm": re.compile(r"\bttm\b|\bltm\b|\btrailing[- ](?:12|twelve)[- ]months?\b"),
+    "rolling_average": re.compile(r"\brolling\b|\bmoving average\b"),
+}
+RANGE_METRICS = {"revenue": "revenue", "ebitda": "ebitda", "gross_margin_trend": "gross_margin", "opex_breakdown": "opex"}
+# A runway question that also matches this asks for the scenario sweep.
+SENSITIVITY_PATTERN = re.compile(r"\bsensitivity\b|\bscenarios?\b|\bstress[- ]?test|\bwhat[- ]if\b")
+TOP_K_PATTERN = re.compile(r"\b(?:top|biggest|largest)\s+(\d+|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\b")
+PERCENT_THRESHOLD_PATTERN = re.compile(r"\b(?:over|above|more than|at least|by)\s+(\d+(?:\.\d+)?)\s*%")
+# A question matching this asks for a forecast, or for runway on the forecast burn.
+FORECAST_PATTERN = re.compile(r"\bforecast(?:s|ed|ing)?\b|\bproject(?:ed|ions?)\b|\bpredict(?:ed|ions?)?\b|\boutlook\b")
+FORECAST_HORIZON_PATTERN = re.compile(
+    r"\b(?:next|coming|following)\s+(\d+|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\s+months\b"
+    r"|\b(\d+|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)[- ]months?\s+(?:ahead|out|forward|forecast|projection|outlook)\b"
+)
+FORECAST_METHOD_PATTERNS = {
+    "seasonal_naive": re.compile(r"\bseasonal(?:ly)?\b|\bsame month last year\b"),
+    "exponential_smoothing": re.compile(r"\bexponential\b|\bsmoothing\b|\bsmoothed\b"),
+    "linear_trend": re.compile(r"\blinear\b|\btrend ?line\b"),
+}
+COGS_PATTERN = re.compile(r"\bcogs\b|\bcost of (?:goods|sales|revenue)\b")
+WINDOW_MONTHS_PATTERN = re.compile(r"\b(\d+|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)[- ]months?\b")
+
+MONTH_NAMES = {datetime(2000, m, 1).strftime("%B").lower(): m for m in range(1, 13)}
+MONTH_NAMES.update({name[:3]: m for name, m in list(MONTH_NAMES.items())})
+MONTH_NAMES["sept"] = 9
+MONTH_YEAR_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(MONTH_NAMES, key=len, reverse=True)) + r")\.?[\s,-]+(?:of\s+)?('\d{2}|\d{4}|\d{2})\b"
+)
+ISO_MONTH_PATTERN = re.compile(r"\b(\d{4})-(\d{1,2})\b|\b(\d{1,2})/(\d{4})\b")
+QUARTER_PATTERN = re.compile(r"\bq([1-4])(?:[\s-]*('\d{2}|\d{4}))?\b|\b(first|second|third|fourth) quarter(?:\s+(?:of\s+)?(\d{4}))?\b")
+QUARTER_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4}
+RELATIVE_MONTH_PATTERN = re.compile(r"\b(this|current|last|previous|prior) month\b")
+LAST_N_PATTERN = re.compile(r"\b(?:last|past|previous|trailing)\s+(\d+|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)\s+months\b")
+NUMBER_WORDS = {
+    "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+# Intents whose tools can answer for a single entity instead of the consolidated group.
+ENTITY_INTENTS = {"revenue", "opex_breakdown", "ebitda", "plan", "forecast"} | set(WINDOW_PATTERNS)
+CURRENCY_PATTERNS = {
+    "USD": re.compile(r"\busd\b|\bdollars?\b|\$"),
+    "EUR": re.compile(r"\beur\b|\beuros?\b|€"),
+    "GBP": re.compile(r"\bgbp\b|\bpounds?\b|\bsterling\b|£"),
+    "CHF": re.compile(r"\bchf\b|\bfrancs?\b"),
+    "JPY": re.compile(r"\bjpy\b|\byen\b|¥"),
+}
+
+
+def _extract_month(text, now):
+    """Finds a single month reference in `text` and returns it as 'Month YYYY'."""
+    months = set()
+    for name, year in MONTH_YEAR_PATTERN.findall(text):
+        year = int(year.lstrip("'"))
+        months.add((year + 2000 if year < 100 else year, MONTH_NAMES[name]))
+    for year, month, month_alt, year_alt in ISO_MONTH_PATTERN.findall(text):
+        year, month = (year, month) if year else (year_alt, month_alt)
+        if 1 <= int(month) <= 12:
+            months.add((int(year), int(month)))
+    for which in RELATIVE_MONTH_PATTERN.findall(text):
+        offset = 0 if which in ("this", "current") else 1
+        total = now.year * 12 + now.month - 1 - offset
+        months.add((total // 12, total % 12 + 1))
+
+    if len(months) != 1:
+        return None
+    year, month = months.pop()
+    return datetime(year, month, 1).strftime("%B %Y")
+
+
+def _extract_quarter(text, now):
+    """
+    Finds a single quarter reference ("Q2 2025", "q3", "second quarter") and returns its last month as 'Month YYYY'.
+
+    A quarter without a year is the latest one that has started by `now`.
+    """
+    quarters = set()
+    for number, year, word, word_year in QUARTER_PATTERN.findall(text):
+        quarter = int(number) if number else QUARTER_WORDS[word]
+        year = (year or word_year).lstrip("'")
+        if year:
+            year = int(year) + 2000 if len(year) == 2 else int(year)
+        else:
+            year = now.year if (quarter - 1) * 3 < now.month else now.year - 1
+        quarters.add((year, quarter))
+
+    if len(quarters) != 1:
+        return None
+    year, quarter = quarters.pop()
+    return datetime(year, quarter * 3, 1).strftime("%B %Y")
+
+
+def _extract_entities(text, entities):
+    """Returns the known entity names mentioned as whole words in `text`."""
+    return [name for name in entities if re.search(rf"(?<!\w){re.escape(name.lower())}(?!\w)", text)]
+
+
+def parse_intent_locally(query, now=None, strict=True, entities=()):
+    """
+    Classifies templated questions with keyword rules and a month/year grammar.
+
+    Returns an intent dict in the same shape as get_intent, or None when the
+    question is ambiguous and should go to the LLM. With `strict=False` it
+    always returns its best guess instead, for use when the LLM is unavailable.
+    `entities` are the entity names in the data; one of them mentioned in a
+    revenue, OPEX or EBITDA question becomes the "entity" param.
+
+    A question asking for several of revenue, OPEX and EBITDA becomes a
+    "plan" intent listing them (in the order asked) under "intents", with the
+    month, window, currency and entity shared by all. A quarter ("Q2 2025")
+    is read as quarter to date through its last month.
+
+    A question asking for a forecast becomes a "forecast" intent, charting the
+    first of revenue, COGS, OPEX, EBITDA or gross margin it names; a runway
+    question asking for one becomes cash_runway on the forecast burn.
+    """
+    text = query.lower()
+    now = now or datetime.now()
+
+    matches = {intent: pattern.search(text) for intent, pattern in INTENT_PATTERNS.items()}
+    intents = sorted((intent for intent, match in matches.items() if match), key=lambda intent: matches[intent].start())
+    if "variance" in intents and len(intents) > 1:
+        # "Revenue vs budget" is the revenue tool's own comparison, not a ledger-wide scan.
+        intents.remove("variance")
+    forecast = FORECAST_PATTERN.search(text) is not None and intents != ["cash_runway"]
+    if forecast:
+        if any(intent not in RANGE_METRICS for intent in intents) and strict:
+            return None
+        forecast_metrics = [RANGE_METRICS[intent] for intent in intents if intent in RANGE_METRICS]
+        cogs = COGS_PATTERN.search(text)
+        if cogs and (not forecast_metrics or cogs.start() < matches[intents[0]].start()):
+            forecast_metrics.insert(0, "cogs")
+        intents = ["forecast"]
+    plan = len(intents) > 1 and set(intents) <= PLAN_INTENTS
+    if len(intents) != 1 and not plan and (strict or not intents):
+        return None if strict else {"intent": "unknown", "params": {}, "source": "local"}
+    intent = "plan" if plan else intents[0]
+
+    params = {"intents": intents} if plan else {}
+    if forecast and forecast_metrics:
+        params["metric"] = forecast_metrics[0]
+    windows = [window for window, pattern in WINDOW_PATTERNS.items() if pattern.search(text)]
+    quarter = _extract_quarter(text, now)
+    if quarter is not None:
+        if any(window != "qtd" for window in windows) and strict:
+            return None
+        windows = ["qtd"]
+    window = None
+    if windows:
+        if (len(windows) != 1 or (intent not in RANGE_METRICS and not plan and intent != "variance")) and strict:
+            return None
+        if intent == "variance" and windows[0] == "rolling_average" and strict:
+            return None
+        if plan or intent == "variance":
+            window = params["window"] = windows[0]
+        elif intent in RANGE_METRICS:
+            params["metric"] = RANGE_METRICS[intent]
+            window = intent = windows[0]
+
+    if intent == "cash_runway" and SENSITIVITY_PATTERN.search(text):
+        intent = "runway_sensitivity"
+    elif intent == "cash_runway" and FORECAST_PATTERN.search(text):
+        params["burn"] = "forecast"
+
+    month_str = _extract_month(text, now)
+    if quarter is not None:
+        if month_str is not None and strict:
+            return None
+        month_str = quarter
+    if month_str is None and (intent in MONTH_INTENTS or (plan and window is None)) and strict:
+        return None
+    if month_str is not None and (intent in MONTH_INTENTS or intent in WINDOW_PATTERNS or plan or intent == "variance"):
+        params["month_str"] = month_str
+    elif month_str is not None and strict:
+        # The tool for this intent can't answer for a given month, so let the LLM decide what was meant.
+        return None
+
+    if intent == "variance":
+        top_k = TOP_K_PATTERN.search(text)
+        if top_k:
+            params["top_k"] = NUMBER_WORDS.get(top_k.group(1)) or int(top_k.group(1))
+        threshold_pct = PERCENT_THRESHOLD_PATTERN.search(text)
+        if threshold_pct:
+            params["threshold_pct"] = float(threshold_pct.group(1))
+
+    if intent == "forecast":
+        horizon = FORECAST_HORIZON_PATTERN.search(text)
+        if horizon:
+            horizon = horizon.group(1) or horizon.group(2)
+            params["horizon"] = NUMBER_WORDS.get(horizon) or int(horizon)
+        methods = [method for method, pattern in FORECAST_METHOD_PATTERNS.items() if pattern.search(text)]
+        if len(methods) == 1:
+            params["method"] = methods[0]
+
+    last_n = LAST_N_PATTERN.search(text)
+    if window is not None or plan:
+        # Only a rolling average has a variable length; the other windows are fixed.
+        last_n = WINDOW_MONTHS_PATTERN.search(text) if window == "rolling_average" else None
+    if last_n:
+        params["latest_n_months"] = NUMBER_WORDS.get(last_n.group(1)) or int(last_n.group(1))
+
+    currencies = [currency for currency, pattern in CURRENCY_PATTERNS.items() if pattern.search(text)]
+    if len(currencies) > 1 and strict:
+        return None
+    if len(currencies) == 1:
+        params["currency"] = currencies[0]
+
+    mentioned = _extract_entities(text, entities)
+    if len(mentioned) > 1 and strict:
+        return None
+    if len(mentioned) == 1 and intent in ENTITY_INTENTS:
+        params["entity"] = mentioned[0]
+
+    return {"intent": intent, "params": params, "source": "local"}
+
+
+def get_intent(query, entities=()):
+    """Resolves a question's intent from the cache, locally when possible, otherwise with Gemini."""
+    with tracing.span("intent") as span:
+        key = (normalize_query(query), datetime.now().strftime("%Y-%m"))
+        cached = INTENT_CACHE.get(key)
+        if cached is not None:
+            span.tag(intent=cached.get("intent"), source="cache", cache_hit=True)
+            return dict(cached, source="cache")
+
+        intent_data = parse_intent_locally(query, entities=entities)
+        if intent_data is None:
+            intent_data = get_intent_from_llm(query, entities)
+            intent_data["source"] = "llm"
+        if _cacheable(intent_data):
+            INTENT_CACHE.set(key, intent_data)
+        span.tag(intent=intent_data.get("intent"), source=intent_data.get("source"), cache_hit=False)
+        return intent_data
+
+
+def _cacheable(intent_data):
+    """Whether a resolved intent may go in INTENT_CACHE: not a failure or a fallback guess, which should be retried."""
+    return (intent_data.get("intent") != "error" and not intent_data.get("error")
+            and intent_data.get("source") != "local_fallback")
+
+
+def invalidate_caches():
+    """Clears the intent and tool result caches, e.g. after the data is reloaded."""
+    INTENT_CACHE.clear()
+    RESULT_CACHE.clear()
+
+
+def cache_stats():
+    """Returns hit/miss counters for the intent and tool result caches."""
+    return {"intent": INTENT_CACHE.stats(), "result": RESULT_CACHE.stats()}
+
+
+def warm_up_intents(data, currencies=("USD",)):
+    """
+    The intents warm_up answers ahead of time: revenue, EBITDA and opex for the
+    latest month with actuals, the gross margin trend, and cash runway.
+    """
+    latest = tools.latest_actual_month(data)
+    intents = [{"intent": "gross_margin_trend", "params": {}}]
+    for currency in currencies:
+        if latest is not None:
+            for intent in ("revenue", "ebitda", "opex_breakdown"):
+                intents.append({"intent": intent, "params": {"month_str": latest.strftime("%B %Y"), "currency": currency}})
+        intents.append({"intent": "cash_runway", "params": {"currency": currency}})
+    return intents
+
+
+def _intent_label(intent_data):
+    params = intent_data.get("params") or {}
+    return " ".join(str(part) for part in (intent_data["intent"], params.get("month_str"), params.get("currency")) if part)
+
+
+def _warm_one(intent_data, data, render):
+    """Answers one intent into RESULT_CACHE and builds its figures; returns the seconds it took."""
+    start = time.perf_counter()
+    result = run_intent(intent_data, data)
+    if render is not None:
+        for figure in result.get("figures") or ([result["figure"]] if result.get("figure") else []):
+            render(figure)
+    return time.perf_counter() - start
+
+
+def warm_up(data, currencies=("USD",), workers=4, render=None, progress=None):
+    """
+    Answers the most common questions on a thread pool, so run_query serves them from RESULT_CACHE.
+
+    Covers warm_up_intents for each of `currencies`. `render`, if given, is
+    called on each answer's figures (e.g. a caching chart renderer), and `progress`, if
+    given, as progress(done, total, label, seconds) after each answer. Returns
+    the total and per-answer seconds; a failed answer is reported and skipped.
+    """
+    with tracing.span("warm_up") as span:
+        start = time.perf_counter()
+        currencies = [c.upper() for c in currencies if c.upper() in tools.supported_currencies(data)] or ["USD"]
+        # Conversions add columns to the shared frames, so do them before the threads start.
+        for currency in currencies:
+            tools.prepare_currency(data, currency)
+        intents = warm_up_intents(data, currencies)
+
+        timings = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_warm_one, intent_data, data, render): _intent_label(intent_data) for intent_data in intents}
+            for done, future in enumerate(as_completed(futures), 1):
+                label = futures[future]
+                try:
+                    timings[label] = future.result()
+                except Exception as e:
+                    print(f"Warm-up of {label} failed: {e}")
+                    timings[label] = None
+                if progress is not None:
+                    progress(done, len(futures), label, timings[label])
+
+        seconds = time.perf_counter() - start
+        span.tag(answers=sum(t is not None for t in timings.values()))
+    return {"seconds": seconds, "answers": timings}
+
+
+def warm_up_in_background(data, **kwargs):
+    """Starts warm_up on a background thread and returns its Future."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up")
+    future = executor.submit(warm_up, data, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """Returns the shared Gemini model, configuring the client on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _model = genai.GenerativeModel(MODEL_NAME)
+        return _model
+
+
+def build_intent_prompt(query, entities=()):
+    """Builds the intent classification prompt for Gemini."""
     current_month_str = datetime.now().strftime("%B %Y")
+    known_entities = ", ".join(entities) or "none listed"
 
-    prompt = f"""
+    return f"""
     You are a helpful financial assistant. Your job is to understand a user's question
     and classify it into one of the following intents. You must also extract any
     relevant parameters, like the month and year or the number of latest months.
@@ -27,12 +398,43 @@ def get_intent(query):
     - opex_breakdown: For questions about operating expense breakdowns.
     - ebitda: For questions about EBITDA.
     - cash_runway: For questions about cash runway.
+    - runway_sensitivity: For cash runway scenarios, sensitivity tables or stress tests.
+    - ytd, qtd, ttm: For revenue, EBITDA, gross margin or opex year to date, quarter to date,
+      or over the trailing twelve months.
+    - rolling_average: For a rolling (moving) average of revenue, EBITDA, gross margin or opex.
+    - variance: For where actuals are furthest from budget across all months, entities and
+      accounts (e.g. "where are we most off budget?"). Revenue vs budget for one month is revenue.
+    - plan: For questions asking for more than one of revenue, EBITDA and opex at once
+      (e.g. "revenue, EBITDA and opex for Q2 in EUR").
+    - forecast: For forecasts or projections of revenue, COGS, opex, EBITDA or gross margin
+      for the coming months. A runway question on the forecast burn is cash_runway.
     - unknown: If the question doesn't fit any other category.
 
     Parameters:
-    - month_str: The full month and year (e.g., "June 2025").
-    - latest_n_months: The number of latest months to consider (e.g., 3).
-    - currency: The currency to use (e.g., "USD", "EUR").
+    - month_str: The full month and year (e.g., "June 2025"). For ytd, qtd, ttm and
+      rolling_average it is the last month of the period; leave it out for the latest month.
+    - latest_n_months: The number of latest months to consider (e.g., 3), or the length
+      of a rolling average.
+    - metric: For ytd, qtd, ttm and rolling_average only: one of "revenue", "ebitda",
+      "gross_margin" or "opex".
+    - currency: The ISO currency code to use (e.g., "USD", "EUR", "GBP", "CHF", "JPY").
+    - intents: For plan only: the list of intents asked for, from "revenue", "ebitda" and
+      "opex_breakdown", in the order asked.
+    - window: For plan and variance only, when the question covers a period rather than one month: one of
+      "ytd", "qtd", "ttm" or "rolling_average". A quarter such as Q2 2025 is "qtd" with
+      month_str set to the quarter's last month.
+    - top_k: For variance only: how many of the largest variances to list (default 10).
+    - threshold, threshold_pct: For variance only: the smallest variance to list, as an amount
+      in the reporting currency or as a percentage of budget.
+    - metric: For forecast: the line to chart, one of "revenue", "cogs", "opex", "ebitda" or
+      "gross_margin" (default "ebitda").
+    - horizon: For forecast only: how many months ahead to forecast (default 12).
+    - method: For forecast only, if the question names one: "seasonal_naive",
+      "exponential_smoothing" or "linear_trend".
+    - burn: For cash_runway only: "forecast" when the question asks for runway on the
+      forecast (projected) burn rather than the recent average.
+    - entity: The business entity the question is about, for revenue, opex_breakdown, ebitda, plan and forecast
+      (known entities: {known_entities}). Leave it out for company-wide or consolidated questions.
 
     User Question: "{query}"
 
@@ -43,62 +445,232 @@ def get_intent(query):
       "params": {{
         "month_str": "...",
         "latest_n_months": ...,
-        "currency": "..."
+        "metric": "...",
+        "intents": ["..."],
+        "window": "...",
+        "top_k": ...,
+        "threshold_pct": ...,
+        "horizon": ...,
+        "method": "...",
+        "burn": "...",
+        "currency": "...",
+        "entity": "..."
       }}
     }}
     """
 
-    # Set up the model and generate the content
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    response = model.generate_content(prompt)
 
+def _parse_llm_response(response):
+    """Turns a Gemini response into an intent dict; one it can't parse is marked with "error": True."""
     try:
         # The Gemini response text needs to be cleaned of markdown backticks
         cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
-        return json.loads(cleaned_response)
+        intent_data = json.loads(cleaned_response)
     except (json.JSONDecodeError, IndexError, AttributeError):
-        # Fallback if the model response is not valid JSON
-        return {"intent": "unknown", "params": {}}
+        intent_data = None
+    if not isinstance(intent_data, dict):
+        # Fallback if the model response is not a valid JSON object
+        return {"intent": "unknown", "params": {}, "error": True}
+    return intent_data
+
+
+def get_intent_from_llm(query, entities=()):
+    try:
+        model = get_model()
+    except Exception as e:
+        print(f"Error configuring Gemini: {e}")
+        return {"intent": "error", "params": {}}
+
+    with tracing.span("llm", model=MODEL_NAME):
+        response = model.generate_content(build_intent_prompt(query, entities))
+    return _parse_llm_response(response)
+
+
+async def get_intent_from_llm_async(query, timeout=LLM_TIMEOUT, entities=()):
+    """
+    Asks Gemini for the intent without blocking the event loop.
+
+    If the call fails or takes longer than `timeout` seconds, the local
+    classifier's best guess is used instead (source 'local_fallback').
+    """
+    try:
+        model = get_model()
+    except Exception as e:
+        print(f"Error configuring Gemini: {e}")
+        return {"intent": "error", "params": {}, "source": "llm"}
+
+    try:
+        with tracing.span("llm", model=MODEL_NAME):
+            response = await asyncio.wait_for(model.generate_content_async(build_intent_prompt(query, entities)), timeout)
+    except Exception as e:
+        reason = f"timed out after {timeout}s" if isinstance(e, asyncio.TimeoutError) else f"failed: {e}"
+        print(f"Gemini {reason}; using the local classifier.")
+        return dict(parse_intent_locally(query, strict=False, entities=entities), source="local_fallback")
+    return dict(_parse_llm_response(response), source="llm")
+
+
+async def get_intent_async(query, timeout=LLM_TIMEOUT, entities=()):
+    """Async version of get_intent, with a deadline on the Gemini call."""
+    with tracing.span("intent") as span:
+        key = (normalize_query(query), datetime.now().strftime("%Y-%m"))
+        cached = INTENT_CACHE.get(key)
+        if cached is not None:
+            span.tag(intent=cached.get("intent"), source="cache", cache_hit=True)
+            return dict(cached, source="cache")
+
+        intent_data = parse_intent_locally(query, entities=entities)
+        if intent_data is None:
+            intent_data = await get_intent_from_llm_async(query, timeout, entities)
+        # Failures and fallback guesses are not cached, so the question is retried with Gemini next time.
+        if _cacheable(intent_data):
+            INTENT_CACHE.set(key, intent_data)
+        span.tag(intent=intent_data.get("intent"), source=intent_data.get("source"), cache_hit=False)
+        return intent_data
+
+
+async def run_query_async(queries, data, timeout=LLM_TIMEOUT):
+    """
+    Async version of run_query.
+
+    Accepts a single question or a list of questions. Intents for a list are
+    resolved concurrently, and the tools run in a worker thread so the event
+    loop is never blocked by pandas.
+    """
+    single = isinstance(queries, str)
+    batch = [queries] if single else list(queries)
+
+    with tracing.span("query", questions=len(batch)):
+        entities = tools.entities(data)
+        intents = await asyncio.gather(*(get_intent_async(query, timeout, entities) for query in batch))
+        results = []
+        for intent_data in intents:
+            result = await asyncio.to_thread(run_intent, intent_data, data)
+            result["source"] = intent_data.get("source")
+            results.append(result)
+    return results[0] if single else results
 
 
 
 def run_query(query, data):
     """
     Main function to route the query to the correct tool.
+
+    Each call is traced as a 'query' span with 'intent' and 'tool' children;
+    see agent.tracing for where the timings go.
+    """
+    with tracing.span("query", query=query) as span:
+        intent_data = get_intent(query, tools.entities(data))
+        span.tag(intent=intent_data.get("intent"), params=json.dumps(intent_data.get("params") or {}), source=intent_data.get("source"))
+
+        result = run_intent(intent_data, data)
+        result["source"] = intent_data.get("source")
+    return result
+
+
+def run_intent(intent_data, data):
+    """
+    Runs the tool for an already-resolved intent.
+
+    Results are cached per data version, so a reload or append_month never
+    serves stale numbers. Data without a version is never cached.
+    """
+    with tracing.span("tool", intent=intent_data.get("intent")) as span:
+        version = data.get("version")
+        if version is None:
+            span.tag(cache_hit=False)
+            return _run_tool(intent_data, data)
+
+        key = _result_key(intent_data, version)
+        cached = RESULT_CACHE.get(key)
+        span.tag(cache_hit=cached is not None)
+        if cached is None:
+            cached = _run_tool(intent_data, data)
+            RESULT_CACHE.set(key, cached)
+        return dict(cached)
+
+
+def _result_key(intent_data, version):
+    """
+    RESULT_CACHE key for an intent, with its params normalized.
+
+    Params that _run_tool treats alike give one key: empty params and defaults
+    are dropped, currencies are upper-cased and months are spelled out, so
+    'EBITDA for june 2025' and a warmed-up 'June 2025' share an entry.
     """
-    intent_data = get_intent(query)
     intent = intent_data.get("intent")
-    params = intent_data.get("params", {})
-    currency = params.get("currency", "USD")
-    if currency not in ['USD', 'EUR']:
-        currency = 'USD'
+    params = {name: value for name, value in (intent_data.get("params") or {}).items() if value not in (None, "", [])}
+    if "currency" in params:
+        params["currency"] = str(params["currency"]).upper()
+        if params["currency"] == "USD":
+            del params["currency"]
+    period = tools._parse_month(params.get("month_str"))
+    if period is not None:
+        params["month_str"] = period.strftime("%B %Y")
+    if intent == "gross_margin_trend" and params.get("latest_n_months") == 3:
+        del params["latest_n_months"]
+    return (intent, freeze(params), version)
+
 
-    print(f"DEBUG: Intent={intent}, Params={params}") # For debugging
+def _run_tool(intent_data, data):
+    """Dispatches an intent to the matching function in tools."""
+    intent = intent_data.get("intent")
+    params = intent_data.get("params") or {}
+    currency = (params.get("currency") or "USD").upper()
+    if currency not in tools.supported_currencies(data):
+        currency = 'USD'
 
     if intent == "revenue":
         month_str = params.get("month_str")
         if not month_str:
             return {"response": "You asked about revenue, but didn't specify a month. Please be more specific.", "figure": None}
-        return tools.get_revenue(data, month_str, currency)
+        return tools.get_revenue(data, month_str, currency, params.get("entity"))
 
     elif intent == "gross_margin_trend":
-        latest_n_months = params.get("latest_n_months", 3)
-        return tools.get_gross_margin_trend(data, latest_n_months)
+        return tools.get_gross_margin_trend(data, int(params.get("latest_n_months") or 3))
     
     elif intent == "opex_breakdown":
         month_str = params.get("month_str")
         if not month_str:
             return {"response": "You asked about OPEX breakdown, but didn't specify a month. Please be more specific.", "figure": None}
-        return tools.get_opex_breakdown(data, month_str, currency)
+        return tools.get_opex_breakdown(data, month_str, currency, params.get("entity"))
 
     elif intent == "ebitda":
         month_str = params.get("month_str")
         if not month_str:
             return {"response": "You asked about EBITDA, but didn't specify a month. Please be more specific.", "figure": None}
-        return tools.get_ebitda(data, month_str, currency)
+        return tools.get_ebitda(data, month_str, currency, params.get("entity"))
 
     elif intent == "cash_runway":
+        if params.get("burn") == "forecast":
+            return tools.get_cash_runway(data, currency, burn="forecast")
         return tools.get_cash_runway(data, currency)
+
+    elif intent == "runway_sensitivity":
+        return tools.get_runway_sensitivity(data, currency)
+
+    elif intent == "variance":
+        return tools.get_variance_drivers(
+            data, params.get("month_str"), params.get("window"), params.get("latest_n_months"), currency,
+            int(params.get("top_k") or 10), float(params.get("threshold") or 0.0), params.get("threshold_pct")
+        )
+
+    elif intent == "forecast":
+        return tools.get_forecast(
+            data, params.get("metric") or "ebitda", int(params.get("horizon") or 12), currency,
+            params.get("entity"), params.get("method") or "auto"
+        )
+
+    elif intent == "plan":
+        return tools.get_plan(
+            data, params.get("intents") or [], params.get("month_str"), currency,
+            params.get("entity"), params.get("window"), params.get("latest_n_months") or 3
+        )
+
+    elif intent in WINDOW_PATTERNS:
+        return tools.get_range_metric(
+            data, params.get("metric") or "ebitda", params.get("month_str"), intent,
+            currency, params.get("entity"), params.get("latest_n_months") or 3
+        )
     
     else: # Handles "unknown" intent
         return {
@@ -107,6 +679,10 @@ def run_query(query, data):
                         "- Gross Margin trends\n"
                         "- Opex breakdowns\n"
                         "- EBITDA\n"
-                        "- Cash runway",
+                        "- Cash runway, including scenario sensitivity\n"
+                        "- Year-to-date, quarter-to-date, trailing-12-month and rolling figures\n"
+                        "- Several of revenue, EBITDA and opex at once, e.g. for a quarter\n"
+                        "- The largest budget variances across every month, entity and account\n"
+                        "- Forecasts of revenue, COGS, opex and EBITDA for the coming months",
             "figure": None
         }
\ No newline at end of file
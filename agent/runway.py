@@ -0,0 +1,95 @@
+"""
+Cash runway projections for many scenarios at once.
+
+A scenario is a (burn growth, revenue shock, averaging window) triple. Every
+scenario is projected in one NumPy pass as a scenarios x months matrix of cash
+balances, and the runway of each is where its row first crosses zero.
+"""
+import itertools
+
+import numpy as np
+
+
+DEFAULT_BURN_GROWTH = (-0.05, -0.02, 0.0, 0.02, 0.05, 0.1)
+DEFAULT_REVENUE_SHOCKS = (0.0, -0.1, -0.25, -0.5, -0.75)
+DEFAULT_WINDOWS = (3, 6, 12)
+
+
+def scenario_grid(burn_growth=(0.0,), revenue_shock=(0.0,), windows=(3,)):
+    """Every combination of the given parameters, as three parallel arrays."""
+    combos = np.array(list(itertools.product(burn_growth, revenue_shock, windows)), dtype='float64').reshape(-1, 3)
+    return combos[:, 0], combos[:, 1], combos[:, 2].astype('int64')
+
+
+def trailing_means(values, windows):
+    """
+    Mean of the last w entries of `values` for every w in `windows`, from one cumulative sum.
+
+    Windows longer than the history use all of it.
+    """
+    sums = np.concatenate([[0.0], np.cumsum(np.asarray(values, dtype='float64')[::-1])])
+    counts = np.minimum(windows, len(values))
+    return sums[counts] / np.maximum(counts, 1)
+
+
+def project(cash, burn, growth, horizon):
+    """
+    Cash balances for months 0..horizon of every scenario, as a (scenarios x horizon+1) matrix.
+
+    Month t's burn is burn * (1 + growth) ** (t - 1); column 0 is today's cash.
+    """
+    burn = np.asarray(burn, dtype='float64')[:, None]
+    factors = (1.0 + np.asarray(growth, dtype='float64'))[:, None] ** np.arange(horizon)[None, :]
+    spent = np.cumsum(burn * factors, axis=1)
+    return np.hstack([np.full((len(burn), 1), float(cash)), cash - spent])
+
+
+def zero_crossing(balances):
+    """
+    Months until each row of `balances` first reaches zero, interpolated within the month.
+
+    Rows that never reach zero within the horizon get NaN.
+    """
+    below = balances <= 0
+    crossed = below.any(axis=1)
+    first = np.where(crossed, below.argmax(axis=1), 1)
+    rows = np.arange(len(balances))
+    before = balances[rows, np.maximum(first - 1, 0)]
+    after = balances[rows, first]
+    step = np.divide(before, before - after, out=np.zeros_like(before), where=before != after)
+    runway = np.where(first == 0, 0.0, first - 1 + step)
+    return np.where(crossed, runway, np.nan)
+
+
+def runway_scenarios(cash, monthly_ebitda, monthly_revenue, burn_growth=(0.0,), revenue_shock=(0.0,), windows=(3,), horizon=120):
+    """
+    Projects cash for every combination of burn growth, revenue shock and averaging window.
+
+    `monthly_ebitda` and `monthly_revenue` are the history up to today, oldest
+    first. A scenario's starting burn is minus its window's average EBITDA,
+    less `revenue_shock` times its average revenue (a -0.1 shock loses 10% of
+    revenue), and then grows by `burn_growth` a month. Returns the scenario
+    parameters, each scenario's starting burn, the balance matrix and the
+    runway in months (NaN when cash lasts beyond the horizon).
+    """
+    growth, shock, window = scenario_grid(burn_growth, revenue_shock, windows)
+    burn = -(trailing_means(monthly_ebitda, window) + shock * trailing_means(monthly_revenue, window))
+    balances = project(cash, burn, growth, horizon)
+    return {
+        "burn_growth": growth,
+        "revenue_shock": shock,
+        "window": window,
+        "burn": burn,
+        "balances": balances,
+        "runway": zero_crossing(balances),
+    }
+
+
+def runway_distribution(runway):
+    """Summary statistics of scenario runways; scenarios that never run out count as unbounded."""
+    finite = runway[~np.isnan(runway)]
+    summary = {"scenarios": int(len(runway)), "never_run_out": int(len(runway) - len(finite))}
+    if len(finite):
+        p10, median, p90 = np.percentile(finite, [10, 50, 90])
+        summary.update(min=float(finite.min()), p10=float(p10), median=float(median), p90=float(p90), max=float(finite.max()))
+    return summary
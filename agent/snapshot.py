@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+SOURCE_FILES = ['actuals.csv', 'budget.csv', 'cash.csv', 'fx.csv']
+SNAPSHOT_DIR = '.snapshot'
+MANIFEST = 'manifest.json'
+# Bump when the set or layout of prepared frames changes, so old snapshots are rebuilt.
+FORMAT_VERSION = 6
+
+
+def _file_hash(path):
+    """Returns the sha256 hex digest of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(data_dir, previous=None):
+    """
+    Fingerprints the source CSVs by size, mtime and content hash.
+
+    Files whose size and mtime match `previous` (an earlier fingerprint) reuse
+    its hash, so an unchanged tree is checked with a stat() per file.
+    """
+    previous = previous or {}
+    fingerprint = {}
+    for name in SOURCE_FILES:
+        stat = os.stat(os.path.join(data_dir, name))
+        entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        old = previous.get(name, {})
+        if old.get('size') == entry['size'] and old.get('mtime_ns') == entry['mtime_ns']:
+            entry['sha256'] = old['sha256']
+        else:
+            entry['sha256'] = _file_hash(os.path.join(data_dir, name))
+        fingerprint[name] = entry
+    return fingerprint
+
+
+def snapshot_key(fingerprint):
+    """Derives the snapshot key from the content hashes of a fingerprint."""
+    digest = hashlib.sha256(f'v{FORMAT_VERSION}'.encode())
+    for name in SOURCE_FILES:
+        digest.update(fingerprint[name]['sha256'].encode())
+    return digest.hexdigest()[:16]
+
+
+def _write_frame(frame, path):
+    """Writes a frame as one .npy file per column and returns its column specs."""
+    os.makedirs(path)
+    columns = []
+    for i, col in enumerate(frame.columns):
+        values = frame[col]
+        spec = {'name': col, 'file': f'{i}.npy'}
+        if not (pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_dtype(values)):
+            values = values.astype('category')
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            spec['categories'] = [str(c) for c in values.cat.categories]
+            array = values.cat.codes.to_numpy()
+        else:
+            array = values.to_numpy()
+        np.save(os.path.join(path, spec['file']), array, allow_pickle=False)
+        columns.append(spec)
+    return columns
+
+
+def _read_frame(path, columns, mmap=True):
+    """Reads a frame written by _write_frame, memory-mapping each column."""
+    mmap_mode = 'r' if mmap else None
+    values = {}
+    for spec in columns:
+        array = np.load(os.path.join(path, spec['file']), mmap_mode=mmap_mode, allow_pickle=False)
+        # A plain ndarray view of the map: still zero-copy, but pandas treats it like any array.
+        array = array.view(np.ndarray)
+        if 'categories' in spec:
+            array = pd.Categorical.from_codes(array, spec['categories'])
+        values[spec['name']] = array
+    return pd.DataFrame(values, copy=False)
+
+
+def _write_cube(cube, path):
+    """
+    Writes a MultiIndexed cube as its index level codes plus one 2-D values array.
+
+    Reading it back maps the codes and values as they are, so a cube is not
+    re-factorized or copied on load.
+    """
+    os.makedirs(path)
+    levels = []
+    for i, (level, codes) in enumerate(zip(cube.index.levels, cube.index.codes)):
+        np.save(os.path.join(path, f'codes-{i}.npy'), np.asarray(codes), allow_pickle=False)
+        levels.append({'name': level.name, 'file': f'codes-{i}.npy', 'dtype': str(level.dtype), 'values': level.tolist()})
+    np.save(os.path.join(path, 'values.npy'), np.ascontiguousarray(cube.to_numpy(dtype='float64')), allow_pickle=False)
+    columns = cube.columns
+    return {
+        'levels': levels,
+        'columns': [list(c) if isinstance(c, tuple) else [c] for c in columns],
+        'column_names': list(columns.names),
+        'values': 'values.npy',
+    }
+
+
+def _read_cube(path, spec, mmap=True):
+    """Reads a cube written by _write_cube, memory-mapping its codes and values."""
+    mmap_mode = 'r' if mmap else None
+    load = lambda name: np.load(os.path.join(path, name), mmap_mode=mmap_mode, allow_pickle=False).view(np.ndarray)
+    index = pd.MultiIndex(
+        levels=[pd.Index(level['values'], dtype=level['dtype'], name=level['name']) for level in spec['levels']],
+        codes=[load(level['file']) for level in spec['levels']],
+        names=[level['name'] for level in spec['levels']],
+        verify_integrity=False,
+    )
+    if len(spec['column_names']) > 1:
+        columns = pd.MultiIndex.from_tuples([tuple(c) for c in spec['columns']], names=spec['column_names'])
+    else:
+        columns = pd.Index([c[0] for c in spec['columns']], name=spec['column_names'][0])
+    return pd.DataFrame(load(spec['values']), index=index, columns=columns, copy=False)
+
+
+def write_frames(path, frames):
+    """
+    Writes prepared frames under `path` (one directory per frame) and returns their layout.
+
+    Frames with a MultiIndex (the cubes) are written with _write_cube, the
+    rest one column per file.
+    """
+    return {
+        name: {'cube': _write_cube(frame, os.path.join(path, name))} if isinstance(frame.index, pd.MultiIndex)
+        else _write_frame(frame, os.path.join(path, name))
+        for name, frame in frames.items()
+    }
+
+
+def read_frames(path, layout, mmap=True):
+    """Maps the frames written by write_frames back in, without copying their data."""
+    return {
+        name: _read_cube(os.path.join(path, name), spec['cube'], mmap) if isinstance(spec, dict)
+        else _read_frame(os.path.join(path, name), spec, mmap)
+        for name, spec in layout.items()
+    }
+
+
+def write_snapshot(data_dir, frames, fingerprint):
+    """
+    Writes prepared frames to <data_dir>/.snapshot/<key>/ and points the manifest at it.
+
+    The snapshot directory is built under a temporary name and renamed into
+    place, and the manifest is swapped with os.replace, so a reader never sees a
+    half-written snapshot.
+    """
+    root = os.path.join(data_dir, SNAPSHOT_DIR)
+    key = snapshot_key(fingerprint)
+    tmp = os.path.join(root, f'{key}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    layout = write_frames(tmp, frames)
+
+    target = os.path.join(root, key)
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp, target)
+
+    write_manifest(root, {'key': key, 'fingerprint': fingerprint, 'frames': layout})
+
+    for entry in os.listdir(root):
+        if entry not in (key, MANIFEST) and '.tmp-' not in entry:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return key
+
+
+def write_manifest(root, manifest):
+    """Atomically replaces the manifest in a snapshot root."""
+    manifest_tmp = os.path.join(root, f'{MANIFEST}.tmp-{os.getpid()}')
+    with open(manifest_tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_tmp, os.path.join(root, MANIFEST))
+
+
+def read_manifest(data_dir):
+    """Returns the current snapshot manifest, or None if there is none."""
+    try:
+        with open(os.path.join(data_dir, SNAPSHOT_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(data_dir, mmap=True):
+    """
+    Loads the prepared frames from the snapshot if it matches the source CSVs.
+
+    Returns (frames, fingerprint). `frames` is None when there is no snapshot or
+    any source file has changed since it was written; the fingerprint can then
+    be passed to write_snapshot to avoid hashing the files twice.
+    """
+    manifest = read_manifest(data_dir)
+    fingerprint = source_fingerprint(data_dir, manifest['fingerprint'] if manifest else None)
+    if manifest is None or snapshot_key(fingerprint) != manifest['key']:
+        return None, fingerprint
+
+    if fingerprint != manifest['fingerprint']:
+        # Files were touched but not changed: record the new mtimes so the next
+        # start does not hash them again.
+        manifest['fingerprint'] = fingerprint
+        try:
+            write_manifest(os.path.join(data_dir, SNAPSHOT_DIR), manifest)
+        except OSError:
+            pass
+
+    path = os.path.join(data_dir, SNAPSHOT_DIR, manifest['key'])
+    try:
+        frames = read_frames(path, manifest['frames'], mmap)
+    except (OSError, ValueError):
+        return None, fingerprint
+    return frames, fingerprint
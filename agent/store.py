@@ -0,0 +1,188 @@
+"""
+A versioned store of prepared data shared by several processes on one host.
+
+One process publishes the prepared frames into the store directory (under
+/dev/shm by default, so the files live in shared memory rather than on disk)
+and every process attaches to the current version read-only. Attaching
+memory-maps the same pages, so N server or batch processes hold one copy of
+the ledgers and cubes instead of N.
+
+Each version has its own directory, and the manifest names the live one.
+Publishing writes a complete new version directory and then swaps the
+manifest with os.replace, so a reader sees either the old version or the new
+one, never a mix. SharedData re-reads the manifest on each get() and swaps to
+a newly published version between questions.
+
+Usage:
+    python -m agent.store publish [--data-dir fixtures] [--store-dir /dev/shm/cfo-copilot]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+from agent import snapshot as snapshots
+from agent import tools
+from agent.cube import reporting_cube
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishers are not serialized, but each publish is still atomic.
+    fcntl = None
+
+
+LOCK_FILE = '.lock'
+
+
+def default_store_dir():
+    """$CFO_STORE_DIR, else a directory in /dev/shm when the host has one, else in the temp dir."""
+    if os.getenv('CFO_STORE_DIR'):
+        return os.getenv('CFO_STORE_DIR')
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(root, 'cfo-copilot')
+
+
+def read_current(store_dir=None):
+    """Returns the manifest of the live version, or None if nothing has been published."""
+    try:
+        with open(os.path.join(store_dir or default_store_dir(), snapshots.MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _publish_lock(store_dir):
+    """Serializes publishers across processes, so only one of them prepares the data."""
+    os.makedirs(store_dir, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(store_dir, LOCK_FILE), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish(data, store_dir=None, fingerprint=None):
+    """
+    Publishes prepared data as the store's live version and returns that version.
+
+    The version is data['version']; publishing a version that is already live
+    does nothing. Versions older than the previous one are removed. Readers
+    that still map them keep working, since mapped files outlive their unlink.
+    """
+    store_dir = store_dir or default_store_dir()
+    version = data['version']
+    current = read_current(store_dir)
+    if current is not None and current['version'] == version:
+        return version
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp = os.path.join(store_dir, f'{version}.tmp-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    layout = snapshots.write_frames(tmp, {name: frame for name, frame in data.items() if isinstance(frame, pd.DataFrame)})
+
+    target = os.path.join(store_dir, version)
+    if os.path.isdir(target):
+        # Another process already wrote this version; it has the same contents.
+        shutil.rmtree(tmp, ignore_errors=True)
+    else:
+        os.rename(tmp, target)
+
+    keep = {version, current['version'] if current else None, snapshots.MANIFEST, LOCK_FILE}
+    snapshots.write_manifest(store_dir, {'version': version, 'fingerprint': fingerprint, 'frames': layout})
+    for entry in os.listdir(store_dir):
+        if entry not in keep and '.tmp-' not in entry:
+            shutil.rmtree(os.path.join(store_dir, entry), ignore_errors=True)
+    return version
+
+
+def attach(store_dir=None):
+    """
+    Maps the live version read-only and returns it as a data dict, or None if nothing is published.
+
+    The frames are views of the store's files, not copies.
+    """
+    store_dir = store_dir or default_store_dir()
+    for _ in range(3):
+        current = read_current(store_dir)
+        if current is None:
+            return None
+        try:
+            data = snapshots.read_frames(os.path.join(store_dir, current['version']), current['frames'])
+        except (OSError, ValueError):
+            # Pruned between reading the manifest and opening the files; a
+            # newer version is live, so read the manifest again.
+            continue
+        data['version'] = current['version']
+        return data
+    return None
+
+
+def load_shared(data_dir='fixtures', store_dir=None):
+    """
+    Attaches to the store, first publishing the data in `data_dir` if the store doesn't have it yet.
+
+    Only one process at a time checks and publishes; the others wait and then
+    attach to what it published instead of preparing the data themselves.
+    """
+    store_dir = store_dir or default_store_dir()
+    with _publish_lock(store_dir):
+        current = read_current(store_dir)
+        fingerprint = snapshots.source_fingerprint(data_dir, current.get('fingerprint') if current else None)
+        if current is None or current['version'] != snapshots.snapshot_key(fingerprint):
+            data = tools.load_and_prepare_data(data_dir)
+            # Convert every reporting currency up front: a reader converting one
+            # itself would end up with a private copy of the cube.
+            for currency in tools.supported_currencies(data):
+                reporting_cube(data, currency)
+            publish(data, store_dir, fingerprint)
+    return attach(store_dir)
+
+
+class SharedData:
+    """
+    A reader's handle on the store that follows new versions.
+
+    get() returns the data for the live version, re-attaching only when a new
+    version has been published since the last call. Hold on to the returned
+    dict for the length of one question, so every step of it sees one version.
+    """
+
+    def __init__(self, store_dir=None, data=None):
+        self.store_dir = store_dir or default_store_dir()
+        self.data = data
+
+    def get(self):
+        current = read_current(self.store_dir)
+        if current is not None and (self.data is None or self.data.get('version') != current['version']):
+            data = attach(self.store_dir)
+            if data is not None:
+                self.data = data
+        return self.data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['publish', 'info'])
+    parser.add_argument('--data-dir', default='fixtures')
+    parser.add_argument('--store-dir', help="store directory (default: $CFO_STORE_DIR or /dev/shm/cfo-copilot)")
+    args = parser.parse_args(argv)
+
+    store_dir = args.store_dir or default_store_dir()
+    if args.command == 'publish':
+        load_shared(args.data_dir, store_dir)
+    current = read_current(store_dir)
+    print(f"{store_dir}: " + (f"version {current['version']}" if current else "nothing published"))
+
+
+if __name__ == '__main__':
+    main()
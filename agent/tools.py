@@ -1,8 +1,18 @@
+import os
+import itertools
+import numpy as np
 import pandas as pd
-import plotly.express as px
 from datetime import datetime
-import plotly.graph_objects as go
 from math import ceil
+from agent import charts, forecast, runway, tracing, variance
+from agent.cube import (
+    SCENARIOS, EAGER_CURRENCIES, CONSOLIDATED, build_cube, build_local_cube, get_cube, reporting_cube,
+    cube_currencies, month_totals, monthly_totals, monthly_category_totals, dense_months, window_totals, window_start,
+    aggregate_local, fold, fold_sorted, assemble_local, convert_cube, month_key, month_keys,
+    key_to_period, latest_months
+)
+from agent.fx import get_fx, currency_sign, monthly_from_daily
+from agent import snapshot as snapshots
 
 
 def _clean_financial_value(value):
@@ -22,216 +32,1038 @@ def _parse_date(date_str):
     return datetime.strptime(date_str, '%Y-%m')
 
 
-def load_and_prepare_data():
-    """Loads, cleans, and prepares all financial data from CSVs."""
-    actuals = pd.read_csv('fixtures/actuals.csv')
-    budget = pd.read_csv('fixtures/budget.csv')
-    fx = pd.read_csv('fixtures/fx.csv')
-    cash = pd.read_csv('fixtures/cash.csv')
+def _clean_financial_series(series):
+    """Vectorized version of _clean_financial_value for a whole column."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64').fillna(0.0)
+    values = series.fillna('0').astype('str').str.strip().str.replace(r'[$,]', '', regex=True)
+    negative = values.str.startswith('(') & values.str.endswith(')')
+    values = values.str.strip('()').where(values != '-', '0')
+    cleaned = values.astype('float64')
+    return cleaned.where(~negative, -cleaned)
 
-    actuals['amount'] = actuals['amount'].apply(_clean_financial_value)
-    budget['amount'] = budget['amount'].apply(_clean_financial_value)
-    cash['cash_usd'] = cash['cash_usd'].apply(_clean_financial_value)
 
-    actuals['month'] = actuals['month'].apply(_parse_date)
-    budget['month'] = budget['month'].apply(_parse_date)
-    cash['month'] = cash['month'].apply(_parse_date)
-    fx['month'] = pd.to_datetime(fx['month'])
+def _parse_month_series(series):
+    """Vectorized version of _parse_date for a whole column."""
+    return pd.to_datetime(series, format='%Y-%m')
 
-    euro_rates = fx[fx['currency'] == 'EUR'][['month', 'rate_to_usd']].rename(columns={'rate_to_usd': 'rate_to_eur'})
-    fx = pd.merge(fx, euro_rates, on='month', how='left')
-    fx['rate_to_eur'] = fx['rate_to_usd'] / fx['rate_to_eur']
-    euro_rates = fx[fx['currency'] == 'USD'][['month', 'rate_to_eur']]
 
+LEDGER_DTYPES = {'month': 'str', 'entity': 'category', 'account_category': 'category', 'currency': 'category'}
+CASH_DTYPES = {'month': 'str', 'entity': 'category'}
+FX_DTYPES = {'month': 'str', 'date': 'str', 'currency': 'category', 'rate_to_usd': 'float64'}
 
-    # Merge with FX rates
-    actuals = pd.merge(actuals, fx, on=['month', 'currency'], how='left')
-    budget = pd.merge(budget, fx, on=['month', 'currency'], how='left')
-    cash = pd.merge(cash, euro_rates, on='month', how='left')
 
+def load_and_prepare_data(data_dir='fixtures', snapshot=True, chunksize=None):
+    """
+    Loads, cleans, and prepares all financial data from CSVs.
 
-    actuals['amount_usd'] = actuals['amount'] * actuals['rate_to_usd']
-    budget['amount_usd'] = budget['amount'] * budget['rate_to_usd']
-    actuals['amount_eur'] = actuals['amount'] * actuals['rate_to_eur']
-    budget['amount_eur'] = budget['amount'] * budget['rate_to_eur']
-    cash['cash_eur'] = cash['cash_usd'] * cash['rate_to_eur']
+    With `snapshot=True` the prepared frames are served from a memory-mapped
+    snapshot in <data_dir>/.snapshot when it matches the CSVs, and the snapshot
+    is rewritten whenever any CSV has changed.
 
-    actuals.drop(columns=['amount', 'currency', 'rate_to_usd', 'rate_to_eur'], inplace=True)
-    budget.drop(columns=['amount', 'currency', 'rate_to_usd', 'rate_to_eur'], inplace=True)
-    cash.drop(columns=['rate_to_eur'], inplace=True)
+    With `chunksize` set, actuals and budget are streamed in chunks of that many
+    rows and folded straight into the cube; the row-level ledgers are not kept,
+    so peak memory is set by the chunk size rather than the file size. Every
+    tool works from the cube, so all questions are still answerable.
+    """
+    if chunksize:
+        data = _prepare_chunked(data_dir, chunksize)
+        data['version'] = snapshots.snapshot_key(snapshots.source_fingerprint(data_dir))
+        return data
 
+    if not snapshot:
+        data = _prepare_from_csv(data_dir)
+        data['version'] = snapshots.snapshot_key(snapshots.source_fingerprint(data_dir))
+        return data
+
+    frames, fingerprint = snapshots.load_snapshot(data_dir)
+    if frames is not None:
+        frames['version'] = snapshots.snapshot_key(fingerprint)
+        return frames
+
+    data = _prepare_from_csv(data_dir)
+    data['version'] = snapshots.snapshot_key(fingerprint)
+    frames = {name: frame for name, frame in data.items() if isinstance(frame, pd.DataFrame)}
+    try:
+        snapshots.write_snapshot(data_dir, frames, fingerprint)
+    except OSError as e:
+        print(f"Could not write data snapshot: {e}")
+    return data
+
+
+def _prepare_from_csv(data_dir):
+    """
+    Reads the CSVs in `data_dir` and runs the full cleaning and FX pipeline.
+
+    Ledgers keep their local-currency amounts; FX conversion happens on the
+    aggregated cube, and row-level converted amounts are only computed when
+    asked for (see ledger_amounts).
+    """
+    actuals = _clean_ledger(pd.read_csv(os.path.join(data_dir, 'actuals.csv'), dtype=LEDGER_DTYPES))
+    budget = _clean_ledger(pd.read_csv(os.path.join(data_dir, 'budget.csv'), dtype=LEDGER_DTYPES))
+    fx = _prepare_fx(pd.read_csv(os.path.join(data_dir, 'fx.csv'), dtype=FX_DTYPES))
+    cash = _clean_cash(pd.read_csv(os.path.join(data_dir, 'cash.csv'), dtype=CASH_DTYPES))
+
+    data = {
+        "actuals": _sort_by_month(actuals),
+        "budget": _sort_by_month(budget),
+        "cash": _sort_by_month(cash),
+        "fx": fx
+    }
+    data["cube"] = build_cube(data)
+
+    return data
+
+
+def _prepare_chunked(data_dir, chunksize):
+    """Streams actuals and budget through clean/aggregate one chunk at a time, then converts the cube."""
+    fx = _prepare_fx(pd.read_csv(os.path.join(data_dir, 'fx.csv'), dtype=FX_DTYPES))
+    cash = _clean_cash(pd.read_csv(os.path.join(data_dir, 'cash.csv'), dtype=CASH_DTYPES))
+
+    parts = {}
+    for name, scenario in SCENARIOS.items():
+        totals = None
+        for chunk in pd.read_csv(os.path.join(data_dir, f'{name}.csv'), dtype=LEDGER_DTYPES, chunksize=chunksize):
+            totals = fold(totals, aggregate_local(_clean_ledger(chunk)))
+        if totals is not None:
+            parts[scenario] = totals
+
+    data = {"cash": _sort_by_month(cash), "fx": fx, "local_cube": assemble_local(parts)}
+    data["cube"] = convert_cube(data["local_cube"], get_fx(data), EAGER_CURRENCIES)
+    return data
+
+
+def _clean_ledger(frame):
+    """Cleans the amount and month columns of a raw actuals/budget frame."""
+    month = _parse_month_series(frame['month'])
+    account_category = frame['account_category'].astype('category')
+    return frame.assign(
+        amount=_clean_financial_series(frame['amount']),
+        month=month,
+        month_key=month_keys(month),
+        entity=frame['entity'].astype('category'),
+        account_category=account_category,
+        currency=frame['currency'].astype('category'),
+        opex_category=_opex_subcategories(account_category),
+    )
+
+
+def _clean_cash(frame):
+    """Cleans the cash_usd and month columns of a raw cash frame."""
+    month = _parse_month_series(frame['month'])
+    return frame.assign(
+        cash_usd=_clean_financial_series(frame['cash_usd']),
+        month=month,
+        month_key=month_keys(month),
+        entity=frame['entity'].astype('category'),
+    )
+
+
+def _sort_by_month(frame):
+    """Stable-sorts a prepared frame by month_key so month ranges are contiguous."""
+    if frame['month_key'].is_monotonic_increasing:
+        return frame
+    return frame.sort_values('month_key', kind='stable', ignore_index=True)
+
+
+def _prepare_fx(fx):
+    """
+    Cleans a raw FX frame into monthly (month, month_key, currency, rate_to_usd) rows.
+
+    A daily table (with a 'date' column instead of 'month') is collapsed to
+    monthly average rates, carrying the last rate forward into months without
+    quotes.
+    """
+    fx = fx.assign(currency=fx['currency'].astype('str'), rate_to_usd=fx['rate_to_usd'].astype('float64'))
+    if 'date' in fx:
+        return monthly_from_daily(fx)
+    month = _parse_month_series(fx['month'])
+    return fx.assign(month=month, month_key=month_keys(month))[['month', 'month_key', 'currency', 'rate_to_usd']]
+
+
+def _opex_subcategories(account_category):
+    """
+    Splits 'Opex:Marketing' style categories into a categorical 'Marketing' column.
+
+    The split runs once per distinct category and the row codes are remapped,
+    so it costs one integer gather over the rows. Non-Opex rows are missing.
+    """
+    categories = account_category.cat.categories
+    names = categories.str.split(':', n=1).str[1].where(categories.str.startswith('Opex'))
+    subcategories = pd.Index(names.dropna().unique()).sort_values()
+    code_map = np.append(subcategories.get_indexer(names), -1)
+    return pd.Categorical.from_codes(code_map[account_category.cat.codes.to_numpy()], subcategories)
+
+
+def ledger_amounts(data, name, currency='USD'):
+    """
+    Row-level amounts of data[name] ('actuals' or 'budget') in `currency`.
+
+    The conversion is one FX gather over the rows; the result is kept as an
+    amount_<currency> column so each currency is converted once.
+    """
+    frame = data[name]
+    column = f'amount_{currency.lower()}'
+    if column not in frame:
+        frame[column] = get_fx(data).convert(frame['amount'], frame['month_key'], frame['currency'], currency)
+    return frame[column]
+
+
+def cash_amounts(data, currency='USD'):
+    """
+    Each month's cash balance in `currency`, converted from USD on first request and kept as a cash_<currency> column.
+
+    Balances are converted at the month's rate in data['fx'], which for daily
+    rates is the monthly average rather than the month-end rate.
+    """
+    cash = data['cash']
+    column = f'cash_{currency.lower()}'
+    if column not in cash:
+        cash[column] = get_fx(data).convert(cash['cash_usd'], cash['month_key'], 'USD', currency)
+    return cash[column]
+
+
+def _append_rows(frame, rows):
+    """Appends rows to a prepared frame, keeping categorical columns categorical."""
+    rows = rows.copy()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            values = rows[col].astype('object')
+            categories = frame[col].cat.categories.union(pd.Index(values.dropna().unique()).astype('str'))
+            frame[col] = frame[col].cat.set_categories(categories)
+            rows[col] = pd.Categorical(values, categories=categories)
+    combined = pd.concat([frame, rows], ignore_index=True)
+    # Back-dated rows are the only case that needs a re-sort.
+    return _sort_by_month(combined) if 'month_key' in combined else combined
+
+
+def _convert_like(data, frame, rows):
+    """
+    Adds to new `rows` the amount_<currency>/cash_<currency> columns already kept on `frame`.
+
+    Those columns are converted on first request and then kept, so rows
+    appended without them would read as NaN in that currency.
+    """
+    fx = get_fx(data)
+    for col in frame.columns:
+        if col in rows:
+            continue
+        if col.startswith('amount_'):
+            rows[col] = fx.convert(rows['amount'], rows['month_key'], rows['currency'], col[len('amount_'):].upper())
+        elif col.startswith('cash_'):
+            rows[col] = fx.convert(rows['cash_usd'], rows['month_key'], 'USD', col[len('cash_'):].upper())
+    return rows
+
+
+_append_counter = itertools.count(1)
+
+
+def append_month(data, actuals=None, budget=None, cash=None, fx=None):
+    """
+    Appends newly closed rows to prepared data in place.
+
+    Each argument is a raw frame in the same layout as its CSV in fixtures/.
+    Only the new rows are cleaned and aggregated; the results are appended to
+    the existing frames, and the local-currency aggregates are folded into the
+    local cube and, converted to each reporting currency already in the cube,
+    into the cube. The FX rates for every new month must be in `fx` or already
+    loaded. The data version is bumped so cached answers for the old data are
+    not reused.
+    """
+    if fx is not None:
+        new_fx = _prepare_fx(fx)
+        data['fx'] = _append_rows(data['fx'], new_fx) if 'fx' in data else new_fx
+        data.pop('fx_rates', None)
+    data.pop('variance_cells', None)
+    data.pop('forecast_series', None)
+
+    ledgers = {}
+    for name, rows in (('actuals', actuals), ('budget', budget)):
+        if rows is None or rows.empty:
+            continue
+        rows = _clean_ledger(rows)
+        unconverted = np.isnan(get_fx(data).factors(rows['month_key'], rows['currency'], 'USD'))
+        if unconverted.any():
+            missing = sorted(rows.loc[unconverted, 'month'].dt.strftime('%Y-%m').unique())
+            raise ValueError(f"No FX rates for {name} rows in {', '.join(missing)}.")
+        ledgers[name] = rows
+
+    if cash is not None and not cash.empty:
+        data['cash'] = _append_rows(data['cash'], _convert_like(data, data['cash'], _clean_cash(cash)))
+
+    if ledgers:
+        local = build_local_cube(ledgers)
+        cube = get_cube(data)
+        delta = convert_cube(local, get_fx(data), list(cube.columns.unique(level='currency')))
+        data['local_cube'] = fold_sorted(data['local_cube'], local)
+        data['cube'] = fold_sorted(cube, delta)
+        for name, rows in ledgers.items():
+            # Chunked loads keep only the cube, not the row-level ledgers.
+            if name in data:
+                data[name] = _append_rows(data[name], _convert_like(data, data[name], rows))
+
+    data['version'] = f"{data.get('version', 'data')}+{next(_append_counter)}"
+    return data
+
+
+def memory_report(data):
+    """
+    Reports the in-memory size of the prepared frames, in bytes and bytes per row.
+
+    'baseline_bytes_per_row' is the same frame with its categorical columns as
+    plain Python strings, i.e. the layout before the compact representation.
+    """
+    report = {}
+    for name in ('actuals', 'budget', 'cash'):
+        frame = data.get(name)
+        if frame is None or frame.empty:
+            continue
+        size = int(frame.memory_usage(deep=True, index=False).sum())
+        baseline = frame.astype({col: 'object' for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+        baseline_size = int(baseline.memory_usage(deep=True, index=False).sum())
+        report[name] = {
+            "rows": len(frame),
+            "bytes": size,
+            "bytes_per_row": size / len(frame),
+            "baseline_bytes_per_row": baseline_size / len(frame),
+        }
+    return report
+
+
+def _parse_month(month_str):
+    """Parses 'Month YYYY' into a monthly Period, or None if it doesn't parse."""
+    try:
+        return pd.Period(datetime.strptime(month_str, '%B %Y'), freq='M')
+    except (TypeError, ValueError):
+        return None
+
+
+def supported_currencies(data):
+    """Currencies the tools can report in for `data`."""
+    return cube_currencies(data)
+
+
+def _reporting(data, currency):
+    """Returns the cube with columns for `currency` and the currency used (USD if `currency` has no rates)."""
+    if currency not in supported_currencies(data):
+        currency = 'USD'
+    return reporting_cube(data, currency), currency
+
+
+def prepare_currency(data, currency):
+    """
+    Converts the cube and cash balances to `currency` ahead of its first question.
+
+    Both conversions are kept in `data`, so doing them up front lets several
+    threads then answer in that currency without each adding the same columns.
+    """
+    _reporting(data, currency)
+    if currency in supported_currencies(data):
+        cash_amounts(data, currency)
+
+
+def latest_actual_month(data):
+    """The latest month with any actuals, as a monthly Period, or None if there are none."""
+    cube = get_cube(data)
+    if ('actual', 'USD') not in cube.columns:
+        return None
+    with_actuals = np.flatnonzero(cube[('actual', 'USD')].to_numpy())
+    if not len(with_actuals):
+        return None
+    # The cube is sorted by month, so the last row with actuals is the latest month.
+    return key_to_period(cube.index.levels[0][cube.index.codes[0][with_actuals[-1]]])
+
+
+def _invalid_month():
+    return {"response": "I couldn't understand the date. Please use 'Month YYYY' format.", "figure": None}
+
+
+CONSOLIDATED_NAMES = {'consolidated', 'group', 'total', 'all', 'company'}
+
+
+def entities(data):
+    """Entity names in the ledgers; consolidated figures sum all of them."""
+    if 'cube' not in data and not any(name in data for name in SCENARIOS):
+        return []
+    return sorted(get_cube(data).index.unique(level='entity'))
+
+
+def resolve_entity(data, entity):
+    """
+    Maps a requested entity to its spelling in the ledgers, ignoring case.
+
+    Returns None for consolidated figures (no entity, or a name like
+    'Consolidated' or 'group') and raises KeyError for an unknown entity.
+    """
+    if entity is None or str(entity).strip().lower() in CONSOLIDATED_NAMES:
+        return None
+    by_name = {name.lower(): name for name in entities(data)}
+    return by_name[str(entity).strip().lower()]
+
+
+def _unknown_entity(data, entity):
+    return {"response": f"I couldn't find an entity called '{entity}'. Known entities: {', '.join(entities(data))}.", "figure": None}
+
+
+def _entity_column(table, entity):
+    """One entity's column (or the consolidated one) of a cube.month_totals table."""
+    name = entity or CONSOLIDATED
+    return table[name] if name in table else pd.Series(dtype='float64')
+
+
+def _ebitda_by_entity(table):
+    """Revenue, COGS, OPEX and EBITDA for every column of a cube.month_totals table."""
+    rows = table.index.astype('str')
+    revenue = table[rows == 'Revenue'].sum()
+    cogs = table[rows == 'COGS'].sum()
+    opex = table[rows.str.startswith('Opex')].sum()
+    return pd.DataFrame({'revenue': revenue, 'cogs': cogs, 'opex': opex, 'ebitda': revenue - cogs - opex})
+
+
+def _per_entity(values):
+    """Turns a Series indexed by entity (plus CONSOLIDATED) into a plain per-entity dict."""
+    return {name: float(value) for name, value in values.items() if name != CONSOLIDATED}
+
+
+def revenue_metrics(data, period, currency='USD', entity=None, totals=None):
+    """
+    Revenue actual vs budget for one month, without building a figure.
+
+    Figures are consolidated unless `entity` is given; either way "by_entity"
+    holds every entity's actual revenue from the same pass over the cube.
+    `totals` is an already computed cube.month_totals for the month, e.g.
+    shared with other tools answering the same question.
+    """
+    cube, col = _reporting(data, currency)
+    if totals is None:
+        totals = month_totals(cube, period, col)
+    actuals, budgets = totals['actual'], totals['budget']
+
+    actual = float(_entity_column(actuals, entity).get('Revenue', 0.0))
+    budget = float(_entity_column(budgets, entity).get('Revenue', 0.0))
+    variance = actual - budget
 
     return {
-        "actuals": actuals,
+        "month": str(period),
+        "currency": col,
+        "entity": entity or CONSOLIDATED,
+        "actual": actual,
         "budget": budget,
-        "cash": cash
+        "variance": variance,
+        "variance_pct": (variance / budget) * 100 if budget != 0 else float('inf'),
+        "by_entity": _per_entity(actuals.loc['Revenue']) if 'Revenue' in actuals.index else {},
     }
 
 
-def get_revenue(data, month_str, currency='USD'):
-    """Calculates Revenue (Actual vs Budget) for a given month."""
-    try:
-        target_date = datetime.strptime(month_str, '%B %Y')
-        target_period = pd.Period(target_date, freq='M')
-    except ValueError:
-        return {"response": "I couldn't understand the date. Please use 'Month YYYY' format.", "figure": None}
+def gross_margin_metrics(data, last_n_months=6):
+    """Monthly gross margin for the last N months with actuals (every month if N is None), without building a figure."""
+    cube = get_cube(data)
+    # Budgets usually run ahead of actuals; those months have no margin yet.
+    latest = latest_actual_month(data)
+    start, end = latest_months(cube, last_n_months, month_key(latest) if latest is not None else None)
+    pivot = monthly_category_totals(cube, 'actual', 'USD', start, end)
+    revenue = pivot['Revenue']
+    gross_margin = revenue - pivot.get('COGS', 0)
+    gross_margin_pct = (gross_margin / revenue).fillna(0) * 100
 
+    return {
+        "currency": "USD",
+        "months": [str(key_to_period(key)) for key in pivot.index],
+        "gross_margin": gross_margin.tolist(),
+        "gross_margin_pct": gross_margin_pct.tolist(),
+        "latest_month": str(key_to_period(pivot.index.max())),
+        "latest_gross_margin_pct": float(gross_margin_pct.iloc[-1]),
+    }
 
-    rev_actuals = data['actuals'][data['actuals']['account_category'] == 'Revenue']
-    rev_budget = data['budget'][data['budget']['account_category'] == 'Revenue']
 
-    if currency == 'EUR':
-        col = 'amount_eur'
-    else:
-        col = 'amount_usd'
+def opex_metrics(data, period, currency='USD', entity=None, totals=None):
+    """OPEX by subcategory for one month (consolidated unless `entity` is given), without building a figure."""
+    cube, col = _reporting(data, currency)
+    if totals is None:
+        totals = month_totals(cube, period, col, ('actual',))
+    table = totals['actual']
+    totals = _entity_column(table, entity)
+    opex_totals = totals[totals.index.astype('str').str.startswith('Opex')]
+    if entity is not None:
+        # The table is dense across entities; drop accounts this entity doesn't use.
+        opex_totals = opex_totals[opex_totals != 0]
+    categories = {name.split(':', 1)[1]: float(amount) for name, amount in opex_totals.items()}
 
+    return {
+        "month": str(period),
+        "currency": col,
+        "entity": entity or CONSOLIDATED,
+        "categories": categories,
+        "total": float(sum(categories.values())),
+        "by_entity": _per_entity(_ebitda_by_entity(table)['opex']),
+    }
 
-    monthly_actual = rev_actuals[rev_actuals['month'].dt.to_period('M') == target_period][col].sum()
-    monthly_budget = rev_budget[rev_budget['month'].dt.to_period('M') == target_period][col].sum()
 
-    if monthly_actual == 0 and monthly_budget == 0:
-         return {"response": f"No revenue data found for {month_str}.", "figure": None}
+def ebitda_metrics(data, period, currency='USD', entity=None, totals=None):
+    """Revenue, COGS, OPEX and EBITDA for one month (consolidated unless `entity` is given), without building a figure."""
+    cube, col = _reporting(data, currency)
+    if totals is None:
+        totals = month_totals(cube, period, col, ('actual',))
+    by_entity = _ebitda_by_entity(totals['actual'])
+    name = entity or CONSOLIDATED
+    totals = by_entity.loc[name] if name in by_entity.index else pd.Series(0.0, index=by_entity.columns)
+
+    return {
+        "month": str(period),
+        "currency": col,
+        "entity": name,
+        "revenue": float(totals['revenue']),
+        "cogs": float(totals['cogs']),
+        "opex": float(totals['opex']),
+        "ebitda": float(totals['ebitda']),
+        "by_entity": _per_entity(by_entity['ebitda']),
+    }
 
 
-    variance = monthly_actual - monthly_budget
-    variance_pct = (variance / monthly_budget) * 100 if monthly_budget != 0 else float('inf')
+def _pnl_lines(table):
+    """Revenue, COGS, OPEX, EBITDA and gross margin columns for a month x account_category table."""
+    revenue = table['Revenue'] if 'Revenue' in table else 0.0
+    cogs = table['COGS'] if 'COGS' in table else 0.0
+    opex = table.loc[:, table.columns.str.startswith('Opex')].sum(axis=1)
+    return pd.DataFrame({
+        'revenue': revenue, 'cogs': cogs, 'opex': opex,
+        'ebitda': revenue - cogs - opex, 'gross_margin': revenue - cogs,
+    }, index=table.index)
+
+
+def monthly_ebitda(data, currency='USD'):
+    """Revenue, COGS, OPEX and EBITDA for every month, from one grouped pass over the cube."""
+    cube, col = _reporting(data, currency)
+    table = monthly_category_totals(cube, 'actual', col)
+    return _pnl_lines(table)[['revenue', 'cogs', 'opex', 'ebitda']]
+
+
+def _range_months(data, period, window, n=3):
+    """
+    First and last month keys range_metrics needs for `window` ending at `period`.
+
+    That is the window plus the year of trend before it. `period` defaults to
+    the latest month with actuals; both keys are None if there are none.
+    """
+    if period is None:
+        period = latest_actual_month(data)
+        if period is None:
+            return None, None
+    key = month_key(period)
+    return window_start(key if window in ('ytd', 'qtd') else key - 11, window, n), key
+
+
+def range_metrics(data, period=None, window='ytd', currency='USD', entity=None, n=3, tables=None):
+    """
+    Revenue, COGS, OPEX, EBITDA and gross margin over a window ending at `period`.
+
+    `window` is one of cube.WINDOWS ('ytd', 'qtd', 'ttm' or an `n`-month
+    'rolling_average'); `period` defaults to the latest month with actuals.
+    Every line and month is computed in one window_totals pass over the
+    monthly aggregate, which also gives the "trend" of the windowed figures
+    leading up to `period`. Only the months from _range_months are aggregated,
+    so the cost doesn't grow with the history. `tables` is an already computed
+    cube.monthly_totals over those months for the currency and entity. Returns
+    None if `period` has no actuals.
+    """
+    cube, col = _reporting(data, currency)
+    first, key = _range_months(data, period, window, n)
+    if key is None:
+        return None
+    if tables is None:
+        tables = monthly_totals(cube, col, start=first, end=key, entity=entity)
+    actual = dense_months(tables['actual'])
+    budget = tables['budget']
+    if actual.empty:
+        return None
+
+    lines = _pnl_lines(actual)
+    opex_columns = [c for c in actual.columns if str(c).startswith('Opex')]
+    lines = pd.concat([lines, actual[opex_columns]], axis=1)
+    lines['budget_revenue'] = (budget['Revenue'] if 'Revenue' in budget else pd.Series(dtype='float64')).reindex(lines.index, fill_value=0.0)
+    totals = window_totals(lines, window, n)
+
+    if key not in totals.index:
+        return None
+    row = totals.loc[key]
+    start = max(window_start(key, window, n), int(totals.index[0]))
+    trend_start = start if window in ('ytd', 'qtd') else max(key - 11, int(totals.index[0]))
+    trend = totals.loc[trend_start:key]
+    gross_margin_pct = trend['gross_margin'] / trend['revenue'].where(trend['revenue'] != 0) * 100
 
-    sign = '$' if currency == 'USD' else '€'
+    return {
+        "window": window,
+        "month": str(key_to_period(key)),
+        "start": str(key_to_period(start)),
+        "months": key - start + 1,
+        "currency": col,
+        "entity": entity or CONSOLIDATED,
+        "revenue": float(row['revenue']),
+        "budget_revenue": float(row['budget_revenue']),
+        "cogs": float(row['cogs']),
+        "opex": float(row['opex']),
+        "ebitda": float(row['ebitda']),
+        "gross_margin": float(row['gross_margin']),
+        "gross_margin_pct": float(gross_margin_pct.iloc[-1]) if row['revenue'] != 0 else None,
+        "opex_categories": {name.split(':', 1)[1]: float(row[name]) for name in opex_columns if row[name] != 0},
+        "trend": {
+            "months": [str(key_to_period(k)) for k in trend.index],
+            "revenue": trend['revenue'].tolist(),
+            "ebitda": trend['ebitda'].tolist(),
+            "opex": trend['opex'].tolist(),
+            "gross_margin_pct": gross_margin_pct.fillna(0.0).tolist(),
+        },
+    }
+
+
+def cash_runway_metrics(data, currency='USD', last_n_months=3, burn='trailing', horizon=36):
+    """
+    Current cash and runway from the average EBITDA burn of the trailing N months.
+
+    The window ends at the latest month in data['cash'], whatever that is.
+    With burn='forecast' the burn is instead each month's forecast EBITDA
+    (see forecast_metrics) over the next `horizon` months, and the runway is
+    where that path of cash first reaches zero (None if it lasts the horizon).
+    """
+    if currency not in supported_currencies(data):
+        currency = 'USD'
+    latest, cash = _latest_cash(data, currency)
+
+    ebitda = monthly_ebitda(data, currency)['ebitda']
+    window = ebitda.loc[latest - (last_n_months - 1):latest]
+    avg_net_burn = -float(window.mean()) if len(window) else float('nan')
+
+    metrics = {
+        "as_of": str(key_to_period(latest)),
+        "currency": currency,
+        "cash": cash,
+        "months_averaged": len(window),
+        "monthly_ebitda": {str(key_to_period(key)): float(value) for key, value in window.items()},
+        "avg_net_burn": avg_net_burn,
+        "runway_months": cash / avg_net_burn if avg_net_burn > 0 else None,
+        "burn": 'trailing',
+    }
+    if burn != 'forecast':
+        return metrics
+
+    # The forecast starts after the latest actuals, which can lag the cash balances.
+    ahead = max(latest - month_key(latest_actual_month(data) or key_to_period(latest)), 0)
+    projected = forecast_metrics(data, horizon + ahead, currency)
+    if projected is None:
+        return metrics
+    forecast_burn = -np.asarray(projected['forecast']['ebitda'][ahead:])
+    balances = np.concatenate([[cash], cash - np.cumsum(forecast_burn)])
+    months = runway.zero_crossing(balances[None, :])[0]
+    metrics.update(
+        burn='forecast',
+        forecast_burn={month: float(b) for month, b in zip(projected['months'][ahead:], forecast_burn)},
+        forecast_methods=projected['methods'],
+        avg_net_burn=float(forecast_burn.mean()),
+        projected_cash=balances.tolist(),
+        runway_months=None if np.isnan(months) else float(months),
+    )
+    return metrics
+
+
+def _latest_cash(data, currency):
+    """Month key and balance of the latest month in data['cash']."""
+    cash_frame = data['cash']
+    latest_row = cash_frame['month'].idxmax()
+    return month_key(cash_frame.loc[latest_row, 'month']), float(cash_amounts(data, currency).loc[latest_row])
+
+
+def runway_sensitivity_metrics(data, currency='USD', burn_growth=runway.DEFAULT_BURN_GROWTH,
+                               revenue_shock=runway.DEFAULT_REVENUE_SHOCKS, windows=runway.DEFAULT_WINDOWS, horizon=120):
+    """
+    Runway for every combination of burn growth, revenue shock and averaging window.
+
+    All scenarios are projected together by runway.runway_scenarios. Each
+    scenario reports its starting burn, its runway in months and the month
+    its cash reaches zero (None if that is beyond `horizon` months).
+    """
+    if currency not in supported_currencies(data):
+        currency = 'USD'
+    latest, cash = _latest_cash(data, currency)
+    history = dense_months(monthly_ebitda(data, currency)).loc[:latest]
+    result = runway.runway_scenarios(cash, history['ebitda'].to_numpy(), history['revenue'].to_numpy(), burn_growth, revenue_shock, windows, horizon)
+
+    months = result['runway']
+    zero_months = np.where(np.isnan(months), -1, latest + np.ceil(np.nan_to_num(months))).astype('int64')
+    scenarios = [
+        {
+            "burn_growth": float(g), "revenue_shock": float(s), "window": int(w), "avg_net_burn": float(b),
+            "runway_months": None if np.isnan(m) else float(m),
+            "zero_month": None if z < 0 else str(key_to_period(z)),
+        }
+        for g, s, w, b, m, z in zip(result['burn_growth'], result['revenue_shock'], result['window'], result['burn'], months, zero_months)
+    ]
+    return {
+        "as_of": str(key_to_period(latest)),
+        "currency": currency,
+        "cash": cash,
+        "horizon_months": horizon,
+        "distribution": runway.runway_distribution(months),
+        "scenarios": scenarios,
+    }
+
+
+def _variance_cells(data, currency):
+    """Variance cells for `currency`, computed once per data version and reused for every filter."""
+    cells = data.setdefault('variance_cells', {})
+    if currency not in cells:
+        cube = reporting_cube(data, currency)
+        tracing.count("rows_scanned", len(cube))
+        cells[currency] = variance.variance_cells(cube, currency)
+    return cells[currency]
+
+
+def variance_metrics(data, start=None, end=None, currency='USD', k=10, threshold=0.0, threshold_pct=None):
+    """
+    The top `k` budget variances by month, entity and account between month keys start..end.
+
+    `end` defaults to the latest month with actuals and `start` to the first
+    month. Every cell's variance comes from one vectorized pass that is kept
+    in data['variance_cells'], so other ranges and thresholds only re-filter it.
+    """
+    if currency not in supported_currencies(data):
+        currency = 'USD'
+    cells = _variance_cells(data, currency)
+    if end is None:
+        end = cells['last_actual']
+    if start is None and len(cells['month']):
+        start = int(cells['month'][0])
+    positions, matching = variance.top_drivers(cells, k, start, end, threshold, threshold_pct)
+
+    drivers = [
+        {
+            "month": str(key_to_period(cells['month'][i])),
+            "entity": cells['entities'][cells['entity_codes'][i]],
+            "account_category": cells['accounts'][cells['account_codes'][i]],
+            "actual": float(cells['actual'][i]),
+            "budget": float(cells['budget'][i]),
+            "variance": float(cells['variance'][i]),
+            "variance_pct": None if np.isnan(cells['variance_pct'][i]) else float(cells['variance_pct'][i]),
+            "favourable": bool(cells['favourable'][i]),
+        }
+        for i in positions
+    ]
+    return {
+        "start": str(key_to_period(start)) if start is not None else None,
+        "end": str(key_to_period(end)) if end is not None else None,
+        "currency": currency,
+        "cells": int(len(cells['month'])),
+        "matching": matching,
+        "drivers": drivers,
+    }
+
+
+FORECAST_LINES = ['revenue', 'cogs', 'opex', 'ebitda', 'gross_margin']
+
+
+def _forecast_series(data, currency):
+    """Actuals as a forecast.series_matrix for `currency`, up to the latest month with actuals, built once per data version."""
+    series = data.setdefault('forecast_series', {})
+    if currency not in series:
+        cube = reporting_cube(data, currency)
+        tracing.count("rows_scanned", len(cube))
+        latest = latest_actual_month(data)
+        series[currency] = forecast.series_matrix(cube, currency, 'actual', month_key(latest) if latest is not None else None)
+    return series[currency]
+
+
+def _lines_by_month(values, account_codes, accounts, month_keys):
+    """P&L lines per month from a (series x months) matrix, after summing the series by account category."""
+    by_account = np.zeros((len(accounts), values.shape[1]))
+    np.add.at(by_account, account_codes, values)
+    return _pnl_lines(pd.DataFrame(by_account.T, index=month_keys, columns=accounts))
+
+
+def forecast_metrics(data, horizon=12, currency='USD', entity=None, method='auto', history_months=12):
+    """
+    Forecast revenue, COGS, OPEX, EBITDA and gross margin for the `horizon` months after the latest actuals.
+
+    Every entity x account series is forecast at once by forecast.forecast
+    (with `method`, 'auto' by default) and the lines are the sums of those
+    series, consolidated or for one `entity`. The last `history_months` of
+    actuals come back alongside, for comparison.
+    """
+    if currency not in supported_currencies(data):
+        currency = 'USD'
+    series = _forecast_series(data, currency)
+    history = series['history']
+    rows = np.arange(len(history))
+    if entity is not None:
+        entities = series['entities']
+        rows = rows[series['entity_codes'] == (entities.get_loc(entity) if entity in entities else -1)]
+    if not len(rows) or not history.shape[1]:
+        return None
+
+    predicted, methods = forecast.forecast(history[rows], horizon, method)
+    last = series['start'] + history.shape[1] - 1
+    future = _lines_by_month(predicted, series['account_codes'][rows], series['accounts'], range(last + 1, last + 1 + horizon))
+    past = _lines_by_month(history[rows, -history_months:], series['account_codes'][rows], series['accounts'],
+                           range(last + 1 - min(history_months, history.shape[1]), last + 1))
+    chosen, counts = np.unique(methods, return_counts=True)
+
+    return {
+        "as_of": str(key_to_period(last)),
+        "currency": currency,
+        "entity": entity,
+        "method": method,
+        "series": int(len(rows)),
+        "methods": {str(name): int(n) for name, n in zip(chosen, counts)},
+        "months": [str(key_to_period(k)) for k in future.index],
+        "forecast": {line: future[line].tolist() for line in FORECAST_LINES},
+        "totals": {line: float(future[line].sum()) for line in FORECAST_LINES},
+        "history": {"months": [str(key_to_period(k)) for k in past.index], **{line: past[line].tolist() for line in FORECAST_LINES}},
+    }
+
+
+def get_revenue(data, month_str, currency='USD', entity=None, totals=None):
+    """Calculates Revenue (Actual vs Budget) for a given month, consolidated or for one entity."""
+    target_period = _parse_month(month_str)
+    if target_period is None:
+        return _invalid_month()
+    try:
+        entity = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
+
+    metrics = revenue_metrics(data, target_period, currency, entity, totals)
+    monthly_actual = metrics['actual']
+    monthly_budget = metrics['budget']
+    label = month_str if entity is None else f"{month_str} ({entity})"
+
+    if monthly_actual == 0 and monthly_budget == 0:
+         return {"response": f"No revenue data found for {label}.", "figure": None}
+
+    currency = metrics['currency']
+    sign = currency_sign(currency)
 
     response = (
-        f"Revenue for {month_str}:\n"
+        f"Revenue for {label}:\n"
         f"- Actual: {sign}{monthly_actual:,.0f}\n"
         f"- Budget: {sign}{monthly_budget:,.0f}\n"
-        f"- Variance: {sign}{variance:,.0f} ({variance_pct:.1f}%)"
+        f"- Variance: {sign}{metrics['variance']:,.0f} ({metrics['variance_pct']:.1f}%)"
     )
 
 
-    df = pd.DataFrame({
-        'Category': ['Actual', 'Budget'],
-        f'Amount ({currency})': [monthly_actual, monthly_budget]
-    })
-    fig = px.bar(df, x='Category', y=f'Amount ({currency})', title=f'Revenue - {month_str}', text_auto='.2s')
-    fig.update_traces(textangle=0, textposition="outside")
+    fig = charts.bar_spec(f'Revenue - {label}', ['Actual', 'Budget'], [monthly_actual, monthly_budget], f'Amount ({currency})')
 
 
-    return {"response": response, "figure": fig}
+    return {"response": response, "figure": fig, "metrics": metrics}
 
 
 def get_gross_margin_trend(data, last_n_months=6):
     """Calculates Gross Margin % trend for the last N months."""
-    df = data['actuals'].copy()
-    df = df[df['account_category'].isin(['Revenue', 'COGS'])]
-
-    pivot = df.pivot_table(index='month', columns='account_category', values='amount_usd', aggfunc='sum').fillna(0)
-    pivot = pivot.sort_index(ascending=False).head(last_n_months).sort_index()
-
-    pivot['Gross_Margin_USD'] = pivot['Revenue'] - pivot.get('COGS', 0)
-    pivot['Gross_Margin_%'] = (pivot['Gross_Margin_USD'] / pivot['Revenue']).fillna(0) * 100
+    metrics = gross_margin_metrics(data, last_n_months)
 
-    latest_month = pivot.index.max().strftime('%B %Y')
-    latest_gm = pivot.loc[pivot.index.max(), 'Gross_Margin_%']
+    latest_month = pd.Period(metrics['latest_month'], freq='M').strftime('%B %Y')
     response = (
         f"Gross Margin Trend:\n"
-        f"The latest gross margin for {latest_month} was {latest_gm:.1f}%."
+        f"The latest gross margin for {latest_month} was {metrics['latest_gross_margin_pct']:.1f}%."
     )
 
-    fig = px.line(pivot, y='Gross_Margin_%', title=f'Gross Margin % Trend (Last {last_n_months} Months)', markers=True)
-    fig.update_layout(yaxis_title='Gross Margin %', xaxis_title='Month')
-    fig.update_yaxes(ticksuffix="%")
+    fig = charts.line_spec(f'Gross Margin % Trend (Last {len(metrics["months"])} Months)', metrics['months'], metrics['gross_margin_pct'], 'Gross Margin %', y_suffix="%")
 
-    return {"response": response, "figure": fig}
+    return {"response": response, "figure": fig, "metrics": metrics}
 
 
-def get_opex_breakdown(data, month_str, currency='USD'):
-    """Provides OPEX breakdown by account for a given month."""
+def get_opex_breakdown(data, month_str, currency='USD', entity=None, totals=None):
+    """Provides OPEX breakdown by account for a given month, consolidated or for one entity."""
+    target_period = _parse_month(month_str)
+    if target_period is None:
+        return _invalid_month()
     try:
-        target_date = datetime.strptime(month_str, '%B %Y')
-        target_period = pd.Period(target_date, freq='M')
-    except ValueError:
-        return {"response": "I couldn't understand the date. Please use 'Month YYYY' format.", "figure": None}
+        entity = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
 
-    col = 'amount_usd' if currency == 'USD' else 'amount_eur'
+    metrics = opex_metrics(data, target_period, currency, entity, totals)
+    label = month_str if entity is None else f"{month_str} ({entity})"
 
-    opex_actuals = data['actuals'][data['actuals']['account_category'].str.startswith('Opex')].copy()
-    opex_actuals['Opex_Category'] = opex_actuals['account_category'].str.split(':').str[1]
+    if not metrics['categories']:
+        return {"response": f"No OPEX data found for {label}.", "figure": None}
 
-    monthly_opex_breakdown = opex_actuals[opex_actuals['month'].dt.to_period('M') == target_period].groupby('Opex_Category')[col].sum().reset_index()
-    opex_total = monthly_opex_breakdown[col].sum()
+    currency = metrics['currency']
+    sign = currency_sign(currency)
 
-    if monthly_opex_breakdown.empty:
-        return {"response": f"No OPEX data found for {month_str}.", "figure": None}
+    response = f"Opex Breakdown for {month_str} ({currency}):\n" if entity is None else f"Opex Breakdown for {month_str} ({entity}, {currency}):\n"
+    for category, amount in metrics['categories'].items():
+        response += f"- {category}: {sign}{amount:,.0f}\n"
+    response += f"\nTotal Opex: {sign}{metrics['total']:,.0f}"
 
-    sign = '$' if currency == 'USD' else '€'
+    fig = charts.pie_spec(f'OPEX Breakdown - {label}', metrics['categories'], metrics['categories'].values())
 
-    response = f"Opex Breakdown for {month_str} ({currency}):\n"
-    for index, row in monthly_opex_breakdown.iterrows():
-        response += f"- {row['Opex_Category']}: {sign}{row[col]:,.0f}\n"
-    response += f"\nTotal Opex: {sign}{opex_total:,.0f}"
+    return {"response": response, "figure": fig, "metrics": metrics}
 
-    fig = px.pie(monthly_opex_breakdown, names=['Admin', 'Marketing', 'R&D', 'Sales'], values=col, title=f'OPEX Breakdown - {month_str}', hole=0.3)
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    fig.update_layout(showlegend=True)
 
-    return {"response": response, "figure": fig}
+def get_ebitda(data, month_str, currency='USD', entity=None, totals=None):
+    """Calculates EBITDA for a given month, consolidated or for one entity."""
+    target_period = _parse_month(month_str)
+    if target_period is None:
+        return _invalid_month()
+    try:
+        entity = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
 
+    metrics = ebitda_metrics(data, target_period, currency, entity, totals)
+    label = month_str if entity is None else f"{month_str} ({entity})"
 
-def get_ebitda(data, month_str, currency='USD'):
-    """Calculates EBITDA for a given month."""
-    try:
-        target_date = datetime.strptime(month_str, '%B %Y')
-        target_period = pd.Period(target_date, freq='M')
-    except ValueError:
-        return {"response": "I couldn't understand the date. Please use 'Month YYYY' format.", "figure": None}
-
-    col = 'amount_usd' if currency == 'USD' else 'amount_eur'
-    
-    # Filter for Revenue
-    rev_actuals = data['actuals'][data['actuals']['account_category'] == 'Revenue'].copy()
-    month_rev_actuals = rev_actuals[rev_actuals['month'].dt.to_period('M') == target_period][col].sum()
-
-    cogs_actuals = data['actuals'][data['actuals']['account_category'] == 'COGS'].copy()
-    month_cogs_actuals = cogs_actuals[cogs_actuals['month'].dt.to_period('M') == target_period][col].sum()
-
-    opex_actuals = data['actuals'][data['actuals']['account_category'].str.startswith('Opex')].copy()
-    month_opex_actuals = opex_actuals[opex_actuals['month'].dt.to_period('M') == target_period][col].sum()
-    
-    ebitda = month_rev_actuals - month_cogs_actuals - month_opex_actuals
-
-    sign = '$' if currency == 'USD' else '€'
+    currency = metrics['currency']
+    sign = currency_sign(currency)
     response = (
-        f"EBITDA for {month_str}: {sign}{ebitda:,.0f}"
+        f"EBITDA for {label}: {sign}{metrics['ebitda']:,.0f}"
     )
 
-    df = pd.DataFrame({
-        'Category': ['Revenue', 'COGS', 'Opex'],
-        f'Amount ({currency})': [month_rev_actuals, month_cogs_actuals, month_opex_actuals]
-    })
+    fig = charts.bar_spec(f'EBITDA - {label}', ['Revenue', 'COGS', 'Opex'], [metrics['revenue'], metrics['cogs'], metrics['opex']], f'Amount ({currency})')
 
-    fig = px.bar(df, x='Category', y=f'Amount ({currency})', title=f'EBITDA - {month_str}', text_auto='.2s')
-    fig.update_traces(textangle=0, textposition="outside")
+    return {"response": response, "figure": fig, "metrics": metrics}
 
-    return {"response": response, "figure": fig}
 
+RANGE_METRICS = {'revenue': 'Revenue', 'ebitda': 'EBITDA', 'gross_margin': 'Gross margin', 'opex': 'Opex'}
+WINDOW_LABELS = {'ytd': 'year to date', 'qtd': 'quarter to date', 'ttm': 'trailing 12 months', 'rolling_average': '{n}-month rolling average'}
 
-def get_cash_runway(data, currency='USD'):
-    """Calculates Cash Runway for the last 3 months."""
-    LAST_N_MONTHS = 3
-    sign = '$' if currency == 'USD' else '€'
-    december_ebitda = int(get_ebitda(data, 'December 2025', currency)['response'].split(sign)[1].replace(',', ''))
-    november_ebitda = int(get_ebitda(data, 'November 2025', currency)['response'].split(sign)[1].replace(',', ''))
-    october_ebitda = int(get_ebitda(data, 'October 2025', currency)['response'].split(sign)[1].replace(',', ''))
 
-    avg_net_burn = -(december_ebitda + november_ebitda + october_ebitda) / LAST_N_MONTHS
+def get_range_metric(data, metric, month_str=None, window='ytd', currency='USD', entity=None, n=3, tables=None):
+    """Calculates revenue, EBITDA, gross margin or opex year/quarter to date, over the trailing 12 months, or as a rolling average."""
+    if metric not in RANGE_METRICS or window not in WINDOW_LABELS:
+        return {"response": "I can give year-to-date, quarter-to-date, trailing-12-month and rolling figures for revenue, EBITDA, gross margin and opex.", "figure": None}
+    target_period = None
+    if month_str:
+        target_period = _parse_month(month_str)
+        if target_period is None:
+            return _invalid_month()
+    try:
+        entity = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
+
+    metrics = range_metrics(data, target_period, window, currency, entity, n, tables)
+    if metrics is None:
+        return {"response": f"No data found for {month_str}." if month_str else "There are no actuals to report on yet.", "figure": None}
+
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+    name = RANGE_METRICS[metric]
+    through = pd.Period(metrics['month'], freq='M').strftime('%B %Y')
+    span = f"{pd.Period(metrics['start'], freq='M').strftime('%b %Y')} - {pd.Period(metrics['month'], freq='M').strftime('%b %Y')}"
+    scope = "" if entity is None else f" ({entity})"
+    header = f"{name}, {WINDOW_LABELS[window].format(n=n)} through {through}{scope}, {span}"
+    title = f"{name} - {WINDOW_LABELS[window].format(n=n).capitalize()}{scope}"
+    trend = metrics['trend']
+
+    if metric == 'revenue':
+        variance = metrics['revenue'] - metrics['budget_revenue']
+        variance_pct = (variance / metrics['budget_revenue']) * 100 if metrics['budget_revenue'] != 0 else float('inf')
+        response = (
+            f"{header}:\n"
+            f"- Actual: {sign}{metrics['revenue']:,.0f}\n"
+            f"- Budget: {sign}{metrics['budget_revenue']:,.0f}\n"
+            f"- Variance: {sign}{variance:,.0f} ({variance_pct:.1f}%)"
+        )
+        fig = charts.line_spec(title, trend['months'], trend['revenue'], f'Revenue ({currency})')
+    elif metric == 'ebitda':
+        response = (
+            f"{header}: {sign}{metrics['ebitda']:,.0f}\n"
+            f"- Revenue: {sign}{metrics['revenue']:,.0f}\n"
+            f"- COGS: {sign}{metrics['cogs']:,.0f}\n"
+            f"- Opex: {sign}{metrics['opex']:,.0f}"
+        )
+        fig = charts.line_spec(title, trend['months'], trend['ebitda'], f'EBITDA ({currency})')
+    elif metric == 'gross_margin':
+        pct = metrics['gross_margin_pct']
+        response = f"{header}: {sign}{metrics['gross_margin']:,.0f}" + (f" ({pct:.1f}% of revenue)" if pct is not None else "")
+        fig = charts.line_spec(title, trend['months'], trend['gross_margin_pct'], 'Gross Margin %', y_suffix="%")
+    else:
+        if not metrics['opex_categories']:
+            return {"response": f"No OPEX data found for {header}.", "figure": None}
+        response = f"{header} ({currency}):\n"
+        for category, amount in metrics['opex_categories'].items():
+            response += f"- {category}: {sign}{amount:,.0f}\n"
+        response += f"\nTotal Opex: {sign}{metrics['opex']:,.0f}"
+        fig = charts.pie_spec(title, metrics['opex_categories'], metrics['opex_categories'].values())
+
+    return {"response": response, "figure": fig, "metrics": metrics}
+
+
+PLAN_TOOLS = {
+    'revenue': (get_revenue, 'revenue'),
+    'ebitda': (get_ebitda, 'ebitda'),
+    'opex_breakdown': (get_opex_breakdown, 'opex'),
+}
+
+
+def get_plan(data, intents, month_str=None, currency='USD', entity=None, window=None, n=3):
+    """
+    Answers several of revenue, EBITDA and opex for the same month (or window), currency and entity.
+
+    The cube is aggregated once for all of them (one cube.month_totals, or one
+    cube.monthly_totals for a window) and that result is handed to each tool,
+    which only formats its part. The parts' responses are joined; "figures"
+    holds every part's chart and "metrics" each part's metrics by intent.
+    """
+    intents = [intent for intent in dict.fromkeys(intents) if intent in PLAN_TOOLS]
+    if not intents or (window is not None and window not in WINDOW_LABELS):
+        return {"response": "I can answer revenue, EBITDA and opex together for a month or a period.", "figure": None}
+    if window is None and not month_str:
+        return {"response": "You asked about several metrics, but didn't specify a month. Please be more specific.", "figure": None}
+    try:
+        resolved = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
+
+    cube, col = _reporting(data, currency)
+    if window is not None:
+        target_period = _parse_month(month_str) if month_str else None
+        if month_str and target_period is None:
+            return _invalid_month()
+        first, key = _range_months(data, target_period, window, n)
+        tables = monthly_totals(cube, col, start=first, end=key, entity=resolved) if key is not None else None
+        parts = [get_range_metric(data, PLAN_TOOLS[intent][1], month_str, window, col, entity, n, tables) for intent in intents]
+    else:
+        target_period = _parse_month(month_str)
+        if target_period is None:
+            return _invalid_month()
+        totals = month_totals(cube, target_period, col)
+        parts = [PLAN_TOOLS[intent][0](data, month_str, col, entity, totals) for intent in intents]
 
-    col = 'cash_usd' if currency == 'USD' else 'cash_eur'
-    cash = int(data['cash'].tail(1)[col].iloc[0])
+    figures = [part['figure'] for part in parts if part.get('figure') is not None]
+    return {
+        "response": "\n\n".join(part['response'] for part in parts),
+        "figure": figures[0] if figures else None,
+        "figures": figures,
+        "metrics": {intent: part.get('metrics') for intent, part in zip(intents, parts)},
+    }
+
+
+def _month_starts(period, n):
+    """ISO dates of the first day of `n` consecutive months starting at `period`."""
+    return pd.period_range(period, periods=n, freq='M').strftime('%Y-%m-01').tolist()
+
+
+def get_cash_runway(data, currency='USD', last_n_months=3, burn='trailing'):
+    """
+    Calculates Cash Runway from the average burn of the last N months.
+
+    With burn='forecast' it follows the forecast monthly burn instead.
+    """
+    metrics = cash_runway_metrics(data, currency, last_n_months, burn)
+    if metrics['burn'] == 'forecast':
+        return _forecast_runway(data, metrics)
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+    if metrics['months_averaged'] == 0:
+        return {"response": "There isn't enough EBITDA history to estimate the cash runway.", "figure": None, "metrics": metrics}
 
-    cash_runway = cash / avg_net_burn
+    LAST_N_MONTHS = metrics['months_averaged']
+    avg_net_burn = metrics['avg_net_burn']
+    cash = metrics['cash']
+    cash_runway = metrics['runway_months']
 
     response = ""
-    fig = go.Figure()
-    latest_month_date = data['cash']['month'].max()
-    
+
     if avg_net_burn > 0:
         response = (
             f"Cash Runway Analysis:\n"
@@ -240,38 +1072,12 @@ def get_cash_runway(data, currency='USD'):
             f"At the current burn rate, the estimated cash runway is {cash_runway:.1f} months."
         )
 
-        projected_dates = []
-        projected_cash = []
-        projection_horizon = int(cash_runway) + 3 
-        
-        for i in range(projection_horizon):
-            future_date = latest_month_date + pd.DateOffset(months=i)
-            future_cash = cash - (i * avg_net_burn)
-            projected_dates.append(future_date)
-            projected_cash.append(max(0, future_cash))
-            if future_cash <= 0:
-                break
-
-
-        fig.add_trace(go.Scatter(
-            x=data['cash'].tail(10)['month'], y=data['cash'].tail(10)[col].values,
-            mode='lines+markers', name='Historical Cash', line=dict(color='blue')
-        ))
-        fig.add_trace(go.Scatter(
-            x=projected_dates, y=projected_cash,
-            mode='lines+markers', name='Projected Runway', line=dict(color='red', dash='dash')
-        ))
-
-        fig.add_hline(y=0, line_width=1, line_dash="solid", line_color="black")
-        
-
-        end_of_runway_date = latest_month_date + pd.DateOffset(months=ceil(cash_runway))
-        fig.add_annotation(
-            x=end_of_runway_date, y=0,
-            text=f"End of Runway (~{cash_runway:.1f} months)",
-            showarrow=True, arrowhead=1, ax=0, ay=-40,
-            bgcolor="rgba(255, 0, 0, 0.7)", textangle=0, font=dict(color="white")
-        )
+        # The flat-burn projection is the single-scenario case of the runway engine.
+        projected_cash = runway.project(cash, [avg_net_burn], [0.0], int(cash_runway) + 2)[0]
+        crossed = np.flatnonzero(projected_cash <= 0)
+        if len(crossed):
+            projected_cash = projected_cash[:crossed[0] + 1]
+        projected_cash = np.maximum(projected_cash, 0)
 
     else:
 
@@ -280,40 +1086,194 @@ def get_cash_runway(data, currency='USD'):
             f"Cash Flow Analysis:\n"
             f"- Current Cash: {sign}{cash:,.0f}\n"
             f"- Avg. Monthly Net Profit (Last {LAST_N_MONTHS} Months): {sign}{monthly_profit:,.0f}\n\n"
-            f"The company is cash flow positive based on the last three months.\n"
+            f"The company is cash flow positive based on the last {LAST_N_MONTHS} months.\n"
             f"The concept of a 'cash runway' does not apply, as the cash balance is growing."
         )
 
-        projected_dates = []
-        projected_cash = []
+        projected_cash = runway.project(cash, [avg_net_burn], [0.0], 5)[0]
+
+    fig = _runway_figure(data, metrics, projected_cash, burning=avg_net_burn > 0)
+    return {"response": response, "figure": fig, "metrics": metrics}
+
+
+def _runway_figure(data, metrics, projected_cash, burning):
+    """
+    The runway chart: the last 10 months of cash, then `projected_cash` month
+    by month from the latest one, marking where it runs out when `burning`.
+    """
+    currency = metrics['currency']
+    latest_month = pd.Period(metrics['as_of'], freq='M')
+    history = data['cash'].tail(10)
+    end_of_runway = None
+    if burning:
+        end_of_runway = {"x": _month_starts(latest_month, ceil(metrics['runway_months']) + 1)[-1], "months": metrics['runway_months']}
+    return charts.runway_spec(
+        currency, currency_sign(currency),
+        history={"x": history['month'].dt.strftime('%Y-%m-%d').tolist(), "y": cash_amounts(data, currency).tail(10).astype(float).tolist()},
+        projection={"x": _month_starts(latest_month, len(projected_cash)), "y": np.asarray(projected_cash).tolist()},
+        burning=burning,
+        end_of_runway=end_of_runway
+    )
 
-        for i in range(6):
-            future_date = latest_month_date + pd.DateOffset(months=i)
 
-            future_cash = cash + (i * monthly_profit)
-            projected_dates.append(future_date)
-            projected_cash.append(future_cash)
+def _forecast_runway(data, metrics):
+    """The cash runway answer for cash_runway_metrics with burn='forecast'."""
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+    cash = metrics['cash']
+    cash_runway = metrics['runway_months']
+    horizon = len(metrics['forecast_burn'])
+    avg_net_burn = metrics['avg_net_burn']
+    response = (
+        f"Cash Runway Analysis (forecast burn):\n"
+        f"- Current Cash: {sign}{cash:,.0f}\n"
+        + (f"- Avg. Monthly Net Burn (Forecast, Next {horizon} Months): {sign}{avg_net_burn:,.0f}\n\n" if avg_net_burn > 0 else
+           f"- Avg. Monthly Net Profit (Forecast, Next {horizon} Months): {sign}{-avg_net_burn:,.0f}\n\n")
+    )
+    projected_cash = np.asarray(metrics['projected_cash'])
+    if cash_runway is not None:
+        response += f"Following the forecast burn, the estimated cash runway is {cash_runway:.1f} months."
+        projected_cash = np.maximum(projected_cash[:ceil(cash_runway) + 1], 0)
+    else:
+        response += f"Following the forecast burn, cash lasts beyond the {horizon}-month forecast."
 
+    fig = _runway_figure(data, metrics, projected_cash, burning=cash_runway is not None)
+    return {"response": response, "figure": fig, "metrics": metrics}
 
-        fig.add_trace(go.Scatter(
-            x=data['cash'].tail(10)['month'], y=data['cash'].tail(10)[col].values,
-            mode='lines+markers', name='Historical Cash', line=dict(color='blue')
-        ))
-        fig.add_trace(go.Scatter(
-            x=projected_dates, y=projected_cash,
-            mode='lines+markers', name='Projected Growth', line=dict(color='green', dash='dash')
-        ))
 
+def get_runway_sensitivity(data, currency='USD', burn_growth=runway.DEFAULT_BURN_GROWTH,
+                           revenue_shock=runway.DEFAULT_REVENUE_SHOCKS, windows=runway.DEFAULT_WINDOWS):
+    """Calculates the cash runway across a grid of burn-growth, revenue-shock and averaging-window scenarios."""
+    metrics = runway_sensitivity_metrics(data, currency, burn_growth, revenue_shock, windows)
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+    summary = metrics['distribution']
+    horizon = metrics['horizon_months']
 
-    x = 0.7 if avg_net_burn > 0 else 0.01
-    fig.update_layout(
-        title='Cash Balance and Projected Runway',
-        xaxis_title='Month',
-        yaxis_title=f'Cash ({currency})',
-        yaxis_tickprefix=sign,
-        yaxis_tickformat=',.0f',
-        legend=dict(x=x, y=0.98, bordercolor="Black", borderwidth=1),
-        margin=dict(t=50, b=10, l=10, r=10)
+    response = (
+        f"Cash Runway Sensitivity ({summary['scenarios']} scenarios):\n"
+        f"- Current Cash: {sign}{metrics['cash']:,.0f}\n"
     )
+    if 'median' in summary:
+        response += (
+            f"- Runway: {summary['min']:.1f} to {summary['max']:.1f} months "
+            f"(median {summary['median']:.1f}, 10th-90th percentile {summary['p10']:.1f}-{summary['p90']:.1f})\n"
+        )
+    if summary['never_run_out'] == summary['scenarios']:
+        response += f"- No scenario runs out of cash within {horizon} months.\n"
+    elif summary['never_run_out']:
+        response += f"- {summary['never_run_out']} scenarios do not run out of cash within {horizon} months.\n"
+
+    # Chart the burn growth x revenue shock grid for the first averaging window.
+    window = metrics['scenarios'][0]['window']
+    grid = [s for s in metrics['scenarios'] if s['window'] == window]
+    growths = sorted({s['burn_growth'] for s in grid})
+    shocks = sorted({s['revenue_shock'] for s in grid}, reverse=True)
+    cells = {(s['revenue_shock'], s['burn_growth']): s['runway_months'] for s in grid}
+    fig = charts.heatmap_spec(
+        f'Runway (months) by Burn Growth and Revenue Shock ({window}-month average burn)',
+        [f'{g:+.0%}' for g in growths], [f'{s:+.0%}' for s in shocks],
+        [[cells[(s, g)] for g in growths] for s in shocks],
+        'Monthly burn growth', 'Revenue shock'
+    )
+
+    return {"response": response.rstrip(), "figure": fig, "metrics": metrics}
+
+
+def get_variance_drivers(data, month_str=None, window=None, latest_n_months=None, currency='USD', k=10, threshold=0.0, threshold_pct=None):
+    """
+    Finds where actuals are furthest from budget, across every month, entity and account.
+
+    With `month_str` alone only that month is searched; with a `window` ('ytd',
+    'qtd', 'ttm') or `latest_n_months` the period ends at `month_str` (or the
+    latest month with actuals). With none of them every month is searched.
+    """
+    end = None
+    if month_str:
+        target_period = _parse_month(month_str)
+        if target_period is None:
+            return _invalid_month()
+        end = month_key(target_period)
+    if end is None:
+        end = _variance_cells(data, currency if currency in supported_currencies(data) else 'USD')['last_actual']
+    start = None
+    if window in ('ytd', 'qtd', 'ttm') and end is not None:
+        start = window_start(end, window)
+    elif latest_n_months and end is not None:
+        start = end - (int(latest_n_months) - 1)
+    elif month_str:
+        start = end
+
+    metrics = variance_metrics(data, start, end, currency, k, threshold, threshold_pct)
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+    if metrics['start'] is None:
+        return {"response": "There is no budget or actual data to compare.", "figure": None, "metrics": metrics}
+    first = pd.Period(metrics['start'], freq='M').strftime('%b %Y')
+    last = pd.Period(metrics['end'], freq='M').strftime('%b %Y')
+    period = first if first == last else f"{first} - {last}"
+    if not metrics['drivers']:
+        return {"response": f"Nothing is off budget by that much for {period}.", "figure": None, "metrics": metrics}
+
+    response = f"Largest budget variances, {period} ({currency}; {metrics['matching']:,} month/entity/account cells off budget):\n"
+    labels = []
+    for rank, driver in enumerate(metrics['drivers'], 1):
+        month = pd.Period(driver['month'], freq='M').strftime('%b %Y')
+        pct = f" ({driver['variance_pct']:+.1f}%)" if driver['variance_pct'] is not None else ""
+        response += (
+            f"{rank}. {driver['entity']} - {driver['account_category']} - {month}: "
+            f"actual {sign}{driver['actual']:,.0f} vs budget {sign}{driver['budget']:,.0f}, "
+            f"{sign}{driver['variance']:+,.0f}{pct}, {'favourable' if driver['favourable'] else 'unfavourable'}\n"
+        )
+        labels.append(f"{driver['entity']} {driver['account_category']} {month}")
+
+    fig = charts.bar_spec(f'Largest Budget Variances - {period}', labels, [d['variance'] for d in metrics['drivers']], f'Actual - Budget ({currency})')
+
+    return {"response": response.rstrip(), "figure": fig, "metrics": metrics}
+
 
-    return {"response": response, "figure": fig}
\ No newline at end of file
+FORECAST_LABELS = {'revenue': 'Revenue', 'cogs': 'COGS', 'opex': 'Opex', 'ebitda': 'EBITDA', 'gross_margin': 'Gross Margin'}
+
+
+def get_forecast(data, metric='ebitda', horizon=12, currency='USD', entity=None, method='auto'):
+    """
+    Forecasts every P&L line for the next `horizon` months, consolidated or for one entity.
+
+    Each entity x account series is forecast separately (see forecast_metrics)
+    and the chart shows `metric`, one of FORECAST_LINES, against its actuals.
+    """
+    try:
+        entity = resolve_entity(data, entity)
+    except KeyError:
+        return _unknown_entity(data, entity)
+    if method not in forecast.METHODS and method != 'auto':
+        method = 'auto'
+    if metric not in FORECAST_LINES:
+        metric = 'ebitda'
+    metrics = forecast_metrics(data, max(int(horizon), 1), currency, entity, method)
+    if metrics is None:
+        return {"response": "There isn't enough history to forecast from.", "figure": None, "metrics": None}
+    currency = metrics['currency']
+    sign = currency_sign(currency)
+
+    first = pd.Period(metrics['months'][0], freq='M').strftime('%b %Y')
+    last = pd.Period(metrics['months'][-1], freq='M').strftime('%b %Y')
+    scope = f" for {entity}" if entity else ""
+    models = ", ".join(f"{name.replace('_', ' ')} {n}" for name, n in metrics['methods'].items())
+    totals = metrics['totals']
+    response = (
+        f"Forecast{scope}, {first} - {last} ({len(metrics['months'])} months, {currency}; "
+        f"{metrics['series']} entity/account series, models: {models}):\n"
+        + "".join(f"- {FORECAST_LABELS[line]}: {sign}{totals[line]:,.0f}\n" for line in FORECAST_LINES)
+    )
+    if totals['revenue']:
+        response += f"- Gross Margin %: {totals['gross_margin'] / totals['revenue'] * 100:.1f}%\n"
+
+    history = metrics['history']
+    fig = charts.forecast_spec(
+        f"{FORECAST_LABELS[metric]} Forecast{scope}",
+        {"x": history['months'], "y": history[metric]},
+        {"x": metrics['months'], "y": metrics['forecast'][metric]},
+        f"{FORECAST_LABELS[metric]} ({currency})",
+    )
+    return {"response": response.rstrip(), "figure": fig, "metrics": metrics}
@@ -0,0 +1,257 @@
+"""
+Lightweight per-query tracing.
+
+Wrap a stage in `with span("name", tag=value):` to time it. Spans opened
+inside another span become its children, so one question produces a tree
+such as query -> intent -> llm, query -> tool, with tags like the intent,
+whether a cache answered and how many cube rows were scanned. When the
+outermost span closes, the tree is handed to every registered sink.
+
+Spans follow contextvars, so they nest correctly across asyncio tasks and
+asyncio.to_thread; plain worker threads start their own traces. With no
+sinks registered a span costs a couple of clock reads.
+"""
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+
+
+SINKS = []
+
+_current = contextvars.ContextVar('span', default=None)
+
+
+class Span:
+    """One timed stage. `seconds` is set when the span closes."""
+
+    def __init__(self, name, parent=None, tags=None):
+        self.name = name
+        self.parent = parent
+        self.tags = dict(tags or {})
+        self.children = []
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.start_ns = time.time_ns()
+        self.seconds = None
+        self._start = time.perf_counter()
+
+    def tag(self, **tags):
+        """Sets tags on this span."""
+        self.tags.update(tags)
+
+    def walk(self, depth=0):
+        """Yields (depth, span) for this span and every descendant, depth first."""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def find(self, name):
+        """Returns the first span called `name` in this tree, or None."""
+        return next((span for _, span in self.walk() if span.name == name), None)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "tags": self.tags,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+    def breakdown(self):
+        """One row per span (indented by depth) with its milliseconds and tags, for display."""
+        return [
+            {"span": "  " * depth + span.name, "ms": round((span.seconds or 0.0) * 1000, 2),
+             "tags": ", ".join(f"{k}={v}" for k, v in span.tags.items())}
+            for depth, span in self.walk()
+        ]
+
+
+@contextmanager
+def span(name, **tags):
+    """
+    Times the enclosed block as a span called `name`.
+
+    Exceptions are tagged on the span and re-raised. Closing a span with no
+    parent emits the whole trace to the sinks.
+    """
+    parent = _current.get()
+    current = Span(name, parent, tags)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.tags["error"] = repr(e)
+        raise
+    finally:
+        current.seconds = time.perf_counter() - current._start
+        _current.reset(token)
+        if parent is None:
+            emit(current)
+
+
+def current_span():
+    """The innermost open span, or None outside any trace."""
+    return _current.get()
+
+
+def tag(**tags):
+    """Sets tags on the innermost open span; does nothing outside a trace."""
+    current = _current.get()
+    if current is not None:
+        current.tags.update(tags)
+
+
+def count(name, n):
+    """Adds `n` to a counter tag (e.g. rows_scanned) on the innermost open span."""
+    current = _current.get()
+    if current is not None:
+        current.tags[name] = current.tags.get(name, 0) + int(n)
+
+
+def add_sink(sink):
+    """Registers a sink; any object with an emit(span) method."""
+    SINKS.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    if sink in SINKS:
+        SINKS.remove(sink)
+
+
+def emit(root):
+    """Hands a finished trace to every sink. A failing sink never breaks the query."""
+    for sink in list(SINKS):
+        try:
+            sink.emit(root)
+        except Exception as e:
+            print(f"Tracing sink {type(sink).__name__} failed: {e}")
+
+
+class RingBufferSink:
+    """Keeps the last `maxlen` traces in memory."""
+
+    def __init__(self, maxlen=100):
+        self._traces = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def emit(self, root):
+        with self._lock:
+            self._traces.append(root)
+
+    def traces(self):
+        """The buffered traces, oldest first."""
+        with self._lock:
+            return list(self._traces)
+
+
+class FileSink:
+    """Appends each trace to a file as one JSON line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, root):
+        line = json.dumps(dict(root.to_dict(), trace_id=root.trace_id, start_ns=root.start_ns), default=str)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(root, service_name='cfo-copilot'):
+    """Converts a trace into an OTLP/JSON ExportTraceServiceRequest body."""
+    spans = []
+    for _, item in root.walk():
+        spans.append({
+            "traceId": item.trace_id,
+            "spanId": item.span_id,
+            "parentSpanId": item.parent.span_id if item.parent is not None else "",
+            "name": item.name,
+            "kind": 1,
+            "startTimeUnixNano": str(item.start_ns),
+            "endTimeUnixNano": str(item.start_ns + int((item.seconds or 0.0) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in item.tags.items()],
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "agent.tracing"}, "spans": spans}],
+    }]}
+
+
+class OtelSink:
+    """
+    Exports traces in the OpenTelemetry (OTLP/JSON) format.
+
+    With `endpoint` (e.g. http://localhost:4318/v1/traces) each trace is
+    POSTed to an OpenTelemetry collector; with `export`, the payload dict is
+    passed to that callable instead. Exporting happens on a daemon thread fed
+    by a queue of at most `max_queue` traces, so a slow or unreachable
+    collector never holds up a query; traces arriving while the queue is full
+    are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, endpoint=None, export=None, service_name='cfo-copilot', timeout=2.0, max_queue=1000):
+        self.endpoint = endpoint
+        self.export = export or self._post
+        self.service_name = service_name
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def emit(self, root):
+        payload = otlp_payload(root, self.service_name)
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._drain, name='otel-export', daemon=True)
+                self._worker.start()
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """Waits until every queued trace has been exported (or `timeout` seconds pass); returns True if it emptied."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _drain(self):
+        while True:
+            payload = self._queue.get()
+            try:
+                self.export(payload)
+            except Exception as e:
+                print(f"Tracing sink {type(self).__name__} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _post(self, payload):
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=self.timeout).close()
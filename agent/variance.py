@@ -0,0 +1,79 @@
+"""
+Budget-vs-actual variance for every month x entity x account cell.
+
+The cube already holds actuals and budget aligned on (month, entity,
+account_category), so variance_cells computes every cell's variance in one
+vectorized pass over its two columns. top_drivers then answers any period
+range and threshold from those arrays: the range is a binary search on the
+month-sorted cells and the thresholds are masks, so nothing is recomputed,
+and only the K largest variances are sorted.
+"""
+import numpy as np
+
+
+def variance_cells(cube, currency='USD'):
+    """
+    Actual, budget and variance for every cell of the cube, as parallel arrays sorted by month.
+
+    'variance' is actual - budget and 'variance_pct' is that as a percentage
+    of the budget (NaN where the budget is 0). 'favourable' is True where
+    revenue beats budget or a cost comes in under it. 'last_actual' is the
+    latest month key with any actuals, since budgets often run ahead of them.
+    """
+    index = cube.index
+    zeros = np.zeros(len(cube))
+    actual = cube[('actual', currency)].to_numpy(dtype='float64') if ('actual', currency) in cube.columns else zeros
+    budget = cube[('budget', currency)].to_numpy(dtype='float64') if ('budget', currency) in cube.columns else zeros
+    variance = actual - budget
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance_pct = np.where(budget != 0, variance / np.abs(budget) * 100, np.nan)
+
+    accounts = index.levels[2].astype('str')
+    account_codes = np.asarray(index.codes[2])
+    revenue = np.asarray(accounts == 'Revenue')[account_codes]
+    months = index.levels[0].to_numpy()[index.codes[0]]
+    with_actuals = months[actual != 0]
+
+    return {
+        "month": months,
+        "entity_codes": np.asarray(index.codes[1]),
+        "entities": index.levels[1].astype('str'),
+        "account_codes": account_codes,
+        "accounts": accounts,
+        "actual": actual,
+        "budget": budget,
+        "variance": variance,
+        "variance_pct": variance_pct,
+        "favourable": np.where(revenue, variance >= 0, variance <= 0),
+        "last_actual": int(with_actuals.max()) if len(with_actuals) else None,
+    }
+
+
+def top_k(values, k):
+    """Positions of the `k` largest `values`, largest first, via argpartition plus a sort of just those k."""
+    if len(values) > k:
+        candidates = np.argpartition(values, len(values) - k)[len(values) - k:]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind='stable')]
+
+
+def top_drivers(cells, k=10, start=None, end=None, threshold=0.0, threshold_pct=None):
+    """
+    The `k` cells with the largest absolute variance between month keys start..end (inclusive).
+
+    Cells must also be at least `threshold` off budget in amount and, if
+    given, `threshold_pct` percent (a cell with no budget counts as infinitely
+    far off). Returns (positions into `cells`, number of cells that passed the
+    filters).
+    """
+    months = cells['month']
+    lo = months.searchsorted(start, 'left') if start is not None else 0
+    hi = months.searchsorted(end, 'right') if end is not None else len(months)
+
+    size = np.abs(cells['variance'][lo:hi])
+    keep = (size > 0) & (size >= threshold)
+    if threshold_pct is not None:
+        keep &= np.nan_to_num(np.abs(cells['variance_pct'][lo:hi]), nan=np.inf) >= threshold_pct
+    candidates = np.flatnonzero(keep)
+    return lo + candidates[top_k(size[candidates], k)], len(candidates)
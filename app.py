@@ -1,5 +1,8 @@
+import json
+import os
+import pandas as pd
 import streamlit as st
-from agent import planner, tools
+from agent import charts, planner, store, tools, tracing
 from dotenv import load_dotenv
 
 # Load environment variables (for OpenAI API key)
@@ -9,24 +12,97 @@ st.set_page_config(page_title="CFO Copilot", layout="wide")
 st.title("🤖 Mini CFO Copilot")
 st.markdown("Ask me a question about your monthly financials.")
 
-@st.cache_data
+@st.cache_resource
 def load_data():
-    """Load and cache the financial data."""
+    """
+    Load the financial data once per server.
+
+    cache_resource hands every rerun the same dict rather than an unpickled
+    copy, so the memory-mapped frames are not copied and what the tools build
+    on first use (other currencies, variance cells, forecasts) is kept.
+    """
+    # Only runs when the data is (re)loaded, so cached answers for old data go too.
+    planner.invalidate_caches()
+    start_warm_up.clear()
     return tools.load_and_prepare_data()
 
-# Load the data
-data = load_data()
+@st.cache_resource(max_entries=64)
+def render_chart(spec_json):
+    """Build (and cache) the Plotly figure for a serialized chart spec."""
+    return charts.to_figure(json.loads(spec_json))
+
+@st.cache_resource
+def setup_tracing():
+    """Registers the trace sinks named in the environment, once per server."""
+    if os.getenv("CFO_TRACE_FILE"):
+        tracing.add_sink(tracing.FileSink(os.getenv("CFO_TRACE_FILE")))
+    if os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"):
+        tracing.add_sink(tracing.OtelSink(os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")))
+
+setup_tracing()
+show_timings = st.sidebar.checkbox("Show timing breakdown", help="Where the time went for each answer: intent, tool, chart and rendering.")
+
+def show_trace(breakdown):
+    with st.expander("Timing breakdown"):
+        st.dataframe(pd.DataFrame(breakdown), hide_index=True, use_container_width=True)
+
+@st.cache_resource
+def shared_data():
+    """Attach to the shared store, publishing the data first if no other server process has."""
+    return store.SharedData(data=store.load_shared())
+
+@st.cache_resource
+def start_warm_up(version, _data):
+    """
+    Answers the common questions for a data version in the background, once per server.
+
+    Figures go through render_chart, so they are cached too. Returns a dict
+    that the warm-up thread keeps updated with its progress and, once done,
+    its timings (or the error it failed with).
+    """
+    status = {"done": 0, "total": None, "report": None, "error": None}
+    def progress(done, total, label, seconds):
+        status.update(done=done, total=total)
+    def finished(future):
+        if future.exception() is not None:
+            print(f"Warm-up failed: {future.exception()}")
+            status.update(error=future.exception())
+        else:
+            status.update(report=future.result())
+    future = planner.warm_up_in_background(
+        _data, currencies=tools.supported_currencies(_data),
+        render=lambda figure: render_chart(json.dumps(figure)), progress=progress
+    )
+    future.add_done_callback(finished)
+    return status
+
+# Load the data. With CFO_STORE_DIR set, every server process maps one shared
+# copy of it, and moves to a newly published version on the next question.
+data = shared_data().get() if os.getenv("CFO_STORE_DIR") else load_data()
+
+# Answer the obvious questions ahead of the first user; CFO_WARM_UP=0 turns it off.
+if os.getenv("CFO_WARM_UP", "1") != "0":
+    warm_up = start_warm_up(data["version"], data)
+    if warm_up["error"] is not None:
+        st.sidebar.caption(f"Warm-up failed: {warm_up['error']}")
+    elif warm_up["report"] is not None:
+        st.sidebar.caption(f"Warmed up {len(warm_up['report']['answers'])} answers in {warm_up['report']['seconds']:.1f}s")
+    else:
+        st.sidebar.caption(f"Warming up common answers... {warm_up['done']}/{warm_up['total'] or '?'}")
+
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # Display chat messages from history on app rerun
-for message in st.session_state.messages:
+for i, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if "figure" in message and message["figure"] is not None:
-            st.plotly_chart(message["figure"], use_container_width=True, key=message["figure"])
+        for j, chart in enumerate(message.get("charts") or []):
+            st.plotly_chart(render_chart(chart), use_container_width=True, key=f"chart-{i}-{j}")
+        if show_timings and message.get("trace"):
+            show_trace(message["trace"])
 
 
 # Accept user input
@@ -39,20 +115,28 @@ if prompt := st.chat_input("What was June 2025 revenue vs budget?"):
 
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
+        with st.spinner("Thinking..."), tracing.span("chat", query=prompt) as trace:
             # Call the agent to get the response
             result = planner.run_query(prompt, data)
             response_text = result.get("response")
-            response_figure = result.get("figure")
+            # Keep only the compact chart specs in the history, serialized so
+            # they can key the render cache. Multi-part answers have several.
+            figures = result.get("figures") or ([result["figure"]] if result.get("figure") else [])
+            charts_json = [json.dumps(figure) for figure in figures]
             
-            st.markdown(response_text)
-            if response_figure:
-                st.plotly_chart(response_figure, use_container_width=True)
+            with tracing.span("render"):
+                st.markdown(response_text)
+                for j, chart in enumerate(charts_json):
+                    st.plotly_chart(render_chart(chart), use_container_width=True, key=f"chart-{len(st.session_state.messages)}-{j}")
+
+        if show_timings:
+            show_trace(trace.breakdown())
             
-            # Add assistant response to chat history
-            st.session_state.messages.append({
-                "role": "assistant",
+        # Add assistant response to chat history
+        st.session_state.messages.append({
+            "role": "assistant",
 
-                "content": response_text,
-                "figure": response_figure
-            })
\ No newline at end of file
+            "content": response_text,
+            "charts": charts_json,
+            "trace": trace.breakdown()
+        })
\ No newline at end of file
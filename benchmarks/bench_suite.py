@@ -0,0 +1,214 @@
+"""
+Times every stage of the pipeline on synthetic data and writes the results as JSON.
+
+Usage:
+    python -m benchmarks.bench_suite [--months 60] [--entities 50] [--accounts 12] [--currencies 5]
+                                     [--rows-per-cell 4] [-o results.json] [--compare baseline.json]
+
+Stages cover ingest (CSV, snapshot and chunked), each tool and the planner.
+The planner runs against a stub model that answers instantly, so the numbers
+measure our own code rather than Gemini. Each stage reports its best wall time
+over --repeat runs and the peak memory traced during one separate run.
+
+With --compare, each stage is also compared with a previous results file and
+the command exits with status 1 if any stage is more than --threshold times
+slower.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from agent import planner, tools
+from agent import snapshot as snapshots
+from benchmarks.synthetic import generate
+
+
+PLANNER_QUESTIONS = [
+    "What was June 2025 revenue vs budget in USD?",
+    "EBITDA for June 2025 in EUR",
+    "Opex breakdown for May 2025",
+    "Show me the gross margin trend for the last six months",
+    "What is our cash runway right now?",
+    "YTD EBITDA through June 2025",
+    "Revenue, EBITDA and opex for Q2 2025 in EUR",
+    "Where are we most off budget?",
+    # Ambiguous questions go to the (stubbed) LLM.
+    "Revenue and cash runway for June 2025",
+    "How are we doing?",
+]
+
+
+class StubModel:
+    """Stands in for the Gemini model: classifies with the local parser's best guess, instantly."""
+
+    def _respond(self, prompt):
+        query = re.search(r'User Question: "(.*)"', prompt).group(1)
+        intent = planner.parse_intent_locally(query, strict=False)
+        return type('Response', (), {'text': json.dumps({"intent": intent["intent"], "params": intent["params"]})})()
+
+    def generate_content(self, prompt):
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt):
+        return self._respond(prompt)
+
+
+def measure(func, repeat=3, setup=None):
+    """
+    Runs `func` `repeat` times; returns its last result and {seconds (best), peak_bytes}.
+
+    tracemalloc slows allocation-heavy code down by uneven amounts, so the
+    timed runs go without it and the peak memory comes from one more run.
+    `setup`, if given, runs untimed before every run.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, {"seconds": best, "peak_bytes": peak}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(data_dir, repeat=3, chunksize=100_000):
+    """Runs every stage against the CSVs in `data_dir` and returns {stage: measurement}."""
+    stages = {}
+
+    def stage(name, func, times=repeat, setup=None):
+        result, stages[name] = measure(func, times, setup)
+        print(f"{name:<32} {stages[name]['seconds']:9.4f}s  {stages[name]['peak_bytes'] / 2**20:9.1f} MiB", file=sys.stderr)
+        return result
+
+    data = stage("ingest.csv", lambda: tools.load_and_prepare_data(data_dir, snapshot=False))
+    remove_snapshot = lambda: shutil.rmtree(os.path.join(data_dir, snapshots.SNAPSHOT_DIR), ignore_errors=True)
+    stage("ingest.snapshot_write", lambda: tools.load_and_prepare_data(data_dir), times=1, setup=remove_snapshot)
+    stage("ingest.snapshot_load", lambda: tools.load_and_prepare_data(data_dir))
+    stage("ingest.chunked", lambda: tools.load_and_prepare_data(data_dir, chunksize=chunksize))
+
+    month = pd.Period(data['actuals']['month'].max(), freq='M').strftime('%B %Y')
+    entity = tools.entities(data)[-1]
+    stage("tools.revenue", lambda: tools.get_revenue(data, month, 'USD'))
+    stage("tools.revenue_entity", lambda: tools.get_revenue(data, month, 'USD', entity))
+    stage("tools.ebitda", lambda: tools.get_ebitda(data, month, 'USD'))
+    stage("tools.opex_breakdown", lambda: tools.get_opex_breakdown(data, month, 'USD'))
+    stage("tools.gross_margin_trend", lambda: tools.get_gross_margin_trend(data, 12))
+    stage("tools.cash_runway", lambda: tools.get_cash_runway(data, 'USD'))
+    stage("tools.range_ytd", lambda: tools.get_range_metric(data, 'ebitda', month, 'ytd', 'USD'))
+    stage("tools.plan", lambda: tools.get_plan(data, ['revenue', 'ebitda', 'opex_breakdown'], month, 'USD'))
+    stage("tools.variance_scan", lambda: tools.get_variance_drivers(dict(data, variance_cells={}), k=10), times=1)
+    stage("tools.variance_refilter", lambda: tools.get_variance_drivers(data, month, 'ytd', k=10, threshold_pct=5))
+    stage("tools.runway_sensitivity", lambda: tools.get_runway_sensitivity(data, 'USD'))
+    stage("tools.forecast", lambda: tools.get_forecast(data, 'ebitda', 18, 'USD'))
+    stage("tools.cash_runway_forecast", lambda: tools.get_cash_runway(data, 'USD', burn='forecast'))
+    # The first request for a new reporting currency converts the cube; time it on fresh data.
+    stage("tools.new_currency", lambda: tools.get_ebitda(tools.load_and_prepare_data(data_dir), month, 'EUR'), times=1)
+
+    original_get_model = planner.get_model
+    planner.get_model = lambda: StubModel()
+    try:
+        def cold():
+            planner.invalidate_caches()
+            return [planner.run_query(question, data) for question in PLANNER_QUESTIONS]
+        stage("planner.run_query_cold", cold)
+        stage("planner.run_query_cached", lambda: [planner.run_query(question, data) for question in PLANNER_QUESTIONS])
+        def warm_up():
+            planner.invalidate_caches()
+            return planner.warm_up(data)
+        stage("planner.warm_up", warm_up)
+    finally:
+        planner.get_model = original_get_model
+        planner.invalidate_caches()
+
+    return stages
+
+
+def compare(results, baseline, threshold):
+    """Prints each stage's time relative to `baseline` and returns the stages slower than `threshold`x."""
+    slower = []
+    for name, stats in results['stages'].items():
+        before = baseline.get('stages', {}).get(name)
+        if not before or not before['seconds']:
+            continue
+        ratio = stats['seconds'] / before['seconds']
+        print(f"{name:<32} {ratio:6.2f}x {'SLOWER' if ratio > threshold else ''}", file=sys.stderr)
+        if ratio > threshold:
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--entities', type=int, default=50)
+    parser.add_argument('--accounts', type=int, default=12)
+    parser.add_argument('--currencies', type=int, default=5)
+    parser.add_argument('--rows-per-cell', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', help="file to write the JSON results to (default: stdout)")
+    parser.add_argument('--compare', help="results file from an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=1.5, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    config = {
+        "months": args.months, "entities": args.entities, "accounts": args.accounts,
+        "currencies": args.currencies, "rows_per_cell": args.rows_per_cell, "seed": args.seed,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        config["rows"] = generate(tmp, args.months, args.entities, args.accounts, args.currencies, args.rows_per_cell, seed=args.seed)
+        stages = run_suite(tmp, args.repeat)
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "config": config,
+        "stages": stages,
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(results, json.load(f), args.threshold)
+        if slower:
+            print(f"Slower than {args.threshold}x the baseline: {', '.join(slower)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
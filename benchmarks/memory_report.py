@@ -0,0 +1,33 @@
+"""
+Prints the memory footprint of the prepared frames as JSON, for tracking in CI.
+
+Usage:
+    python -m benchmarks.memory_report [--data-dir fixtures] [--max-bytes-per-row 40]
+
+Exits with status 1 if any frame uses more than --max-bytes-per-row.
+"""
+import argparse
+import json
+import sys
+
+from agent import tools
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='fixtures')
+    parser.add_argument('--max-bytes-per-row', type=float)
+    args = parser.parse_args()
+
+    report = tools.memory_report(tools.load_and_prepare_data(args.data_dir, snapshot=False))
+    print(json.dumps(report, indent=2))
+
+    if args.max_bytes_per_row is not None:
+        over = [name for name, stats in report.items() if stats['bytes_per_row'] > args.max_bytes_per_row]
+        if over:
+            print(f"Over {args.max_bytes_per_row} bytes/row: {', '.join(over)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Deterministic synthetic financial data in the same CSV layout as fixtures/.
+
+Usage:
+    python -m benchmarks.synthetic out_dir [--months 60] [--entities 50] [--accounts 12] [--currencies 5] [--rows-per-cell 4]
+
+The same arguments and seed always produce byte-identical files.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+BASE_CURRENCIES = ['USD', 'EUR', 'GBP', 'CHF', 'JPY']
+BASE_RATES = {'USD': 1.0, 'EUR': 1.08, 'GBP': 1.27, 'CHF': 1.12, 'JPY': 0.0068}
+OPEX_NAMES = ['Marketing', 'Sales', 'R&D', 'Admin', 'Facilities', 'IT', 'Legal', 'HR', 'Travel', 'Finance']
+
+
+def entity_names(n):
+    """'ParentCo' followed by Entity01, Entity02, ..."""
+    return ['ParentCo'] + [f'Entity{i:02d}' for i in range(1, n)]
+
+
+def account_names(n):
+    """Revenue and COGS followed by n - 2 Opex subcategories (at least one)."""
+    opex = max(n - 2, 1)
+    names = [OPEX_NAMES[i] if i < len(OPEX_NAMES) else f'Other{i:02d}' for i in range(opex)]
+    return ['Revenue', 'COGS'] + [f'Opex:{name}' for name in names]
+
+
+def currency_codes(n):
+    """The common reporting currencies first, then made-up codes X05, X06, ..."""
+    return (BASE_CURRENCIES + [f'X{i:02d}' for i in range(len(BASE_CURRENCIES), n)])[:max(n, 1)]
+
+
+def _ledger(rng, months, entities, accounts, entity_currency, rows_per_cell, scale, messy):
+    """One row per (month, entity, account, line) with a plausible P&L shape."""
+    m, e, a = len(months), len(entities), len(accounts)
+    month_idx, entity_idx, account_idx, _ = np.indices((m, e, a, rows_per_cell)).reshape(4, -1)
+
+    # Revenue is the biggest line; COGS ~15% and each Opex line a few % of it.
+    share = np.array([1.0, 0.15] + [0.35 / (a - 2)] * (a - 2))[:a]
+    size = rng.lognormal(mean=np.log(1_000_000), sigma=0.5, size=e)[entity_idx]
+    growth = 1.0 + 0.01 * month_idx
+    noise = rng.normal(1.0, 0.05, size=len(month_idx)) * scale
+    amounts = np.round(size * share[account_idx] * growth * noise / rows_per_cell).astype('int64')
+
+    text = amounts.astype(str).astype(object)
+    if messy:
+        # Sprinkle in the formats seen in real exports: "$1,234", "(500)" and "-".
+        kind = rng.random(len(text))
+        dollars = kind < 0.1
+        text[dollars] = ['${:,}'.format(v) for v in amounts[dollars]]
+        text[(kind >= 0.1) & (kind < 0.12)] = '-'
+        refunds = (kind >= 0.12) & (kind < 0.14)
+        text[refunds] = ['({:,})'.format(v) for v in amounts[refunds] // 10]
+
+    return pd.DataFrame({
+        'month': months[month_idx],
+        'entity': np.asarray(entities)[entity_idx],
+        'account_category': np.asarray(accounts)[account_idx],
+        'amount': text,
+        'currency': np.asarray(entity_currency)[entity_idx],
+    })
+
+
+def generate(data_dir, months=36, entities=2, accounts=6, currencies=2, rows_per_cell=1, start='2023-01', seed=0, messy=True):
+    """
+    Writes actuals.csv, budget.csv, fx.csv and cash.csv into `data_dir`.
+
+    Each ledger has months x entities x accounts x rows_per_cell rows. Entity
+    i books in currency i mod `currencies` (so ParentCo is in USD). Returns a
+    dict of row counts per file.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    month_labels = pd.period_range(start, periods=months, freq='M').strftime('%Y-%m').to_numpy()
+    entity_list = entity_names(entities)
+    account_list = account_names(accounts)
+    currency_list = currency_codes(currencies)
+    entity_currency = [currency_list[i % len(currency_list)] for i in range(len(entity_list))]
+
+    actuals = _ledger(rng, month_labels, entity_list, account_list, entity_currency, rows_per_cell, 1.0, messy)
+    budget = _ledger(rng, month_labels, entity_list, account_list, entity_currency, rows_per_cell, 1.05, messy)
+
+    base = np.array([BASE_RATES.get(c, 1.0 + 0.1 * i) for i, c in enumerate(currency_list)])
+    drift = np.cumprod(rng.normal(1.0, 0.01, size=(months, len(currency_list))), axis=0)
+    rates = base * drift
+    rates[:, currency_list.index('USD') if 'USD' in currency_list else 0] = 1.0
+    fx = pd.DataFrame({
+        'month': np.repeat(month_labels, len(currency_list)),
+        'currency': np.tile(currency_list, months),
+        'rate_to_usd': np.round(rates.ravel(), 6),
+    })
+
+    cash = pd.DataFrame({
+        'month': month_labels,
+        'entity': 'Consolidated',
+        'cash_usd': np.round(5_000_000 * entities + np.cumsum(rng.normal(-50_000, 200_000, size=months) * entities)).astype('int64'),
+    })
+
+    files = {'actuals': actuals, 'budget': budget, 'fx': fx, 'cash': cash}
+    for name, frame in files.items():
+        frame.to_csv(os.path.join(data_dir, f'{name}.csv'), index=False)
+    return {name: len(frame) for name, frame in files.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir')
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--entities', type=int, default=2)
+    parser.add_argument('--accounts', type=int, default=6)
+    parser.add_argument('--currencies', type=int, default=2)
+    parser.add_argument('--rows-per-cell', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    counts = generate(args.data_dir, args.months, args.entities, args.accounts, args.currencies, args.rows_per_cell, seed=args.seed)
+    print(', '.join(f"{name}: {rows:,} rows" for name, rows in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
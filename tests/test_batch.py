@@ -0,0 +1,116 @@
+import io
+import json
+from agent import planner
+from agent.batch import *
+from agent.batch import _answer
+
+
+def test_run_batch_deduplicates_and_streams(monkeypatch):
+    """
+    Tests that identical questions are answered once and every record gets an output line.
+    """
+
+    calls = []
+    def fake_ebitda(data, month_str, currency='USD', entity=None):
+        calls.append((month_str, currency))
+        return {"response": f"EBITDA for {month_str} in {currency}", "figure": None}
+    monkeypatch.setattr(planner.tools, "get_ebitda", fake_ebitda)
+    planner.invalidate_caches()
+    records = read_questions([
+        '{"id": 1, "question": "EBITDA for June 2025 in EUR?"}',
+        '"ebitda for june 2025 in eur"',
+        '',
+        '{"query": "EBITDA for 2025-07"}',
+    ])
+    out = io.StringIO()
+
+
+    written = run_batch(records, {}, out, workers=2)
+    lines = sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda line: line["index"])
+
+
+    assert written == 3
+    assert sorted(calls) == [("July 2025", "USD"), ("June 2025", "EUR")]
+    assert lines[0]["id"] == 1
+    assert lines[1]["response"] == "EBITDA for June 2025 in EUR"
+    assert lines[2]["intent"] == "ebitda"
+
+
+def test_read_questions_skips_records_without_a_question(capsys):
+    """
+    Tests that records with a missing or blank question are skipped with a warning instead of aborting the batch.
+    """
+
+    lines = ['{"id": 1}', '{"id": 2, "question": "  "}', '{"id": 3, "query": "EBITDA for June 2025"}', '""']
+
+
+    records = read_questions(lines)
+
+
+    assert [record["id"] for record in records] == [3]
+    assert capsys.readouterr().err.count("no question") == 3
+
+
+def test_run_batch_reports_failing_questions(monkeypatch):
+    """
+    Tests that a question whose tool raises gets an error line while the others are still answered.
+    """
+
+    resolved = {
+        "top five variances": {"intent": "variance", "params": {"top_k": "five"}},
+        "ebitda": {"intent": "ebitda", "params": {"month_str": "June 2025"}},
+    }
+    async def fake_intent(query, timeout=None, entities=()):
+        return dict(resolved[query], source="llm")
+    monkeypatch.setattr(planner, "get_intent_async", fake_intent)
+    planner.invalidate_caches()
+    data = tools.load_and_prepare_data(snapshot=False)
+    records = read_questions(['"top five variances"', '"ebitda"'])
+    out = io.StringIO()
+
+
+    written = run_batch(records, data, out, workers=2)
+    lines = sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda line: line["index"])
+
+
+    assert written == 2
+    assert lines[0]["error"].startswith("ValueError")
+    assert lines[0]["response"] is None
+    assert lines[1]["response"].startswith("EBITDA for June 2025") and "error" not in lines[1]
+
+
+def test_run_batch_writes_strict_json(monkeypatch):
+    """
+    Tests that a variance % against a zero budget is written as null rather than a bare Infinity or NaN.
+    """
+
+    def fake_revenue(data, month_str, currency='USD', entity=None):
+        return {"response": "Revenue for June 2025", "figure": None, "metrics": {"budget": 0.0, "variance_pct": float("inf"), "rows": [{"variance_pct": float("nan")}]}}
+    monkeypatch.setattr(planner.tools, "get_revenue", fake_revenue)
+    planner.invalidate_caches()
+    records = read_questions(['"Revenue for June 2025"'])
+    out = io.StringIO()
+
+
+    run_batch(records, {}, out)
+    line = json.loads(out.getvalue(), parse_constant=lambda constant: constant)
+
+
+    assert line["metrics"] == {"budget": 0.0, "variance_pct": None, "rows": [{"variance_pct": None}]}
+
+
+def test_answer_keeps_every_plan_chart():
+    """
+    Tests that a multi-part answer's charts all reach the batch output.
+    """
+
+    data = tools.load_and_prepare_data(snapshot=False)
+    planner.invalidate_caches()
+    intent_data = {"intent": "plan", "params": {"intents": ["revenue", "ebitda", "opex_breakdown"], "month_str": "June 2025"}}
+
+
+    answer = _answer(intent_data, data, figures=True)
+
+
+    assert len(answer["figures"]) == 3
+    assert answer["figure"] == answer["figures"][0]
@@ -0,0 +1,49 @@
+from agent.cache import *
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """
+    Tests that the cache stays within maxsize by dropping the least recently used entry.
+    """
+
+    cache = TTLCache(maxsize=2, ttl=60)
+
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2}
+
+
+def test_ttl_cache_expires_entries():
+    """
+    Tests that entries are dropped once their TTL has passed.
+    """
+
+    now = [0.0]
+    cache = TTLCache(maxsize=10, ttl=5, clock=lambda: now[0])
+
+
+    cache.set("a", 1)
+    fresh = cache.get("a")
+    now[0] = 6.0
+    expired = cache.get("a")
+
+
+    assert fresh == 1
+    assert expired is None
+    assert len(cache) == 0
+
+
+def test_normalize_query():
+    """
+    Tests that case, whitespace and trailing punctuation don't change the cache key.
+    """
+
+    assert normalize_query("  What is our  Cash Runway?? ") == normalize_query("what is our cash runway")
@@ -0,0 +1,45 @@
+import json
+import subprocess
+import sys
+from agent.charts import *
+
+
+def test_specs_render_to_figures():
+    """
+    Tests that each chart spec is JSON-serializable and renders to a Plotly figure.
+    """
+
+    specs = [
+        bar_spec('Revenue - June 2025', ['Actual', 'Budget'], [100000, 90000], 'Amount (USD)'),
+        line_spec('Gross Margin % Trend', ['2025-05', '2025-06'], [60.0, 61.1], 'Gross Margin %', y_suffix='%'),
+        pie_spec('OPEX Breakdown - June 2025', ['Marketing', 'R&D'], [30000, 20000]),
+        forecast_spec('EBITDA Forecast', {"x": ['2025-05', '2025-06'], "y": [10.0, 12.0]}, {"x": ['2025-07'], "y": [13.0]}, 'EBITDA (USD)'),
+        runway_spec('USD', '$', {"x": ['2025-06-01'], "y": [450000.0]}, {"x": ['2025-06-01', '2025-07-01'], "y": [450000.0, 410000.0]},
+                    burning=True, end_of_runway={"x": '2026-05-01', "months": 11.25}),
+    ]
+
+
+    figures = [to_figure(json.loads(json.dumps(spec))) for spec in specs]
+
+
+    assert [len(fig.data) for fig in figures] == [1, 1, 1, 2, 2]
+    assert figures[3].data[1].x == ('2025-06', '2025-07')
+    assert figures[4].layout.annotations[0].text == "End of Runway (~11.2 months)"
+
+
+def test_tools_do_not_import_plotly():
+    """
+    Tests that answering questions never imports Plotly; only rendering does.
+    """
+
+    code = (
+        "import sys; from agent import tools; "
+        "data = tools.load_and_prepare_data(snapshot=False); tools.get_ebitda(data, 'June 2025'); "
+        "print('plotly' in sys.modules)"
+    )
+
+
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+
+    assert output.strip() == "False"
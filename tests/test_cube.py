@@ -0,0 +1,109 @@
+import pandas as pd
+from datetime import datetime
+from agent.cube import *
+
+
+def test_build_cube():
+    """
+    Tests that the cube aggregates actuals and budget by month, entity and account.
+    """
+
+    actuals_data = {
+        'month': [datetime(2025, 6, 1), datetime(2025, 6, 1), datetime(2025, 6, 1), datetime(2025, 7, 1)],
+        'entity': ['ParentCo', 'EMEA', 'EMEA', 'ParentCo'],
+        'account_category': ['Revenue', 'Revenue', 'Revenue', 'Revenue'],
+        'amount_usd': [100000, 20000, 5000, 120000],
+        'amount_eur': [92000, 18400, 4600, 110400]
+    }
+    budget_data = {
+        'month': [datetime(2025, 6, 1)],
+        'entity': ['ParentCo'],
+        'account_category': ['Revenue'],
+        'amount_usd': [110000],
+        'amount_eur': [101200]
+    }
+    mock_data = {
+        "actuals": pd.DataFrame(actuals_data),
+        "budget": pd.DataFrame(budget_data)
+    }
+
+
+    cube = build_cube(mock_data)
+    june = pd.Period('2025-06', freq='M')
+
+
+    assert cube.index.is_monotonic_increasing
+    assert cube.loc[(month_key(june), 'EMEA', 'Revenue'), ('actual', 'USD')] == 25000
+    assert month_totals(cube, june, 'USD')['actual'].loc['Revenue', CONSOLIDATED] == 125000
+    assert month_totals(cube, june, 'EUR')['budget'].loc['Revenue', CONSOLIDATED] == 101200
+    assert month_totals(cube, pd.Period('2024-01', freq='M'))['actual'].empty
+
+
+def test_month_slice():
+    """
+    Tests that month ranges are cut from the sorted cube as contiguous slices.
+    """
+
+    actuals_data = {
+        'month': [datetime(2025, m, 1) for m in (1, 2, 2, 3, 5)],
+        'account_category': ['Revenue', 'Revenue', 'COGS', 'Revenue', 'Revenue'],
+        'amount_usd': [1, 2, 3, 4, 5],
+        'amount_eur': [1, 2, 3, 4, 5]
+    }
+    cube = build_cube({"actuals": pd.DataFrame(actuals_data)})
+    feb, apr = month_key(datetime(2025, 2, 1)), month_key(datetime(2025, 4, 1))
+
+
+    middle = month_slice(cube, feb, apr)
+
+
+    assert middle[('actual', 'USD')].tolist() == [3, 2, 4]
+    assert month_slice(cube, apr, apr).empty
+    assert latest_months(cube, 2) == (month_key(datetime(2025, 3, 1)), month_key(datetime(2025, 5, 1)))
+    assert key_to_period(feb) == pd.Period('2025-02', freq='M')
+
+
+def test_month_totals_with_eliminations():
+    """
+    Tests that per-entity and consolidated totals come from one table, with eliminations netting out.
+    """
+
+    actuals_data = {
+        'month': [datetime(2025, 6, 1)] * 4,
+        'entity': ['ParentCo', 'EMEA', 'EMEA', 'Eliminations'],
+        'account_category': ['Revenue', 'Revenue', 'Opex:R&D', 'Revenue'],
+        'amount_usd': [100000, 30000, 8000, -10000],
+        'amount_eur': [92000, 27600, 7360, -9200]
+    }
+    cube = build_cube({"actuals": pd.DataFrame(actuals_data)})
+
+
+    table = month_totals(cube, pd.Period('2025-06', freq='M'), scenarios=('actual',))['actual']
+
+
+    assert table.loc['Revenue', 'EMEA'] == 30000
+    assert table.loc['Opex:R&D', 'ParentCo'] == 0
+    assert table.loc['Revenue', CONSOLIDATED] == 120000
+    assert list(table.columns) == ['EMEA', 'Eliminations', 'ParentCo', CONSOLIDATED]
+
+
+def test_window_totals():
+    """
+    Tests that YTD, QTD, TTM and rolling windows are applied to every month in one pass.
+    """
+
+    start = month_key(datetime(2024, 11, 1))
+    table = pd.DataFrame({'revenue': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]}, index=range(start, start + 6))
+
+
+    ytd = window_totals(table, 'ytd')['revenue'].tolist()
+    qtd = window_totals(table, 'qtd')['revenue'].tolist()
+    ttm = window_totals(table, 'ttm')['revenue'].tolist()
+    rolling = window_totals(table, 'rolling_average', 2)['revenue'].tolist()
+
+
+    assert ytd == [1.0, 3.0, 3.0, 7.0, 12.0, 18.0]
+    assert qtd == [1.0, 3.0, 3.0, 7.0, 12.0, 6.0]
+    assert ttm == [1.0, 3.0, 6.0, 10.0, 15.0, 21.0]
+    assert rolling == [1.0, 1.5, 2.5, 3.5, 4.5, 5.5]
+    assert window_start(start + 4, 'qtd') == month_key(datetime(2025, 1, 1))
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from agent.forecast import *
+
+
+def test_models_forecast_every_row_like_a_per_series_loop():
+    """
+    Tests each model's matrix forecast against the same model written out for one series at a time, and that 'auto' picks one per row.
+    """
+
+    rng = np.random.default_rng(0)
+    months = np.arange(30)
+    history = 100 + 2 * months + 10 * np.sin(months * np.pi / 6) + rng.normal(size=(5, 30))
+
+
+    seasonal = seasonal_naive(history, 15)
+    smoothed = exponential_smoothing(history, 3, alpha=0.3)
+    trend = linear_trend(history, 4)
+    chosen, methods = forecast(history, 4)
+    _, short_methods = forecast(history[:, :3], 2)
+
+
+    for row, series in enumerate(history):
+        level = series[0]
+        for value in series[1:]:
+            level = 0.3 * value + 0.7 * level
+        slope, intercept = np.polyfit(months, series, 1)
+        assert seasonal[row].tolist() == series[18:30].tolist() + series[18:21].tolist()
+        assert smoothed[row] == pytest.approx([level] * 3)
+        assert trend[row] == pytest.approx(intercept + slope * np.arange(30, 34))
+        assert chosen[row] == pytest.approx(METHODS[methods[row]](history[row:row + 1], 4)[0])
+    assert set(short_methods) == {"exponential_smoothing"}
+
+
+def test_series_matrix_lays_out_each_entity_and_account():
+    """
+    Tests that the cube becomes one row per entity and account, with a column per month up to `end` and gaps as 0.
+    """
+
+    index = pd.MultiIndex.from_tuples(
+        [(10, 'A', 'COGS'), (10, 'A', 'Revenue'), (12, 'A', 'Revenue'), (12, 'B', 'Revenue'), (13, 'B', 'COGS')],
+        names=['month', 'entity', 'account_category'],
+    )
+    columns = pd.MultiIndex.from_tuples([('actual', 'USD')], names=['scenario', 'currency'])
+    cube = pd.DataFrame([[5.0], [100.0], [120.0], [40.0], [7.0]], index=index, columns=columns)
+
+
+    series = series_matrix(cube, end=12)
+
+
+    rows = [(series['entities'][e], series['accounts'][a]) for e, a in zip(series['entity_codes'], series['account_codes'])]
+    assert rows == [('A', 'COGS'), ('A', 'Revenue'), ('B', 'Revenue')]
+    assert series['start'] == 10
+    assert series['history'].tolist() == [[5.0, 0.0, 0.0], [100.0, 0.0, 120.0], [0.0, 0.0, 40.0]]
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from agent.fx import *
+
+
+def test_convert_any_currency_pair():
+    """
+    Tests that amounts convert between any two currencies through the USD rate matrix.
+    """
+
+    fx = pd.DataFrame({
+        'month_key': [24300, 24300, 24300, 24301, 24301],
+        'currency': ['EUR', 'GBP', 'JPY', 'EUR', 'GBP'],
+        'rate_to_usd': [1.10, 1.25, 0.0070, 1.20, 1.30],
+    })
+    rates = FxRates.from_frame(fx)
+
+
+    gbp = rates.convert([100.0, 100.0, 1000.0, 50.0], [24300, 24301, 24300, 24302], ['EUR', 'EUR', 'JPY', 'EUR'], 'GBP')
+    usd = rates.convert([10.0, 10.0], [24300, 24301], 'USD', 'EUR')
+
+
+    assert gbp[:3] == pytest.approx([100 * 1.10 / 1.25, 100 * 1.20 / 1.30, 1000 * 0.0070 / 1.25])
+    assert np.isnan(gbp[3])
+    assert usd == pytest.approx([10 / 1.10, 10 / 1.20])
+    assert 'USD' in rates and 'CHF' not in rates
+
+
+def test_monthly_from_daily_averages_and_carries_forward():
+    """
+    Tests that daily rates collapse to monthly averages, with quiet months taking the last rate.
+    """
+
+    daily = pd.DataFrame({
+        'date': ['2025-01-02', '2025-01-31', '2025-03-03'],
+        'currency': ['CHF', 'CHF', 'CHF'],
+        'rate_to_usd': [1.10, 1.20, 1.30],
+    })
+
+
+    monthly = monthly_from_daily(daily)
+
+
+    assert monthly['month'].dt.strftime('%Y-%m').tolist() == ['2025-01', '2025-02', '2025-03']
+    assert monthly['rate_to_usd'].tolist() == pytest.approx([1.15, 1.15, 1.30])
+    assert currency_sign('GBP') == '£' and currency_sign('CHF') == 'CHF '
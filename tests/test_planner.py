@@ -0,0 +1,319 @@
+import asyncio
+from datetime import datetime
+from agent import planner
+from agent.planner import *
+
+
+def test_parse_intent_locally():
+    """
+    Tests that templated questions are classified without the LLM.
+    """
+
+    now = datetime(2025, 11, 3)
+
+
+    revenue = parse_intent_locally("What was June 2025 revenue vs budget in USD?", now)
+    opex = parse_intent_locally("Opex breakdown for Sept '24 in euros", now)
+    ebitda = parse_intent_locally("EBITDA last month", now)
+    trend = parse_intent_locally("Show me the gross margin trend for the last six months", now)
+    sterling = parse_intent_locally("EBITDA for June 2025 in pounds", now)
+    emea = parse_intent_locally("EMEA EBITDA for June 2025", now, entities=["EMEA", "ParentCo"])
+
+
+    assert revenue == {"intent": "revenue", "params": {"month_str": "June 2025", "currency": "USD"}, "source": "local"}
+    assert opex["params"] == {"month_str": "September 2024", "currency": "EUR"}
+    assert ebitda["params"] == {"month_str": "October 2025"}
+    assert trend["intent"] == "gross_margin_trend"
+    assert trend["params"] == {"latest_n_months": 6}
+    assert sterling["params"] == {"month_str": "June 2025", "currency": "GBP"}
+    assert emea["params"] == {"month_str": "June 2025", "entity": "EMEA"}
+
+
+def test_parse_intent_locally_defers_ambiguous_questions():
+    """
+    Tests that the local parser gives up on questions it can't resolve confidently.
+    """
+
+    now = datetime(2025, 11, 3)
+
+
+    assert parse_intent_locally("Revenue and cash runway for June 2025", now) is None
+    assert parse_intent_locally("Revenue and EBITDA", now) is None
+    assert parse_intent_locally("Revenue for June", now) is None
+    assert parse_intent_locally("Who is our biggest customer?", now) is None
+    assert parse_intent_locally("What's the gross margin for June 2025?", now) is None
+    assert parse_intent_locally("Cash runway as of March 2025", now) is None
+
+
+def test_get_intent_falls_back_to_llm(monkeypatch):
+    """
+    Tests that only unresolved questions reach the LLM, and that the source is reported.
+    """
+
+    calls = []
+    def fake_llm(query, entities=()):
+        calls.append(query)
+        return {"intent": "unknown", "params": {}}
+    monkeypatch.setattr(planner, "get_intent_from_llm", fake_llm)
+    invalidate_caches()
+
+
+    local = get_intent("What is our cash runway right now?")
+    remote = get_intent("Who is our biggest customer?")
+
+
+    assert local["source"] == "local"
+    assert remote["source"] == "llm"
+    assert calls == ["Who is our biggest customer?"]
+
+
+def test_run_query_accepts_null_llm_params(monkeypatch):
+    """
+    Tests that a null parameter from the LLM falls back to the tool's default instead of failing.
+    """
+
+    monkeypatch.setattr(planner, "get_intent_from_llm", lambda query, entities=(): {"intent": "gross_margin_trend", "params": {"latest_n_months": None}})
+    invalidate_caches()
+    data = planner.tools.load_and_prepare_data(snapshot=False)
+
+
+    result = run_query("How are our margins moving?", data)
+    everything = planner.tools.get_gross_margin_trend(data, None)
+
+
+    assert result["source"] == "llm"
+    assert len(result["metrics"]["months"]) == 3
+    assert len(everything["metrics"]["months"]) > 3
+
+
+def test_get_intent_is_cached(monkeypatch):
+    """
+    Tests that repeated questions are served from the intent cache after normalization.
+    """
+
+    calls = []
+    def fake_llm(query, entities=()):
+        calls.append(query)
+        return {"intent": "cash_runway", "params": {}}
+    monkeypatch.setattr(planner, "get_intent_from_llm", fake_llm)
+    invalidate_caches()
+
+
+    first = get_intent("How long will the money hold out?")
+    second = get_intent("  how long will the money   hold out ")
+
+
+    assert first["source"] == "llm"
+    assert second["source"] == "cache"
+    assert second["intent"] == "cash_runway"
+    assert len(calls) == 1
+    assert cache_stats()["intent"]["hits"] >= 1
+
+
+def test_run_intent_caches_per_data_version(monkeypatch):
+    """
+    Tests that tool results are reused for the same data version and recomputed for a new one.
+    """
+
+    calls = []
+    def fake_runway(data, currency='USD'):
+        calls.append(currency)
+        return {"response": f"runway in {currency}", "figure": None}
+    monkeypatch.setattr(planner.tools, "get_cash_runway", fake_runway)
+    invalidate_caches()
+    intent_data = {"intent": "cash_runway", "params": {"currency": "EUR"}}
+
+
+    run_intent(intent_data, {"version": "v1"})
+    run_intent(intent_data, {"version": "v1"})
+    result = run_intent(intent_data, {"version": "v2"})
+
+
+    assert result["response"] == "runway in EUR"
+    assert calls == ["EUR", "EUR"]
+
+
+def test_warm_up_answers_the_common_questions_ahead_of_time(monkeypatch):
+    """
+    Tests that warm_up answers the latest month's questions, so run_query serves them without running the tools.
+    """
+
+    data = planner.tools.load_and_prepare_data(snapshot=False)
+    invalidate_caches()
+    progress = []
+
+
+    report = warm_up(data, currencies=("USD", "eur"), progress=lambda done, total, label, seconds: progress.append((done, total)))
+    monkeypatch.setattr(planner, "_run_tool", lambda intent_data, data: {"response": "computed", "figure": None})
+    results = [run_query(query, data) for query in ("EBITDA for december 2025", "Revenue for December 2025 in EUR", "Show gross margin trend", "What is our cash runway?")]
+
+
+    assert len(report["answers"]) == 9
+    assert all(seconds is not None for seconds in report["answers"].values())
+    assert progress[-1] == (9, 9)
+    assert all(result["response"] != "computed" for result in results)
+
+
+class StubModel:
+    """
+    Local stand-in for the Gemini model: answers after `delay` seconds, and
+    records the most calls it had in flight at once.
+    """
+
+    def __init__(self, text, delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return type("Response", (), {"text": self.text})()
+
+
+def test_unparseable_llm_answers_are_not_cached(monkeypatch):
+    """
+    Tests that a Gemini reply that isn't JSON is answered as unknown but asked again next time.
+    """
+
+    model = StubModel("Sure! The intent is revenue.")
+    monkeypatch.setattr(planner, "get_model", lambda: model)
+    invalidate_caches()
+
+
+    first = asyncio.run(get_intent_async("Who is our biggest customer?"))
+    second = asyncio.run(get_intent_async("Who is our biggest customer?"))
+
+
+    assert first["intent"] == "unknown" and first["error"] is True
+    assert second["source"] == "llm"
+    assert model.calls == 2
+
+
+def test_run_query_async_resolves_questions_concurrently(monkeypatch):
+    """
+    Tests that a list of questions shares one model and waits for the LLM once, not per question.
+    """
+
+    model = StubModel('```json {"intent": "cash_runway", "params": {"currency": "EUR"}} ```', delay=0.05)
+    monkeypatch.setattr(planner, "get_model", lambda: model)
+    monkeypatch.setattr(planner.tools, "get_cash_runway", lambda data, currency='USD': {"response": currency, "figure": None})
+    invalidate_caches()
+    questions = ["How long will the money hold out?", "Are we going to be ok?", "Should we raise soon?"]
+
+
+    results = asyncio.run(run_query_async(questions, {}))
+
+
+    assert [r["response"] for r in results] == ["EUR", "EUR", "EUR"]
+    assert [r["source"] for r in results] == ["llm", "llm", "llm"]
+    assert model.calls == 3
+    assert model.max_in_flight == 3
+
+
+def test_get_intent_async_falls_back_on_timeout(monkeypatch):
+    """
+    Tests that a slow LLM call is abandoned in favour of the local classifier.
+    """
+
+    monkeypatch.setattr(planner, "get_model", lambda: StubModel('{"intent": "ebitda"}', delay=1.0))
+    invalidate_caches()
+
+
+    result = asyncio.run(get_intent_async("Revenue and cash runway for June 2025 please", timeout=0.05))
+
+
+    assert result["source"] == "local_fallback"
+    assert result["intent"] == "revenue"
+    assert result["params"]["month_str"] == "June 2025"
+
+
+def test_parse_range_intents_locally():
+    """
+    Tests that YTD/QTD/TTM/rolling questions become range intents carrying their metric.
+    """
+
+    now = datetime(2025, 11, 3)
+
+
+    ytd = parse_intent_locally("YTD EBITDA through June 2025", now)
+    ttm = parse_intent_locally("Revenue for the trailing twelve months in EUR", now)
+    rolling = parse_intent_locally("3-month rolling average of gross margin", now)
+    qtd = parse_intent_locally("Opex quarter-to-date", now)
+
+
+    assert ytd == {"intent": "ytd", "params": {"metric": "ebitda", "month_str": "June 2025"}, "source": "local"}
+    assert ttm["intent"] == "ttm" and ttm["params"] == {"metric": "revenue", "currency": "EUR"}
+    assert rolling["params"] == {"metric": "gross_margin", "latest_n_months": 3}
+    assert qtd["intent"] == "qtd" and qtd["params"] == {"metric": "opex"}
+    assert parse_intent_locally("YTD cash runway", now) is None
+    assert parse_intent_locally("Cash runway sensitivity scenarios", now)["intent"] == "runway_sensitivity"
+
+
+def test_parse_plan_intents_locally():
+    """
+    Tests that questions asking for several metrics become one plan with shared params.
+    """
+
+    now = datetime(2025, 11, 3)
+
+
+    quarter = parse_intent_locally("Compare revenue, EBITDA and opex for Q2 in EUR", now)
+    month = parse_intent_locally("EBITDA and revenue for EMEA in June 2025", now, entities=["EMEA", "ParentCo"])
+    single = parse_intent_locally("Revenue for Q4 '24", now)
+
+
+    assert quarter == {
+        "intent": "plan",
+        "params": {"intents": ["revenue", "ebitda", "opex_breakdown"], "window": "qtd", "month_str": "June 2025", "currency": "EUR"},
+        "source": "local",
+    }
+    assert month["params"] == {"intents": ["ebitda", "revenue"], "month_str": "June 2025", "entity": "EMEA"}
+    assert single["intent"] == "qtd" and single["params"] == {"metric": "revenue", "month_str": "December 2024"}
+
+
+def test_parse_variance_intents_locally():
+    """
+    Tests that off-budget questions become the variance scan, while one metric vs budget stays with its tool.
+    """
+
+    now = datetime(2025, 11, 3)
+
+
+    anywhere = parse_intent_locally("Where are we most off budget?", now)
+    top = parse_intent_locally("Top 5 budget variances YTD in EUR", now)
+    threshold = parse_intent_locally("Show variances over 10% for the last 6 months", now)
+    revenue = parse_intent_locally("Revenue variance for June 2025", now)
+
+
+    assert anywhere == {"intent": "variance", "params": {}, "source": "local"}
+    assert top["params"] == {"window": "ytd", "top_k": 5, "currency": "EUR"}
+    assert threshold["params"] == {"threshold_pct": 10.0, "latest_n_months": 6}
+    assert revenue["intent"] == "revenue"
+
+
+def test_parse_forecast_intents_locally():
+    """
+    Tests that forecast questions pick up the line, horizon and method, and runway questions switch to the forecast burn.
+    """
+
+    entities = ["EMEA", "ParentCo"]
+
+
+    revenue = parse_intent_locally("Forecast revenue for the next 18 months", entities=entities)
+    opex = parse_intent_locally("Projected opex for EMEA in EUR, 6 months ahead, using exponential smoothing", entities=entities)
+    runway = parse_intent_locally("What is our cash runway on the forecast burn?", entities=entities)
+    mixed = parse_intent_locally("Forecast the largest budget variances", entities=entities)
+
+
+    assert revenue == {"intent": "forecast", "params": {"metric": "revenue", "horizon": 18}, "source": "local"}
+    assert opex["params"] == {"metric": "opex", "horizon": 6, "method": "exponential_smoothing", "currency": "EUR", "entity": "EMEA"}
+    assert runway == {"intent": "cash_runway", "params": {"burn": "forecast"}, "source": "local"}
+    assert mixed is None
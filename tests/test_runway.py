@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from agent.runway import *
+
+
+def test_zero_crossing_matches_flat_burn_runway():
+    """
+    Tests that a flat burn runs out at cash / burn months, and growth or profit change that.
+    """
+
+    balances = project(1000.0, [100.0, 300.0, -50.0, 100.0], [0.0, 0.0, 0.0, 0.1], 24)
+
+
+    runway = zero_crossing(balances)
+
+
+    assert balances.shape == (4, 25)
+    assert runway[0] == pytest.approx(10.0)
+    assert runway[1] == pytest.approx(1000 / 300)
+    assert np.isnan(runway[2])
+    assert runway[3] < 10.0
+
+
+def test_runway_scenarios_sweep_every_combination():
+    """
+    Tests that every burn-growth, revenue-shock and window combination is projected in one matrix.
+    """
+
+    ebitda = np.array([-300.0, -100.0, -200.0])
+    revenue = np.array([1000.0, 1000.0, 1000.0])
+
+
+    result = runway_scenarios(6000.0, ebitda, revenue, burn_growth=(0.0, 0.05), revenue_shock=(0.0, -0.1), windows=(1, 3), horizon=60)
+    summary = runway_distribution(result['runway'])
+
+
+    assert result['balances'].shape == (8, 61)
+    assert result['burn'][:4].tolist() == pytest.approx([200.0, 200.0, 300.0, 300.0])
+    assert result['runway'][0] == pytest.approx(30.0)
+    assert result['runway'][2] == pytest.approx(20.0)
+    assert summary['scenarios'] == 8 and summary['never_run_out'] == 0
+    assert summary['max'] == pytest.approx(30.0)
@@ -0,0 +1,51 @@
+import os
+import shutil
+import pandas as pd
+from agent.snapshot import *
+from agent.tools import load_and_prepare_data
+
+
+def _copy_fixtures(tmp_path):
+    for name in SOURCE_FILES:
+        shutil.copy(os.path.join('fixtures', name), tmp_path / name)
+    return str(tmp_path)
+
+
+def test_snapshot_round_trip(tmp_path):
+    """
+    Tests that a second load is served from the snapshot and matches the CSV load.
+    """
+
+    data_dir = _copy_fixtures(tmp_path)
+
+
+    fresh = load_and_prepare_data(data_dir)
+    frames, _ = load_snapshot(data_dir)
+    cached = load_and_prepare_data(data_dir)
+
+
+    assert frames is not None
+    for name in ['actuals', 'budget', 'cash', 'cube']:
+        pd.testing.assert_frame_equal(fresh[name], cached[name], check_categorical=False)
+
+
+def test_snapshot_invalidated_by_csv_change(tmp_path):
+    """
+    Tests that editing a source CSV invalidates the snapshot and triggers a rebuild.
+    """
+
+    data_dir = _copy_fixtures(tmp_path)
+    load_and_prepare_data(data_dir)
+    old_key = read_manifest(data_dir)['key']
+
+    with open(tmp_path / 'cash.csv', 'a') as f:
+        f.write('\n2026-01,Consolidated,1000000')
+
+
+    frames, _ = load_snapshot(data_dir)
+    data = load_and_prepare_data(data_dir)
+
+
+    assert frames is None
+    assert read_manifest(data_dir)['key'] != old_key
+    assert data['cash']['cash_usd'].iloc[-1] == 1000000
@@ -0,0 +1,64 @@
+import mmap
+import os
+import shutil
+import numpy as np
+from agent import snapshot
+from agent.store import *
+from agent.tools import load_and_prepare_data, get_ebitda, get_revenue
+
+
+def _copy_fixtures(tmp_path):
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for name in snapshot.SOURCE_FILES:
+        shutil.copy(os.path.join('fixtures', name), data_dir / name)
+    return str(data_dir)
+
+
+def test_load_shared_publishes_once_and_attaches(tmp_path):
+    """
+    Tests that the first process publishes, later ones attach to the same version, and answers match a private load.
+    """
+
+    data_dir = _copy_fixtures(tmp_path)
+    store_dir = str(tmp_path / 'store')
+    private = load_and_prepare_data(data_dir, snapshot=False)
+
+
+    first = load_shared(data_dir, store_dir)
+    second = load_shared(data_dir, store_dir)
+    base = second['cube'].to_numpy()
+    while isinstance(base, np.ndarray) and base.base is not None:
+        base = base.base
+
+
+    assert first['version'] == second['version'] == private['version']
+    assert sorted(os.listdir(store_dir)) == sorted([first['version'], 'manifest.json', '.lock'])
+    assert get_ebitda(second, 'June 2025', 'EUR')['metrics'] == get_ebitda(private, 'June 2025', 'EUR')['metrics']
+    assert get_revenue(second, 'June 2025', 'USD', 'EMEA')['metrics'] == get_revenue(private, 'June 2025', 'USD', 'EMEA')['metrics']
+    assert isinstance(base, mmap.mmap)
+
+
+def test_readers_swap_to_a_new_version(tmp_path):
+    """
+    Tests that a reader moves to a newly published version while data it already holds stays usable.
+    """
+
+    data_dir = _copy_fixtures(tmp_path)
+    store_dir = str(tmp_path / 'store')
+    load_shared(data_dir, store_dir)
+    reader = SharedData(store_dir)
+    before = reader.get()
+
+    with open(os.path.join(data_dir, 'cash.csv'), 'a') as f:
+        f.write('\n2026-01,Consolidated,1000000')
+    load_shared(data_dir, store_dir)
+
+
+    after = reader.get()
+
+
+    assert after['version'] != before['version']
+    assert after['cash']['cash_usd'].iloc[-1] == 1000000
+    assert before['cash']['cash_usd'].iloc[-1] != 1000000
+    assert reader.get() is after
@@ -1,6 +1,10 @@
 import pandas as pd
+import pytest
 from datetime import datetime
 from agent.tools import *
+from agent.fx import get_fx
+from agent import forecast, tracing
+from agent.tools import _clean_financial_series, _clean_financial_value, _parse_month_series
 
 def test_get_revenue():
     """
@@ -112,4 +116,360 @@ def test_get_ebitda():
 
 
     assert "EBITDA for June 2025: €13,100" in result["response"]
-    assert result["figure"] is not None
\ No newline at end of file
+    assert result["metrics"]["ebitda"] == 13100
+    assert result["figure"] is not None
+
+def test_clean_financial_series():
+    """
+    Tests that the vectorized cleaner matches the row-by-row cleaner.
+    """
+
+    raw = pd.Series(['$1,200', '(300)', '-', ' 45 ', '$(2,000)', '12.5'])
+
+
+    result = _clean_financial_series(raw)
+
+
+    assert result.tolist() == [_clean_financial_value(value) for value in raw]
+    assert _parse_month_series(pd.Series(['2025-06'])).iloc[0] == datetime(2025, 6, 1)
+
+
+def test_append_month(tmp_path):
+    """
+    Tests that appending the last month matches loading the full history at once.
+    """
+
+    for name in ['actuals', 'budget', 'cash', 'fx']:
+        raw = pd.read_csv(f'fixtures/{name}.csv', dtype=str)
+        raw[raw['month'] < '2025-12'].to_csv(tmp_path / f'{name}.csv', index=False)
+    full = load_and_prepare_data('fixtures', snapshot=False)
+    data = load_and_prepare_data(str(tmp_path), snapshot=False)
+    new_rows = {name: pd.read_csv(f'fixtures/{name}.csv', dtype=str).query("month == '2025-12'") for name in ['actuals', 'budget', 'cash', 'fx']}
+
+
+    append_month(data, **new_rows)
+
+
+    pd.testing.assert_frame_equal(data['cube'], full['cube'])
+    assert len(data['actuals']) == len(full['actuals'])
+    assert cash_amounts(data, 'EUR').iloc[-1] == cash_amounts(full, 'EUR').iloc[-1]
+    assert get_ebitda(data, 'December 2025', 'EUR')['response'] == get_ebitda(full, 'December 2025', 'EUR')['response']
+
+
+def test_append_month_converts_kept_currency_columns(tmp_path):
+    """
+    Tests that currencies converted before an append (e.g. by the warm-up) are converted for the new rows too.
+    """
+
+    for name in ['actuals', 'budget', 'cash', 'fx']:
+        raw = pd.read_csv(f'fixtures/{name}.csv', dtype=str)
+        raw[raw['month'] < '2025-12'].to_csv(tmp_path / f'{name}.csv', index=False)
+    full = load_and_prepare_data('fixtures', snapshot=False)
+    data = load_and_prepare_data(str(tmp_path), snapshot=False)
+    cash_amounts(data, 'EUR')
+    ledger_amounts(data, 'actuals', 'EUR')
+    new_rows = {name: pd.read_csv(f'fixtures/{name}.csv', dtype=str).query("month == '2025-12'") for name in ['actuals', 'budget', 'cash', 'fx']}
+
+
+    append_month(data, **new_rows)
+
+
+    assert cash_amounts(data, 'EUR').tolist() == pytest.approx(cash_amounts(full, 'EUR').tolist())
+    assert ledger_amounts(data, 'actuals', 'EUR').sum() == pytest.approx(ledger_amounts(full, 'actuals', 'EUR').sum())
+    assert not ledger_amounts(data, 'actuals', 'EUR').isna().any()
+    assert '€nan' not in get_cash_runway(data, 'EUR')['response']
+
+
+def test_trends_end_at_the_latest_actuals(tmp_path):
+    """
+    Tests that months with only budget rows (a budget running ahead of actuals) don't end the gross margin trend.
+    """
+
+    for name in ['actuals', 'cash']:
+        pd.read_csv(f'fixtures/{name}.csv', dtype=str).to_csv(tmp_path / f'{name}.csv', index=False)
+    for name in ['budget', 'fx']:
+        raw = pd.read_csv(f'fixtures/{name}.csv', dtype=str)
+        ahead = raw[raw['month'] == '2025-12'].assign(month='2026-03')
+        pd.concat([raw, ahead]).to_csv(tmp_path / f'{name}.csv', index=False)
+    data = load_and_prepare_data(str(tmp_path), snapshot=False)
+    full = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    result = get_gross_margin_trend(data, 3)
+
+
+    assert result['metrics']['months'] == ['2025-10', '2025-11', '2025-12']
+    assert result['metrics'] == get_gross_margin_trend(full, 3)['metrics']
+
+
+def test_range_metrics_default_to_the_latest_actuals(tmp_path):
+    """
+    Tests that a window with no month ends at the latest actuals, not a budget-only month, and aggregates only the months it needs.
+    """
+
+    for name in ['actuals', 'cash']:
+        pd.read_csv(f'fixtures/{name}.csv', dtype=str).to_csv(tmp_path / f'{name}.csv', index=False)
+    for name in ['budget', 'fx']:
+        raw = pd.read_csv(f'fixtures/{name}.csv', dtype=str)
+        ahead = raw[raw['month'] == '2025-12'].assign(month='2026-03')
+        pd.concat([raw, ahead]).to_csv(tmp_path / f'{name}.csv', index=False)
+    data = load_and_prepare_data(str(tmp_path), snapshot=False)
+    full = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    with tracing.span("ytd") as span:
+        ytd = get_range_metric(data, 'ebitda', window='ytd')
+    ttm = get_range_metric(data, 'revenue', window='ttm')
+
+
+    assert ytd['metrics']['month'] == '2025-12'
+    assert ytd['metrics'] == get_range_metric(full, 'ebitda', 'December 2025', 'ytd')['metrics']
+    assert ttm['metrics'] == get_range_metric(full, 'revenue', 'December 2025', 'ttm')['metrics']
+    assert span.tags['rows_scanned'] < len(data['cube'])
+
+
+def test_get_cash_runway_uses_latest_cash_month():
+    """
+    Tests that runway averages the EBITDA of the months leading up to the latest cash balance.
+    """
+
+    months = [datetime(2025, m, 1) for m in (6, 7, 8, 9)]
+    actuals_data = {
+        'account_category': ['Revenue', 'Revenue', 'Revenue', 'Revenue', 'COGS', 'COGS', 'COGS', 'COGS'],
+        'month': months + months,
+        'amount_usd': [50000, 60000, 70000, 999999, 80000, 100000, 120000, 0],
+        'amount_eur': [46000, 55200, 64400, 919999, 73600, 92000, 110400, 0]
+    }
+    cash_data = {
+        'month': [datetime(2025, 7, 1), datetime(2025, 8, 1)],
+        'cash_usd': [500000, 450000],
+        'cash_eur': [460000, 414000]
+    }
+    mock_data = {
+        "actuals": pd.DataFrame(actuals_data),
+        "cash": pd.DataFrame(cash_data)
+    }
+
+
+    result = get_cash_runway(mock_data, 'USD')
+
+
+    assert result["metrics"]["as_of"] == "2025-08"
+    assert result["metrics"]["avg_net_burn"] == 40000
+    assert result["metrics"]["runway_months"] == 11.25
+    assert "Avg. Monthly Net Burn (Last 3 Months): $40,000" in result["response"]
+
+
+def test_load_and_prepare_data_chunked():
+    """
+    Tests that chunked loading builds the same cube and answers without keeping the ledgers.
+    """
+
+    full = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    chunked = load_and_prepare_data('fixtures', chunksize=50)
+
+
+    assert 'actuals' not in chunked and 'budget' not in chunked
+    pd.testing.assert_frame_equal(chunked['cube'], full['cube'])
+    assert get_revenue(chunked, 'June 2025', 'EUR')['response'] == get_revenue(full, 'June 2025', 'EUR')['response']
+    assert get_cash_runway(chunked)['metrics'] == get_cash_runway(full)['metrics']
+
+
+def test_prepared_frames_are_compact():
+    """
+    Tests that prepared ledgers use categoricals, carry the Opex subcategory, and shrink per row.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    report = memory_report(data)
+    actuals = data['actuals']
+
+
+    assert isinstance(actuals['entity'].dtype, pd.CategoricalDtype)
+    assert isinstance(actuals['account_category'].dtype, pd.CategoricalDtype)
+    assert list(actuals['opex_category'].cat.categories) == ['Admin', 'Marketing', 'R&D', 'Sales']
+    assert actuals.loc[actuals['account_category'] == 'Revenue', 'opex_category'].isna().all()
+    assert report['actuals']['bytes_per_row'] < report['actuals']['baseline_bytes_per_row'] / 4
+
+
+def test_prepared_frames_are_sorted_by_month():
+    """
+    Tests that prepared ledgers and cash are sorted by month key, so month ranges are contiguous.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    keys = {name: data[name]['month_key'] for name in ['actuals', 'budget', 'cash']}
+
+
+    assert all(key.is_monotonic_increasing for key in keys.values())
+
+
+def test_reporting_currencies_are_converted_lazily():
+    """
+    Tests that a new reporting currency is converted from the local-currency cube on first use.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+    rates = get_fx(data)
+    june = 2025 * 12 + 5
+    usd_per_eur = rates.matrix[june - rates.first_key, rates.currencies.get_loc('EUR')]
+
+
+    before = list(data['cube'].columns)
+    result = get_revenue(data, 'June 2025', 'EUR')
+    amounts = ledger_amounts(data, 'actuals', 'EUR')
+
+
+    assert before == [('actual', 'USD'), ('budget', 'USD')]
+    assert ('actual', 'EUR') in data['cube'].columns
+    assert result['metrics']['actual'] * usd_per_eur == pytest.approx(get_revenue(data, 'June 2025', 'USD')['metrics']['actual'])
+    assert 'amount_eur' in data['actuals'] and len(amounts) == len(data['actuals'])
+    assert get_revenue(data, 'June 2025', 'XYZ')['metrics']['currency'] == 'USD'
+
+
+def test_entity_filter():
+    """
+    Tests that revenue, EBITDA and OPEX can be answered per entity and add up to the consolidated figures.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    group = get_ebitda(data, 'June 2025', 'USD')
+    emea = get_ebitda(data, 'June 2025', 'USD', 'emea')
+    parent = get_ebitda(data, 'June 2025', 'USD', 'ParentCo')
+    revenue = get_revenue(data, 'June 2025', 'EUR', 'EMEA')
+    opex = get_opex_breakdown(data, 'June 2025', 'USD', 'EMEA')
+    unknown = get_revenue(data, 'June 2025', 'USD', 'APAC')
+
+
+    assert emea['metrics']['entity'] == 'EMEA' and group['metrics']['entity'] == 'Consolidated'
+    assert emea['metrics']['ebitda'] + parent['metrics']['ebitda'] == pytest.approx(group['metrics']['ebitda'])
+    assert group['metrics']['by_entity'] == {'EMEA': emea['metrics']['ebitda'], 'ParentCo': parent['metrics']['ebitda']}
+    assert revenue['response'].startswith('Revenue for June 2025 (EMEA):')
+    assert opex['metrics']['total'] == pytest.approx(emea['metrics']['opex'])
+    assert "Known entities: EMEA, ParentCo" in unknown['response']
+
+
+def test_range_metrics_match_monthly_figures():
+    """
+    Tests that YTD and rolling figures equal the sums of the single-month answers.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+    months = ['January 2025', 'February 2025', 'March 2025', 'April 2025', 'May 2025', 'June 2025']
+
+
+    ytd = get_range_metric(data, 'ebitda', 'June 2025', 'ytd', 'EUR')
+    rolling = get_range_metric(data, 'revenue', 'June 2025', 'rolling_average', 'USD', 'EMEA', 3)
+    opex = get_range_metric(data, 'opex', None, 'ttm')
+
+
+    assert ytd['metrics']['months'] == 6
+    assert ytd['metrics']['ebitda'] == pytest.approx(sum(get_ebitda(data, m, 'EUR')['metrics']['ebitda'] for m in months))
+    assert ytd['response'].startswith('EBITDA, year to date through June 2025, Jan 2025 - Jun 2025:')
+    assert rolling['metrics']['revenue'] == pytest.approx(sum(get_revenue(data, m, 'USD', 'EMEA')['metrics']['actual'] for m in months[3:]) / 3)
+    assert opex['metrics']['month'] == '2025-12' and opex['metrics']['start'] == '2025-01'
+    assert opex['figure']['type'] == 'pie'
+
+
+def test_plan_answers_several_tools_from_one_aggregation():
+    """
+    Tests that a plan gives the same figures as running each tool on its own, for a month and for a quarter.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    month = get_plan(data, ['revenue', 'ebitda', 'opex_breakdown'], 'June 2025', 'EUR', 'EMEA')
+    quarter = get_plan(data, ['ebitda', 'revenue'], 'June 2025', 'USD', window='qtd')
+    no_month = get_plan(data, ['revenue', 'ebitda'])
+
+
+    assert month['metrics']['revenue'] == get_revenue(data, 'June 2025', 'EUR', 'EMEA')['metrics']
+    assert month['metrics']['ebitda'] == get_ebitda(data, 'June 2025', 'EUR', 'EMEA')['metrics']
+    assert month['metrics']['opex_breakdown'] == get_opex_breakdown(data, 'June 2025', 'EUR', 'EMEA')['metrics']
+    assert len(month['figures']) == 3 and month['figure'] == month['figures'][0]
+    assert quarter['response'].startswith('EBITDA, quarter to date through June 2025')
+    assert quarter['metrics']['revenue'] == get_range_metric(data, 'revenue', 'June 2025', 'qtd')['metrics']
+    assert "didn't specify a month" in no_month['response']
+
+
+def test_variance_drivers_match_the_ledgers():
+    """
+    Tests the top budget variances against actuals and budget joined straight from the ledgers, and that re-filtering doesn't rescan.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+    keys = ['month_key', 'entity', 'account_category']
+    sums = {name: data[name].assign(usd=ledger_amounts(data, name)).groupby(keys, observed=True)['usd'].sum() for name in ['actuals', 'budget']}
+    joined = pd.concat(sums, axis=1).fillna(0.0)
+    june = joined.xs(2025 * 12 + 5, level='month_key')
+    expected = (june['actuals'] - june['budget']).abs().sort_values(ascending=False).head(3)
+
+
+    result = get_variance_drivers(data, 'June 2025', k=3)
+    with tracing.span("refilter") as refilter:
+        ytd = get_variance_drivers(data, window='ytd', k=5, threshold_pct=5)
+
+
+    drivers = result['metrics']['drivers']
+    assert [(d['entity'], d['account_category']) for d in drivers] == list(expected.index)
+    assert [abs(d['variance']) for d in drivers] == pytest.approx(expected.tolist())
+    assert result['response'].startswith('Largest budget variances, Jun 2025 (USD;')
+    assert ytd['metrics']['start'] == '2025-01' and ytd['metrics']['end'] == '2025-12'
+    assert all(abs(d['variance_pct']) >= 5 for d in ytd['metrics']['drivers'])
+    assert "rows_scanned" not in refilter.tags
+
+
+def test_forecast_sums_the_per_series_forecasts():
+    """
+    Tests that the forecast lines are the sums of each entity/account series' own forecast, and runway can follow the forecast burn.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+    keys = ['month_key', 'entity', 'account_category']
+    actuals = data['actuals'].assign(usd=ledger_amounts(data, 'actuals')).groupby(keys, observed=True)['usd'].sum()
+    by_series = actuals.unstack(['entity', 'account_category'], fill_value=0.0).sort_index()
+    by_series = by_series.reindex(range(by_series.index.min(), by_series.index.max() + 1), fill_value=0.0)
+    revenue = [column for column in by_series.columns if column[1] == 'Revenue']
+    expected = sum(forecast.linear_trend(by_series[[column]].to_numpy().T, 6)[0] for column in revenue)
+
+
+    result = get_forecast(data, 'revenue', 6, method='linear_trend')
+    runway_result = get_cash_runway(data, 'USD', burn='forecast')
+
+
+    metrics = result['metrics']
+    assert metrics['months'] == ['2026-01', '2026-02', '2026-03', '2026-04', '2026-05', '2026-06']
+    assert metrics['forecast']['revenue'] == pytest.approx(expected.tolist())
+    assert result['figure']['forecast']['y'] == metrics['forecast']['revenue']
+    assert runway_result['metrics']['burn'] == 'forecast'
+    assert len(runway_result['metrics']['forecast_burn']) == 36
+    assert runway_result['metrics']['projected_cash'][0] == runway_result['metrics']['cash']
+
+
+def test_runway_sensitivity():
+    """
+    Tests that the scenario sweep's base case matches the flat-burn runway and the grid is charted.
+    """
+
+    data = load_and_prepare_data('fixtures', snapshot=False)
+
+
+    result = get_runway_sensitivity(data, 'USD', burn_growth=(0.0, 0.05), revenue_shock=(0.0, -0.5, -0.75), windows=(3, 6))
+    base = get_cash_runway(data, 'USD')['metrics']
+
+
+    scenarios = result['metrics']['scenarios']
+    assert len(scenarios) == 12
+    assert scenarios[0]['avg_net_burn'] == pytest.approx(base['avg_net_burn'])
+    assert scenarios[0]['runway_months'] is None and scenarios[0]['zero_month'] is None
+    assert scenarios[4]['runway_months'] > 0 and scenarios[4]['zero_month'] > base['as_of']
+    assert result['figure']['type'] == 'heatmap' and len(result['figure']['z']) == 3
@@ -0,0 +1,109 @@
+import threading
+import time
+from agent import planner, tools
+from agent.tracing import *
+
+
+def test_spans_nest_and_reach_sinks():
+    """
+    Tests that nested spans form one tree, carry their tags and are emitted once when the outer span closes.
+    """
+
+    sink = add_sink(RingBufferSink(maxlen=2))
+
+
+    try:
+        with span("query", query="q") as root:
+            with span("tool"):
+                count("rows_scanned", 3)
+                count("rows_scanned", 4)
+            tag(intent="ebitda")
+    finally:
+        remove_sink(sink)
+
+
+    assert sink.traces() == [root]
+    assert root.tags == {"query": "q", "intent": "ebitda"}
+    assert root.find("tool").tags == {"rows_scanned": 7}
+    assert root.find("tool").trace_id == root.trace_id
+    assert root.seconds >= root.find("tool").seconds
+    assert [row["span"] for row in root.breakdown()] == ["query", "  tool"]
+
+
+def test_run_query_is_traced():
+    """
+    Tests that run_query records intent, cache hits and cube rows scanned on the fixture data.
+    """
+
+    data = tools.load_and_prepare_data(snapshot=False)
+    planner.invalidate_caches()
+    sink = add_sink(RingBufferSink())
+
+
+    try:
+        planner.run_query("EBITDA for June 2025", data)
+        planner.run_query("EBITDA for June 2025", data)
+    finally:
+        remove_sink(sink)
+    cold, warm = sink.traces()
+
+
+    assert cold.tags["intent"] == "ebitda"
+    assert cold.find("intent").tags["cache_hit"] is False
+    assert cold.find("tool").tags["cache_hit"] is False
+    assert cold.find("tool").tags["rows_scanned"] > 0
+    assert warm.find("intent").tags["cache_hit"] is True
+    assert warm.find("tool").tags["cache_hit"] is True
+    assert "rows_scanned" not in warm.find("tool").tags
+
+
+def test_otlp_payload():
+    """
+    Tests that traces convert to OTLP/JSON spans linked by parent span id.
+    """
+
+    exported = []
+    sink = add_sink(OtelSink(export=exported.append))
+
+
+    try:
+        with span("query", cached=True, rows=5):
+            with span("tool"):
+                pass
+    finally:
+        remove_sink(sink)
+    sink.flush(timeout=5)
+    spans = exported[0]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+    assert [s["name"] for s in spans] == ["query", "tool"]
+    assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+    assert spans[0]["parentSpanId"] == ""
+    assert {"key": "rows", "value": {"intValue": "5"}} in spans[0]["attributes"]
+    assert {"key": "cached", "value": {"boolValue": True}} in spans[0]["attributes"]
+    assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+
+
+def test_otel_sink_never_blocks_the_query():
+    """
+    Tests that a stalled exporter doesn't hold up the span closing, and a full queue drops traces instead of waiting.
+    """
+
+    release = threading.Event()
+    sink = add_sink(OtelSink(export=lambda payload: release.wait(), max_queue=1))
+
+
+    try:
+        started = time.perf_counter()
+        for _ in range(5):
+            with span("query"):
+                pass
+        seconds = time.perf_counter() - started
+    finally:
+        remove_sink(sink)
+        release.set()
+
+
+    assert seconds < 1.0
+    assert sink.dropped >= 3
+    assert sink.flush(timeout=5)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from agent.variance import *
+
+
+def test_top_k_matches_a_full_sort():
+    """
+    Tests that the argpartition top-K gives the same positions as sorting everything.
+    """
+
+    values = np.random.default_rng(0).normal(size=1000)
+
+
+    top = top_k(values, 7)
+    everything = top_k(values, 2000)
+
+
+    assert top.tolist() == np.argsort(-values, kind='stable')[:7].tolist()
+    assert len(everything) == 1000
+
+
+def test_top_drivers_filters_by_period_and_threshold():
+    """
+    Tests variance, favourability and the range/threshold filters against a hand-checked cube.
+    """
+
+    index = pd.MultiIndex.from_tuples(
+        [(1, 'A', 'COGS'), (1, 'A', 'Revenue'), (2, 'A', 'Revenue'), (2, 'B', 'Opex:Sales'), (3, 'B', 'Revenue')],
+        names=['month', 'entity', 'account_category'],
+    )
+    columns = pd.MultiIndex.from_tuples([('actual', 'USD'), ('budget', 'USD')], names=['scenario', 'currency'])
+    cube = pd.DataFrame([[120, 100], [90, 100], [300, 200], [50, 100], [0, 40]], index=index, columns=columns, dtype='float64')
+
+
+    cells = variance_cells(cube)
+    everything, matching = top_drivers(cells, k=10)
+    months_1_2, _ = top_drivers(cells, k=2, start=1, end=2)
+    big, big_matching = top_drivers(cells, k=10, threshold=30)
+    pct, _ = top_drivers(cells, k=10, threshold_pct=25)
+
+
+    assert cells['variance'].tolist() == [20, -10, 100, -50, -40]
+    assert cells['favourable'].tolist() == [False, False, True, True, False]
+    assert cells['last_actual'] == 2
+    assert everything.tolist() == [2, 3, 4, 0, 1] and matching == 5
+    assert months_1_2.tolist() == [2, 3]
+    assert big.tolist() == [2, 3, 4] and big_matching == 3
+    assert pct.tolist() == [2, 3, 4]